@@ -3,12 +3,17 @@ import logging
 import asyncio
 import websockets
 from models.device import Device
+from services.async_hardware import AsyncHardwareService
 from utils.security import SecurityManager
 
 
 class DeviceController:
     def __init__(self, hardware_service, security_manager):
+        # start_device/stop_device block, so run them through the async facade
+        if not isinstance(hardware_service, AsyncHardwareService):
+            hardware_service = AsyncHardwareService(hardware_service)
         self.hardware_service = hardware_service
+        self.hardware_service.add_listener(self.broadcast_event)
         self.security_manager = security_manager
         self.connected_clients = set()
         self.logger = logging.getLogger(__name__)
@@ -63,6 +68,14 @@ class DeviceController:
                 websocket, {"status": "success", "message": f"{device_type} stopped"}
             )
 
+    async def broadcast_event(self, event):
+        """Push a device lifecycle event to every connected client"""
+        for websocket in list(self.connected_clients):
+            try:
+                await websocket.send(json.dumps(event))
+            except websockets.exceptions.ConnectionClosed:
+                pass
+
     async def send_response(self, websocket, data):
         """Send response to client"""
         await websocket.send(json.dumps(data))
@@ -115,18 +115,12 @@ class ConfigManager:
                 os.path.dirname(__file__), "..", self.config.network.ssl_key
             )
 
-            # Generate certificates if they don't exist
-            if not (os.path.exists(cert_path) and os.path.exists(key_path)):
-                logger.info("SSL certificates not found. Generating new ones...")
-                from generate_cert import generate_self_signed_cert
+            # Loads (or generates) the pair once and shares the context
+            from utils import tls
 
-                generate_self_signed_cert()
-
-            # Create and configure SSL context
-            import ssl
-
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_context.load_cert_chain(cert_path, key_path)
+            ssl_context = tls.get_server_context(cert_path, key_path)
+            if ssl_context is None:
+                raise RuntimeError(f"Could not load or create {cert_path}")
             return ssl_context
 
         except Exception as e:
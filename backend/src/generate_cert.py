@@ -1,27 +1,9 @@
-from OpenSSL import crypto
-import os
+from utils.tls import DEFAULT_CERT_FILE, DEFAULT_KEY_FILE, generate_certificate
 
 
-def generate_self_signed_cert():
-    # Generate key
-    key = crypto.PKey()
-    key.generate_key(crypto.TYPE_RSA, 2048)
-
-    # Generate certificate
-    cert = crypto.X509()
-    cert.get_subject().CN = "localhost"
-    cert.set_serial_number(1000)
-    cert.gmtime_adj_notBefore(0)
-    cert.gmtime_adj_notAfter(365 * 24 * 60 * 60)  # Valid for one year
-    cert.set_issuer(cert.get_subject())
-    cert.set_pubkey(key)
-    cert.sign(key, "sha256")
-
-    # Write certificate and private key to files
-    with open("server.crt", "wb") as f:
-        f.write(crypto.dump_certificate(crypto.FILETYPE_PEM, cert))
-    with open("server.key", "wb") as f:
-        f.write(crypto.dump_privatekey(crypto.FILETYPE_PEM, key))
+def generate_self_signed_cert(cert_path=DEFAULT_CERT_FILE, key_path=DEFAULT_KEY_FILE):
+    """Write a fresh self-signed ECDSA P-256 pair (see utils/tls.py)"""
+    generate_certificate(cert_path, key_path)
 
 
 if __name__ == "__main__":
@@ -8,12 +8,22 @@ import logging
 from PIL import Image, ImageTk
 import websockets
 import asyncio
-import base64
 import os
 import socket
 import sys
 from pathlib import Path
 
+from streaming.media_protocol import audio_packet, video_packet
+from streaming.send_queue import AudioCoalescer, MediaSendQueue
+from utils.media_ring import MediaRing
+
+AUDIO_RATE = 44100
+AUDIO_BLOCK = 1024  # Frames per capture read
+AUDIO_PACKET_FRAMES = 4096  # Frames coalesced into one audio packet (~93 ms)
+JPEG_QUALITY = 80
+PREVIEW_FPS = 10
+PREVIEW_SIZE = (640, 480)
+
 
 class NodeFlowGUI:
     def __init__(self, root):
@@ -30,10 +40,18 @@ class NodeFlowGUI:
         self.server_url = None
         self.ws_loop = None
         self.ws_thread = None
+        self.send_queue = None
+        self.sender_task = None
 
         # Video variables
         self.video_capture = None
         self.is_streaming = False
+        # Capture publishes the newest frame here; the encode and preview
+        # stages each pick up the latest one at their own pace
+        self.frame_ring = MediaRing(1)
+        self._preview_seq = 0
+        self._preview_job = None
+        self._video_threads = ()  # Capture and encode threads of the current run
 
         # Audio variables
         self.audio = pyaudio.PyAudio()
@@ -147,6 +165,15 @@ class NodeFlowGUI:
 
             ssl_context = ssl._create_unverified_context()
             self.ws = await websockets.connect(self.server_url, ssl=ssl_context)
+            await self.ws.send(json.dumps({
+                "type": "hello",
+                "client": "desktop-sender",
+                "version": "1.0",
+            }))
+
+            # All media goes through one bounded outbox drained on this loop
+            self.send_queue = MediaSendQueue()
+            self.sender_task = asyncio.ensure_future(self.send_queue.run(self.ws.send))
             self.connected = True
 
             # Update GUI from main thread
@@ -184,6 +211,7 @@ class NodeFlowGUI:
         except websockets.exceptions.ConnectionClosed:
             self.logger.info("Connection closed")
             self.connected = False
+            self._close_send_queue()
             self.root.after(
                 0, lambda: self._update_status("Disconnected", "red", "Connect")
             )
@@ -191,9 +219,15 @@ class NodeFlowGUI:
         except Exception as e:
             self.logger.error(f"Message handler error: {e}")
 
+    def _close_send_queue(self):
+        if self.send_queue:
+            self.logger.info(f"Send queue stats: {self.send_queue.get_stats()}")
+            self.send_queue.close()
+
     def _disconnect(self):
         """Disconnect from websocket"""
         self.connected = False
+        self._close_send_queue()
         if self.ws_loop and self.ws:
             asyncio.run_coroutine_threadsafe(self.ws.close(), self.ws_loop)
         self._update_status("Disconnected", "red", "Connect")
@@ -220,13 +254,25 @@ class NodeFlowGUI:
 
     def start_video_stream(self):
         try:
+            # A previous run's threads must be gone before the ring reopens,
+            # or they would keep going alongside the new ones
+            self._join_video_threads()
+            if self._video_threads:
+                raise Exception("Previous video stream is still stopping")
             if self.video_capture is None:
                 self.video_capture = cv2.VideoCapture(0)
                 if not self.video_capture.isOpened():
                     raise Exception("Could not open webcam")
 
             self.is_streaming = True
-            threading.Thread(target=self.update_video, daemon=True).start()
+            self.frame_ring.reopen()
+            self._video_threads = (
+                threading.Thread(target=self.update_video, name="video-capture", daemon=True),
+                threading.Thread(target=self._encode_loop, name="video-encode", daemon=True),
+            )
+            for thread in self._video_threads:
+                thread.start()
+            self._preview_job = self.root.after(0, self._refresh_preview)
             self.logger.info("Video stream started")
         except Exception as e:
             self.logger.error(f"Error starting video: {e}")
@@ -235,58 +281,83 @@ class NodeFlowGUI:
 
     def stop_video_stream(self):
         self.is_streaming = False
+        self.frame_ring.close()
+        if self._preview_job is not None:
+            self.root.after_cancel(self._preview_job)
+            self._preview_job = None
+        # The capture thread finishes its read before the camera is released
+        self._join_video_threads()
+        self.frame_ring.clear()
         if self.video_capture:
             self.video_capture.release()
             self.video_capture = None
         self.video_label.config(image="", text="No video stream")
         self.logger.info("Video stream stopped")
 
+    def _join_video_threads(self, timeout=2.0):
+        for thread in self._video_threads:
+            thread.join(timeout)
+            if thread.is_alive():
+                self.logger.warning(f"{thread.name} thread did not stop within {timeout}s")
+        self._video_threads = tuple(t for t in self._video_threads if t.is_alive())
+
     def update_video(self):
+        """Capture stage: read frames as fast as the camera delivers them"""
         while self.is_streaming:
-            if self.video_capture is None:
+            capture = self.video_capture
+            if capture is None:
                 break
 
-            ret, frame = self.video_capture.read()
+            ret, frame = capture.read()
             if ret:
-                # Convert to RGB for PIL
-                frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                # Resize for display
-                display_size = (640, 480)
-                image = Image.fromarray(frame_rgb)
-                image.thumbnail(display_size, Image.Resampling.LANCZOS)
-
-                # Convert to PhotoImage
-                photo = ImageTk.PhotoImage(image=image)
-
-                # Update label in main thread
-                self.root.after(0, lambda p=photo: self._update_video_label(p))
-
-                # Send frame to server if connected
-                if self.connected and self.ws:
-                    self._send_video_frame(frame)
+                self.frame_ring.put(frame)
             else:
                 self.logger.warning("Failed to read frame from webcam")
                 break
 
+    def _encode_loop(self):
+        """Encode/send stage: always works on the newest captured frame"""
+        seq = 0
+        while self.is_streaming:
+            seq, frame = self.frame_ring.wait_for_new(seq, timeout=0.5)
+            if frame is not None and self.connected and self.send_queue:
+                self._send_video_frame(frame)
+
+    def _refresh_preview(self):
+        """Preview stage: runs on the Tk thread at PREVIEW_FPS"""
+        if not self.is_streaming:
+            self._preview_job = None
+            return
+
+        seq, frame = self.frame_ring.peek_latest()
+        if frame is not None and seq != self._preview_seq:
+            self._preview_seq = seq
+            height, width = frame.shape[:2]
+            scale = min(PREVIEW_SIZE[0] / width, PREVIEW_SIZE[1] / height, 1.0)
+            if scale < 1.0:
+                frame = cv2.resize(
+                    frame,
+                    (int(width * scale), int(height * scale)),
+                    interpolation=cv2.INTER_LINEAR,
+                )
+            frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            photo = ImageTk.PhotoImage(image=Image.fromarray(frame_rgb))
+            self._update_video_label(photo)
+
+        self._preview_job = self.root.after(int(1000 / PREVIEW_FPS), self._refresh_preview)
+
     def _update_video_label(self, photo):
         """Update video label with new frame"""
         self.video_label.config(image=photo, text="")
         self.video_label.image = photo
 
     def _send_video_frame(self, frame):
-        """Send video frame to server via websocket"""
+        """Queue a video frame as a binary JPEG packet"""
         try:
-            # Encode frame as JPEG
-            _, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-            frame_bytes = buffer.tobytes()
-            frame_b64 = base64.b64encode(frame_bytes).decode("utf-8")
-
-            # Send as JSON message
-            message = json.dumps({"type": "video_frame", "data": frame_b64})
-
-            if self.ws_loop:
-                asyncio.run_coroutine_threadsafe(self.ws.send(message), self.ws_loop)
+            ok, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+            if ok:
+                # The queue drops the oldest frame if the uplink falls behind
+                self.send_queue.put_threadsafe(video_packet(buffer.data))
         except Exception as e:
             self.logger.error(f"Error sending video frame: {e}")
 
@@ -304,9 +375,9 @@ class NodeFlowGUI:
                 self.audio_stream = self.audio.open(
                     format=pyaudio.paInt16,
                     channels=1,
-                    rate=44100,
+                    rate=AUDIO_RATE,
                     input=True,
-                    frames_per_buffer=1024,
+                    frames_per_buffer=AUDIO_BLOCK,
                 )
             self.is_audio_streaming = True
             threading.Thread(target=self.stream_audio, daemon=True).start()
@@ -328,21 +399,17 @@ class NodeFlowGUI:
         self.logger.info("Audio stream stopped")
 
     def stream_audio(self):
+        coalescer = AudioCoalescer(AUDIO_PACKET_FRAMES)
         while self.is_audio_streaming:
             if self.audio_stream is None:
                 break
             try:
-                data = self.audio_stream.read(1024, exception_on_overflow=False)
+                data = self.audio_stream.read(AUDIO_BLOCK, exception_on_overflow=False)
 
-                # Send to server if connected
-                if self.connected and self.ws and self.ws_loop:
-                    # Encode audio data as base64
-                    audio_b64 = base64.b64encode(data).decode("utf-8")
-                    message = json.dumps({"type": "audio_data", "data": audio_b64})
-
-                    asyncio.run_coroutine_threadsafe(
-                        self.ws.send(message), self.ws_loop
-                    )
+                # Batch small capture blocks into float32 packets
+                samples = coalescer.push(data)
+                if samples is not None and self.connected and self.send_queue:
+                    self.send_queue.put_threadsafe(audio_packet(samples, AUDIO_RATE))
             except Exception as e:
                 self.logger.error(f"Audio streaming error: {e}")
                 break
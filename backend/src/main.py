@@ -1,7 +1,5 @@
 import asyncio
 import logging
-import ssl
-import os
 import sys
 import socket
 from pathlib import Path
@@ -22,10 +20,11 @@ async def main():
     )
     logger = logging.getLogger(__name__)
 
-    # Get certificate paths
-    cert_dir = Path(__file__).parent
-    cert_file = cert_dir / "server.crt"
-    key_file = cert_dir / "server.key"
+    # Certificate load/generation runs in the background while the rest of
+    # startup proceeds (see utils/tls.py)
+    from utils import tls
+
+    tls.prepare()
 
     # Get local IP address
     def get_local_ip():
@@ -40,47 +39,6 @@ async def main():
 
     local_ip = get_local_ip()
 
-    # Setup SSL context
-    ssl_context = None
-    if cert_file.exists() and key_file.exists():
-        try:
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_context.load_cert_chain(str(cert_file), str(key_file))
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            logger.info("SSL certificates loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading SSL certificates: {e}")
-            ssl_context = None
-
-    # Generate certificates if needed
-    if ssl_context is None:
-        logger.warning("SSL certificates not found or invalid, generating new ones...")
-        try:
-            from generate_cert import generate_self_signed_cert
-
-            generate_self_signed_cert()
-
-            # Try loading again
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_context.load_cert_chain(str(cert_file), str(key_file))
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            logger.info("New SSL certificates generated and loaded successfully")
-        except ImportError:
-            logger.error(
-                "generate_cert.py not found. Please create SSL certificates manually."
-            )
-            logger.info("You can create self-signed certificates with:")
-            logger.info(
-                "  openssl req -x509 -newkey rsa:4096 -keyout server.key -out server.crt -days 365 -nodes"
-            )
-            sys.exit(1)
-        except Exception as e:
-            logger.error(f"Error generating/loading new SSL certificates: {e}")
-            logger.info("Continuing without SSL (not recommended for production)")
-            ssl_context = None
-
     # Import and start server
     try:
         from streaming.server_new import StreamingServer
@@ -92,6 +50,10 @@ async def main():
 
     server = StreamingServer()
 
+    ssl_context = tls.get_server_context()
+    if ssl_context is None:
+        logger.info("Continuing without SSL (not recommended for production)")
+
     try:
         logger.info("Starting NodeFlow server...")
         logger.info("=" * 70)
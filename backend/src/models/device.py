@@ -9,7 +9,9 @@ class DeviceType(Enum):
 
 class DeviceStatus(Enum):
     INACTIVE = "inactive"
+    STARTING = "starting"
     ACTIVE = "active"
+    STOPPING = "stopping"
     ERROR = "error"
 
 
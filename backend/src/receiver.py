@@ -5,300 +5,102 @@ Built with PyQt6 for Windows
 """
 
 import sys
-import json
-import base64
-import threading
+import asyncio
 import logging
-from io import BytesIO
-from collections import deque
-from pathlib import Path
-import ssl
 
-import numpy as np
-import cv2
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QStatusBar, QFrame, QScrollArea
 )
 from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QObject, QThread, QSize
 from PyQt6.QtGui import QImage, QPixmap, QFont, QColor
-import websocket
-import sounddevice as sd
 
 from services.virtual_devices import initialize_virtual_devices
+from streaming.listeners import LOOPBACK_PORT
+from streaming.receiver_core import ReceiverCore, ReceiverPipeline
+from streaming.sinks import CallbackSink, SpeakerSink, StatsSink, VirtualCameraSink
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class VideoBuffer:
-    """Thread-safe video frame buffer"""
-    def __init__(self, max_frames=30):
-        self.buffer = deque(maxlen=max_frames)
-        self.lock = threading.Lock()
-
-    def put(self, frame_data):
-        with self.lock:
-            self.buffer.append(frame_data)
-
-    def get(self):
-        with self.lock:
-            if self.buffer:
-                return self.buffer.popleft()
-            return None
-
-    def size(self):
-        with self.lock:
-            return len(self.buffer)
-
-
-class AudioPlayer:
-    """Plays float32 PCM audio using sounddevice in a non-blocking OutputStream."""
-    def __init__(self, sample_rate=16000, channels=1, blocksize=1024):
-        self.sample_rate = sample_rate
-        self.channels = channels
-        self.blocksize = blocksize
-        self.buffer = deque()
-        self.lock = threading.Lock()
-        self.stream = None
-        self.enabled = False
-        
-        try:
-            self.stream = sd.OutputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                dtype='float32',
-                blocksize=self.blocksize,
-                callback=self._callback
-            )
-            self.stream.start()
-            self.enabled = True
-            logger.info(f"Audio player initialized (sample rate: {self.sample_rate} Hz)")
-        except Exception as e:
-            # Fallback: scan devices and find first output-capable one
-            try:
-                devices = sd.query_devices()
-                for i, d in enumerate(devices):
-                    max_out = int(d.get('max_output_channels', 0) or 0)
-                    if max_out >= 1:
-                        try:
-                            use_ch = max(min(max_out, self.channels), 1)
-                            self.stream = sd.OutputStream(
-                                samplerate=self.sample_rate,
-                                channels=use_ch,
-                                dtype='float32',
-                                blocksize=self.blocksize,
-                                device=i,
-                                callback=self._callback
-                            )
-                            self.stream.start()
-                            self.channels = use_ch
-                            self.enabled = True
-                            logger.info(f"Audio player initialized using device {i} (channels={use_ch})")
-                            break
-                        except Exception:
-                            continue
-            except Exception:
-                pass
-
-            if not self.enabled:
-                logger.warning(f"Audio stream initialization failed: {e}. Continuing without audio.")
-
-    def _callback(self, outdata, frames, time, status):
-        if status and status != sd.CallbackFlags.output_underflow:
-            logger.debug(f"Audio status: {status}")
-        # Fill outdata from buffer or zeros
-        with self.lock:
-            if len(self.buffer) >= frames * self.channels:
-                # Pop needed samples
-                samples = [self.buffer.popleft() for _ in range(frames * self.channels)]
-                arr = np.array(samples, dtype=np.float32)
-                outdata[:] = arr.reshape((frames, self.channels))
-            else:
-                # Not enough data, output silence
-                outdata.fill(0)
-
-    def put(self, samples: np.ndarray):
-        """Append a numpy float32 array (mono or shape (N,)) to buffer"""
-        if not self.enabled or samples is None or len(samples) == 0:
-            return
-        try:
-            flat = samples.flatten().astype(np.float32)
-            with self.lock:
-                for v in flat.tolist():
-                    self.buffer.append(v)
-        except Exception as e:
-            logger.debug(f"Audio buffer error: {e}")
-
-    def stop(self):
-        try:
-            if self.stream:
-                self.stream.stop()
-                self.stream.close()
-        except Exception as e:
-            logger.debug(f"Audio stop error: {e}")
+def bgr_to_qimage(image):
+    """Owned QImage from a BGR array (safe to pass between threads)"""
+    height, width = image.shape[:2]
+    return QImage(image.data, width, height, image.strides[0], QImage.Format.Format_BGR888).copy()
 
 
 class WebSocketWorker(QObject):
-    """Handles WebSocket connection in a separate thread"""
+    """Runs the receiver core in a separate thread
+
+    Frames are decoded once by the pipeline and shared by the display,
+    the virtual camera and the stats; audio is played by the pipeline.
+    """
     video_frame_received = pyqtSignal(QImage)
     connection_status = pyqtSignal(str)
     stats_updated = pyqtSignal(dict)
     error_occurred = pyqtSignal(str)
 
-    def __init__(self, host='127.0.0.1', port=5000, virtual_manager=None):
+    def __init__(self, host='127.0.0.1', port=LOOPBACK_PORT, virtual_manager=None):
         super().__init__()
         self.host = host
         self.port = port
-        self.ws = None
         self.running = False
         self.virtual_manager = virtual_manager
-        self.stats = {
-            'frames_received': 0,
-            'bytes_received': 0,
-            'audio_frames': 0,
-            'fps': 0
-        }
-        self.frame_count = 0
-        self.last_update = None
-        # Audio player will handle playback of incoming audio frames
-        try:
-            self.audio_player = AudioPlayer(sample_rate=16000, channels=1)
-        except Exception as e:
-            logger.warning(f"Audio player could not be initialized: {e}")
-            self.audio_player = None
+        self.stats = StatsSink()
+
+        sinks = [self.stats, CallbackSink(video=self._on_video, name='display')]
+        device = None
+        if self.virtual_manager:
+            sinks.append(VirtualCameraSink(self.virtual_manager.send_video_frame))
+            device = self.virtual_manager.get_audio_output_device()
+        sinks.append(SpeakerSink(device=device))
+        self.pipeline = ReceiverPipeline(sinks)
 
-    def connect(self):
-        """Connect to the server and receive streams"""
         protocol = 'wss' if self.port == 5000 else 'ws'
-        uri = f'{protocol}://{self.host}:{self.port}/ws'
-        
+        self.core = ReceiverCore(
+            f'{protocol}://{self.host}:{self.port}/ws',
+            self.pipeline,
+            client='desktop-receiver',
+            on_status=self.connection_status.emit
+        )
+
+    def connect(self):
+        """Receive streams, reconnecting after drops, until disconnect()"""
+        self.running = True
+        self.pipeline.start()
         try:
-            # Disable certificate verification for self-signed certs
-            ssl_opts = {'cert_reqs': ssl.CERT_NONE, 'check_hostname': False}
-            
-            self.connection_status.emit('Connecting...')
-            self.ws = websocket.WebSocketApp(
-                uri,
-                on_open=self._on_open,
-                on_message=self._on_message,
-                on_error=self._on_error,
-                on_close=self._on_close
-            )
-            self.ws.run_forever(sslopt=ssl_opts)
-            
+            asyncio.run(self.core.run())
         except Exception as e:
             logger.error(f"Connection error: {e}")
             self.error_occurred.emit(f"Connection failed: {str(e)[:50]}")
             self.connection_status.emit('Error')
-
-    def _on_open(self, ws):
-        """Called when connection is established"""
-        logger.info("WebSocket connected")
-        self.connection_status.emit('Connected')
-        self.running = True
-        
-        # Send hello message
-        try:
-            self.ws.send(json.dumps({
-                'type': 'hello',
-                'client': 'desktop-receiver'
-            }))
-        except Exception as e:
-            logger.error(f"Failed to send hello: {e}")
-
-    def _on_message(self, ws, message):
-        """Called when a message is received"""
-        try:
-            data = json.loads(message)
-            msg_type = data.get('type')
-
-            if msg_type == 'video':
-                self._handle_video(data)
-            elif msg_type == 'audio':
-                self._handle_audio(data)
-            elif msg_type == 'connection':
-                self.connection_status.emit('Ready')
-
-        except Exception as e:
-            logger.error(f"Message handling error: {e}")
-
-    def _handle_video(self, data):
-        """Handle incoming video frame"""
-        try:
-            frame_data = base64.b64decode(data.get('data', ''))
-            image = QImage()
-            image.loadFromData(frame_data, 'JPEG')
-            
-            if not image.isNull():
-                self.video_frame_received.emit(image)
-                self.stats['frames_received'] += 1
-                self.stats['bytes_received'] += len(frame_data)
-                self._update_stats()
-                
-                # Send to virtual camera
-                if self.virtual_manager:
-                    try:
-                        # Convert QImage to numpy array for virtual camera
-                        width = image.width()
-                        height = image.height()
-                        ptr = image.bits()
-                        ptr.setsize(image.byteCount())
-                        arr = np.array(ptr).reshape(height, width, 4)  # RGBA
-                        frame_bgr = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
-                        self.virtual_manager.send_video_frame(frame_bgr)
-                    except Exception as e:
-                        pass  # Silent fail, virtual camera is optional
-        except Exception as e:
-            logger.error(f"Video decode error: {e}")
-
-    def _handle_audio(self, data):
-        """Handle incoming audio frame"""
-        try:
-            # Support two formats: list of floats in JSON or base64-encoded float32 bytes
-            audio_field = data.get('data')
-            sample_rate = int(data.get('sampleRate', 16000))
-            samples = None
-            if isinstance(audio_field, str):
-                # try base64 decode
-                try:
-                    decoded = base64.b64decode(audio_field)
-                    samples = np.frombuffer(decoded, dtype=np.float32)
-                except Exception:
-                    # fallback: empty
-                    samples = None
-            elif isinstance(audio_field, list):
-                samples = np.array(audio_field, dtype=np.float32)
-
-            if samples is not None and samples.size > 0:
-                # Play via audio player if available
-                if self.audio_player:
-                    # If sample rates mismatch, we could resample; assume matching for now
-                    self.audio_player.put(samples)
-                self.stats['audio_frames'] += 1
-                self._update_stats()
-        except Exception as e:
-            logger.error(f"Audio error: {e}")
+        finally:
+            self.pipeline.stop()
+            self.running = False
+
+    def _on_video(self, frame):
+        """Pipeline thread: hand the decoded frame to the GUI"""
+        image = frame.image()
+        if image is None:
+            return
+        self.video_frame_received.emit(bgr_to_qimage(image))
+        self._update_stats()
 
     def _update_stats(self):
         """Update and emit statistics"""
-        self.stats_updated.emit(self.stats.copy())
-
-    def _on_error(self, ws, error):
-        """Called on WebSocket error"""
-        logger.error(f"WebSocket error: {error}")
-        self.error_occurred.emit(str(error)[:50])
-
-    def _on_close(self, ws, close_status_code, close_msg):
-        """Called when connection closes"""
-        logger.info("WebSocket disconnected")
-        self.running = False
-        self.connection_status.emit('Disconnected')
+        stats = self.stats.get_stats()
+        self.stats_updated.emit({
+            'frames_received': stats['video_frames'],
+            'bytes_received': stats['bytes_received'],
+            'audio_frames': stats['audio_frames'],
+            'fps': stats['fps'],
+            'reconnects': self.core.get_stats()['reconnects']
+        })
 
     def disconnect(self):
-        """Disconnect from server"""
-        if self.ws:
-            self.ws.close()
+        """Disconnect from server and stop reconnecting"""
+        self.core.stop()
 
 
 class ReceiverGUI(QMainWindow):
@@ -521,7 +323,8 @@ class ReceiverGUI(QMainWindow):
             f"FPS: {stats['fps']:.1f}\n"
             f"Frames: {stats['frames_received']}\n"
             f"Data: {stats['bytes_received'] / (1024*1024):.2f} MB\n"
-            f"Audio: {stats['audio_frames']}"
+            f"Audio: {stats['audio_frames']}\n"
+            f"Reconnects: {stats.get('reconnects', 0)}"
         )
         self.stats_label.setText(stats_text)
 
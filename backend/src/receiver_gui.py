@@ -5,230 +5,190 @@ Built with PyQt6 for cross-platform GUI support
 """
 
 import sys
-import json
-import base64
-import threading
+import asyncio
 import time
-from collections import deque
 from datetime import datetime
 
 import numpy as np
-import websocket
-import sounddevice as sd
-import cv2
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QStatusBar, QScrollArea, QFrame
 )
 from PyQt6.QtGui import QImage, QPixmap, QFont, QColor
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread, QSize
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QThread, QSize, QObject
 from PyQt6.QtWidgets import QProgressBar
 
 from services.virtual_devices import initialize_virtual_devices
+from streaming.receiver_core import ReceiverCore, ReceiverPipeline
+from streaming.shm_bus import SharedFrameReader, copy_packet, frame_bus_name
+from streaming.sinks import CallbackSink, DecodedFrame, SpeakerSink, StatsSink, VirtualCameraSink
 
 
-class AudioPlayer:
-    """Plays float32 PCM audio using sounddevice"""
-    def __init__(self, sample_rate=16000, channels=1, blocksize=1024):
-        self.sample_rate = sample_rate
-        self.channels = channels
-        self.blocksize = blocksize
-        self.buffer = deque(maxlen=sample_rate * 10)
-        self.stream = None
-        self.running = True
-        
-        # Try to open stream using system default device
-        try:
-            self.stream = sd.OutputStream(
-                samplerate=self.sample_rate,
-                channels=self.channels,
-                dtype='float32',
-                blocksize=self.blocksize,
-                callback=self._callback
-            )
-            self.stream.start()
-        except Exception as e:
-            # Fallback: scan devices and find first output-capable one
-            try:
-                devices = sd.query_devices()
-                for i, d in enumerate(devices):
-                    max_out = int(d.get('max_output_channels', 0) or 0)
-                    if max_out >= 1:
-                        try:
-                            use_ch = max(min(max_out, self.channels), 1)
-                            self.stream = sd.OutputStream(
-                                samplerate=self.sample_rate,
-                                channels=use_ch,
-                                dtype='float32',
-                                blocksize=self.blocksize,
-                                device=i,
-                                callback=self._callback
-                            )
-                            self.stream.start()
-                            self.channels = use_ch
-                            break
-                        except Exception:
-                            continue
-            except Exception:
-                pass
-            
-            if not self.stream:
-                print(f"Audio warning: {e}")
-                print("Continuing without audio.")
-
-    def _callback(self, outdata, frames, time_info, status):
-        if status:
-            print(f"Audio status: {status}")
-        
-        samples = []
-        for _ in range(frames * self.channels):
-            if self.buffer:
-                samples.append(self.buffer.popleft())
-            else:
-                samples.append(0.0)
-        
-        if samples:
-            arr = np.array(samples, dtype=np.float32)
-            outdata[:] = arr.reshape((frames, self.channels))
-        else:
-            outdata.fill(0)
+class DisplayBridge(QObject):
+    """Carries decoded frames and audio levels from the pipeline to the GUI thread"""
 
-    def put(self, samples: np.ndarray):
-        """Add audio samples to playback buffer"""
-        if samples is None or len(samples) == 0:
+    video_frame_received = pyqtSignal(QImage)
+    audio_level = pyqtSignal(float, int)
+
+    def on_video(self, frame):
+        image = frame.image()
+        if image is None:
             return
-        try:
-            flat = samples.flatten().astype(np.float32)
-            for v in flat.tolist():
-                self.buffer.append(v)
-        except Exception as e:
-            print(f"Audio error: {e}")
+        height, width = image.shape[:2]
+        # The pixels are shared with the other sinks: the QImage gets its own copy
+        self.video_frame_received.emit(
+            QImage(image.data, width, height, image.strides[0], QImage.Format.Format_BGR888).copy()
+        )
 
-    def stop(self):
-        self.running = False
-        try:
-            if self.stream:
-                self.stream.stop()
-                self.stream.close()
-        except:
-            pass
+    def on_audio(self, packet):
+        samples = packet.samples()
+        if len(samples):
+            self.audio_level.emit(float(np.abs(samples).max()), packet.sample_rate)
 
 
 class WebSocketWorker(QThread):
-    """WebSocket client running in separate thread"""
-    
-    video_frame_received = pyqtSignal(bytes)
-    audio_frame_received = pyqtSignal(np.ndarray, int)
+    """Feeds the pipeline from the relay over WebSocket, reconnecting after drops"""
+
     connection_status = pyqtSignal(str)
-    stats_updated = pyqtSignal(dict)
-    
-    def __init__(self, host='192.168.1.82', port=5000):
+
+    def __init__(self, pipeline, host='192.168.1.82', port=5000):
         super().__init__()
-        self.host = host
-        self.port = port
-        self.ws = None
+        protocol = 'wss' if port == 5000 else 'ws'
+        self.core = ReceiverCore(
+            f'{protocol}://{host}:{port}/ws',
+            pipeline,
+            client='desktop-receiver',
+            on_status=self._on_status
+        )
         self.running = False
-        self.stats = {
-            'video_frames': 0,
-            'audio_frames': 0,
-            'bytes_received': 0,
-            'fps': 0,
-            'start_time': time.time()
-        }
-        self.last_frame_time = time.time()
-        self.frame_times = deque(maxlen=30)
-    
+
     def run(self):
-        """Connect and receive data"""
+        self.running = True
         try:
-            protocol = 'wss' if self.port == 5000 else 'ws'
-            uri = f'{protocol}://{self.host}:{self.port}/ws'
-            
-            self.connection_status.emit("Connecting...")
-            
-            self.ws = websocket.WebSocketApp(
-                uri,
-                on_message=self._on_message,
-                on_error=self._on_error,
-                on_close=self._on_close,
-                on_open=self._on_open
-            )
-            
-            self.ws.run_forever(sslopt={'cert_reqs': 0})
+            asyncio.run(self.core.run())
         except Exception as e:
             self.connection_status.emit(f"Error: {str(e)}")
-    
-    def _on_open(self, ws):
-        """Connected"""
+        finally:
+            self.running = False
+
+    def _on_status(self, status):
+        """Connected / Ready / Disconnected / Reconnecting in ..."""
+        if status in ("Connected", "Ready"):
+            self.connection_status.emit(f"✓ {status}")
+        elif status == "Disconnected":
+            self.connection_status.emit("✗ Disconnected")
+        else:
+            self.connection_status.emit(status)
+
+    def get_stats(self):
+        return {'reconnects': self.core.get_stats()['reconnects']}
+
+    def stop(self):
+        """Stop receiving"""
+        self.core.stop()
+
+
+class SharedBusWorker(QThread):
+    """Feeds the pipeline from the relay's shared-memory bus (same machine only)
+
+    No TLS loopback hop. Video is decoded straight out of its slot, so
+    the JPEG is never copied; only audio, small and queued by the
+    speaker, is copied out.
+    """
+
+    connection_status = pyqtSignal(str)
+
+    def __init__(self, pipeline, reader: SharedFrameReader):
+        super().__init__()
+        self.pipeline = pipeline
+        self.reader = reader
+        self.running = False
+
+    def run(self):
         self.running = True
-        self.connection_status.emit("✓ Connected")
-        print("WebSocket connected!")
-        
-        # Send hello
-        hello = json.dumps({'type': 'hello', 'receiver': 'desktop'})
-        ws.send(hello)
-    
-    def _on_message(self, ws, message):
-        """Receive message"""
+        self.connection_status.emit("✓ Connected (shared memory)")
         try:
-            data = json.loads(message)
-            msg_type = data.get('type')
-            
-            if msg_type == 'video':
-                self.stats['video_frames'] += 1
-                video_data = data.get('data', '')
-                if video_data:
-                    self.video_frame_received.emit(video_data.encode())
-                    self.frame_times.append(time.time())
-                    
-                    if len(self.frame_times) > 1:
-                        fps = len(self.frame_times) / (self.frame_times[-1] - self.frame_times[0] + 0.001)
-                        self.stats['fps'] = fps
-                        
-            elif msg_type == 'audio':
-                self.stats['audio_frames'] += 1
-                audio_field = data.get('data')
-                sample_rate = int(data.get('sampleRate', 16000))
-                
-                if isinstance(audio_field, str):
-                    try:
-                        decoded = base64.b64decode(audio_field)
-                        samples = np.frombuffer(decoded, dtype=np.float32)
-                        self.audio_frame_received.emit(samples, sample_rate)
-                    except:
-                        pass
-                elif isinstance(audio_field, list):
-                    samples = np.array(audio_field, dtype=np.float32)
-                    self.audio_frame_received.emit(samples, sample_rate)
-            
-            self.stats_updated.emit(self.stats.copy())
-            
+            while self.running:
+                if not self.reader.wait(timeout=0.5):
+                    continue
+                for item in self.reader.read(self._consume):
+                    self.pipeline.submit(item)
         except Exception as e:
-            print(f"Message error: {e}")
-    
-    def _on_error(self, ws, error):
-        """Error"""
-        self.connection_status.emit(f"✗ Error: {str(error)}")
-        print(f"WebSocket error: {error}")
-    
-    def _on_close(self, ws, close_status_code, close_msg):
-        """Disconnected"""
+            self.connection_status.emit(f"✗ Error: {str(e)}")
+        finally:
+            self.running = False
+            self.reader.close()
+            self.connection_status.emit("✗ Disconnected")
+
+    @staticmethod
+    def _consume(packet):
+        # Runs inside the slot's seqlock window: the payload is a view
+        if packet.is_video:
+            return DecodedFrame.decode_now(packet)
+        return copy_packet(packet)
+
+    def get_stats(self):
+        return {'dropped': self.reader.dropped}
+
+    def stop(self):
+        """Stop receiving"""
         self.running = False
-        self.connection_status.emit("✗ Disconnected")
-        print("WebSocket closed")
-    
+
+
+class InProcessWorker(QObject):
+    """Feeds the pipeline straight from a StreamingServer in this process
+
+    Used when bundle.py runs the server and the GUI together: packets are
+    handed over as objects, so nothing is encoded, copied or sent through
+    a socket. submit() only queues, so the server's loop never waits on
+    decoding or playback.
+    """
+
+    connection_status = pyqtSignal(str)
+
+    def __init__(self, pipeline, server):
+        super().__init__()
+        self.pipeline = pipeline
+        self.server = server
+        self.running = False
+        self.token = None
+
+    def start(self):
+        self.running = True
+        self.token = self.server.subscribe(self.pipeline.submit)
+        self.connection_status.emit("✓ Connected (in process)")
+
+    def get_stats(self):
+        return {}
+
     def stop(self):
         """Stop receiving"""
         self.running = False
-        if self.ws:
-            self.ws.close()
+        if self.token is not None:
+            self.server.unsubscribe(self.token)
+            self.token = None
+        self.connection_status.emit("✗ Disconnected")
+
+    def wait(self):
+        """Nothing to join; kept for parity with the thread workers"""
+
+
+def open_shared_bus(port=5000):
+    """Attach to a relay running on this machine, or None"""
+    try:
+        return SharedFrameReader(frame_bus_name(port))
+    except (OSError, ValueError):
+        # No relay here (or not a frame bus): fall back to WebSocket
+        return None
 
 
 class ReceiverGUI(QMainWindow):
     """Main GUI window"""
     
-    def __init__(self):
+    def __init__(self, server=None):
         super().__init__()
+        # StreamingServer running in this process (bundle.py), if any
+        self.server = server
         self.setWindowTitle("NodeFlow - Desktop Receiver")
         self.setGeometry(100, 100, 1400, 900)
         self.setStyleSheet("""
@@ -261,8 +221,12 @@ class ReceiverGUI(QMainWindow):
         self.init_ui()
         
         self.ws_worker = None
-        self.audio_player = None
+        self.pipeline = None
+        self.stats_sink = None
         self.current_frame = None
+        self.display = DisplayBridge()
+        self.display.video_frame_received.connect(self.on_video_frame)
+        self.display.audio_level.connect(self.on_audio_level)
     
     def init_ui(self):
         """Initialize UI"""
@@ -381,8 +345,10 @@ class ReceiverGUI(QMainWindow):
         
         self.bytes_label = QLabel("Bytes: 0 MB")
         self.uptime_label = QLabel("Uptime: 00:00")
+        self.reconnects_label = QLabel("Reconnects: 0")
         network_layout.addWidget(self.bytes_label)
         network_layout.addWidget(self.uptime_label)
+        network_layout.addWidget(self.reconnects_label)
         network_frame.setLayout(network_layout)
         right_panel.addWidget(network_frame)
         
@@ -429,6 +395,7 @@ class ReceiverGUI(QMainWindow):
         # Timer for stats update
         self.stats_timer = QTimer()
         self.stats_timer.timeout.connect(self.update_uptime)
+        self.stats_timer.timeout.connect(self.update_stats)
         self.stats_timer.start(1000)
         
         self.start_time = None
@@ -442,13 +409,27 @@ class ReceiverGUI(QMainWindow):
     
     def connect(self):
         """Connect to server"""
-        self.audio_player = AudioPlayer()
-        
-        self.ws_worker = WebSocketWorker('192.168.1.82', 5000)
-        self.ws_worker.video_frame_received.connect(self.on_video_frame)
-        self.ws_worker.audio_frame_received.connect(self.on_audio_frame)
+        # Every source feeds the same pipeline: each frame is decoded once
+        # for the display and the virtual camera
+        self.stats_sink = StatsSink()
+        self.pipeline = ReceiverPipeline([
+            self.stats_sink,
+            CallbackSink(video=self.display.on_video, audio=self.display.on_audio, name='display'),
+            VirtualCameraSink(self.virtual_manager.send_video_frame),
+            SpeakerSink(device=self.virtual_manager.get_audio_output_device()),
+        ])
+        self.pipeline.start()
+        
+        # Prefer the cheapest path to the relay: same process, then shared
+        # memory on this machine, then the network
+        reader = None if self.server is not None else open_shared_bus(5000)
+        if self.server is not None:
+            self.ws_worker = InProcessWorker(self.pipeline, self.server)
+        elif reader is not None:
+            self.ws_worker = SharedBusWorker(self.pipeline, reader)
+        else:
+            self.ws_worker = WebSocketWorker(self.pipeline, '192.168.1.82', 5000)
         self.ws_worker.connection_status.connect(self.on_connection_status)
-        self.ws_worker.stats_updated.connect(self.on_stats_updated)
         
         self.ws_worker.start()
         self.connect_btn.setText("Disconnect")
@@ -463,8 +444,8 @@ class ReceiverGUI(QMainWindow):
             self.ws_worker.stop()
             self.ws_worker.wait()
         
-        if self.audio_player:
-            self.audio_player.stop()
+        if self.pipeline:
+            self.pipeline.stop()
         
         self.connect_btn.setText("Connect")
         self.status_label.setText("Status: Disconnected")
@@ -493,67 +474,24 @@ class ReceiverGUI(QMainWindow):
             self.vaudio_label.setText("Audio: ✗ Not Available")
             self.vaudio_label.setStyleSheet("color: #ff6b6b;")
     
-    def on_video_frame(self, frame_data):
-        """Display video frame and send to virtual camera"""
-        try:
-            image_data = base64.b64decode(frame_data)
-            image = QImage.fromData(image_data)
-            
-            if not image.isNull():
-                # Scale to fit label
-                pixmap = QPixmap.fromImage(image)
-                scaled = pixmap.scaledToWidth(
-                    self.video_label.width() - 4,
-                    Qt.TransformationMode.SmoothTransformation
-                )
-                self.video_label.setPixmap(scaled)
-                
-                self.resolution_label.setText(f"Resolution: {image.width()}x{image.height()}")
-                self.current_frame = scaled
-                
-                # Send to virtual camera
-                try:
-                    # Convert QImage to numpy array for virtual camera
-                    width = image.width()
-                    height = image.height()
-                    ptr = image.bits()
-                    ptr.setsize(image.byteCount())
-                    arr = np.array(ptr).reshape(height, width, 4)  # RGBA
-                    frame_bgr = cv2.cvtColor(arr, cv2.COLOR_RGBA2BGR)
-                    
-                    # Send to virtual camera
-                    self.virtual_manager.send_video_frame(frame_bgr)
-                except Exception as e:
-                    pass  # Silent fail, virtual camera is optional
-        except Exception as e:
-            print(f"Video frame error: {e}")
+    def on_video_frame(self, image):
+        """Display a decoded video frame"""
+        pixmap = QPixmap.fromImage(image)
+        scaled = pixmap.scaledToWidth(
+            self.video_label.width() - 4,
+            Qt.TransformationMode.SmoothTransformation
+        )
+        self.video_label.setPixmap(scaled)
+        
+        self.resolution_label.setText(f"Resolution: {image.width()}x{image.height()}")
+        self.current_frame = scaled
     
-    def on_audio_frame(self, samples, sample_rate):
-        """Play audio frame"""
-        try:
-            # Ensure audio player uses the incoming sample rate
-            if not self.audio_player or getattr(self.audio_player, 'sample_rate', None) != int(sample_rate):
-                # Recreate audio player with correct sample rate
-                try:
-                    if self.audio_player:
-                        self.audio_player.stop()
-                except Exception:
-                    pass
-                self.audio_player = AudioPlayer(sample_rate=int(sample_rate), channels=1)
-
-            if self.audio_player:
-                self.audio_player.put(samples)
-                
-                # Update audio level visualization
-                if len(samples) > 0:
-                    level = int(abs(np.max(samples)) * 10)
-                    level = min(level, 10)
-                    bar = "█" * level + "░" * (10 - level)
-                    self.audio_level_label.setText(f"Level: {bar}")
-                
-                self.sample_rate_label.setText(f"Sample Rate: {sample_rate} Hz")
-        except Exception as e:
-            print(f"Audio error: {e}")
+    def on_audio_level(self, peak, sample_rate):
+        """Update the audio level meter (playback is done by the pipeline)"""
+        level = min(int(peak * 10), 10)
+        bar = "█" * level + "░" * (10 - level)
+        self.audio_level_label.setText(f"Level: {bar}")
+        self.sample_rate_label.setText(f"Sample Rate: {sample_rate} Hz")
     
     def on_connection_status(self, status):
         """Update connection status"""
@@ -572,6 +510,15 @@ class ReceiverGUI(QMainWindow):
         
         bytes_mb = stats.get('bytes_received', 0) / (1024 * 1024)
         self.bytes_label.setText(f"Bytes: {bytes_mb:.2f} MB")
+        self.reconnects_label.setText(f"Reconnects: {stats.get('reconnects', 0)}")
+    
+    def update_stats(self):
+        """Poll the pipeline and source statistics"""
+        if not self.stats_sink or not self.ws_worker:
+            return
+        stats = self.stats_sink.get_stats()
+        stats.update(self.ws_worker.get_stats())
+        self.on_stats_updated(stats)
     
     def update_uptime(self):
         """Update uptime"""
@@ -587,9 +534,10 @@ class ReceiverGUI(QMainWindow):
         event.accept()
 
 
-def main():
+def main(server=None):
+    """Run the receiver; pass the StreamingServer when it runs in this process"""
     app = QApplication(sys.argv)
-    window = ReceiverGUI()
+    window = ReceiverGUI(server)
     window.show()
     sys.exit(app.exec())
 
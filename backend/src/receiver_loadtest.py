@@ -0,0 +1,221 @@
+"""
+NodeFlow Receiver Load Test (Headless)
+Opens many receiver connections to one relay and reports what each got:
+throughput, latency, video gaps, reconnects. Nothing is displayed or
+played; every connection is an asyncio task on one event loop with an
+inline pipeline, so a connection costs a small fraction of a core and a
+single process can stand in for hundreds of receivers.
+
+Frames are not decoded by default, so the numbers describe the relay and
+not the tester. With --decode every connection also decodes its frames
+like a displaying receiver, on a shared thread pool off the event loop;
+frames the pool can't keep up with are reported as decode_skipped.
+
+Usage:
+python receiver_loadtest.py --server wss://192.168.1.82:5000/ws --connections 50
+     [--duration 60] [--ramp 5] [--decode [--decode-threads 4]] [--record DIR]
+     [--report loadtest.json | loadtest.csv]
+
+The report has one row per connection plus the totals, this process's
+CPU use per connection and, when reachable, the relay's /api/stats.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit
+
+import aiohttp
+
+from streaming.receiver_core import ReceiverCore, ReceiverPipeline
+from streaming.reconnect import Backoff
+from streaming.sinks import RecorderSink, ThroughputSink
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Per-connection totals summed into the report
+TOTALS = ("video_frames", "audio_packets", "bytes_received", "video_gaps", "decoded",
+          "decode_errors", "decode_skipped", "connects", "reconnects", "failures", "invalid")
+
+
+class LoadTest:
+    """N receivers on one event loop, each with its own counters"""
+
+    def __init__(self, url, connections=10, duration=60.0, decode=False, ramp=0.0, record_dir=None,
+                 decode_threads=None):
+        self.url = url
+        self.connections = connections
+        self.duration = duration
+        self.decode = decode
+        self.ramp = ramp
+        self.record_dir = record_dir
+        self.decode_threads = decode_threads or os.cpu_count() or 1
+        self.decoder = None
+        self.receivers = []
+        self._stop_event = None
+
+    def _open_receiver(self, index):
+        sinks = [ThroughputSink(decoder=self.decoder)]
+        if self.record_dir:
+            sinks.append(RecorderSink(os.path.join(self.record_dir, f'connection-{index}.nfr')))
+        pipeline = ReceiverPipeline(sinks, inline=True)
+        core = ReceiverCore(self.url, pipeline, client='loadtest', backoff=Backoff(initial=1.0))
+        return sinks[0], pipeline, core
+
+    async def run(self):
+        """Connect, receive for duration seconds (or until stop()) and report"""
+        self._stop_event = asyncio.Event()
+        if self.record_dir:
+            os.makedirs(self.record_dir, exist_ok=True)
+        if self.decode:
+            self.decoder = ThreadPoolExecutor(self.decode_threads, thread_name_prefix="loadtest-decode")
+        started = time.monotonic()
+        cpu_started = time.process_time()
+        tasks = []
+        try:
+            for index in range(self.connections):
+                receiver = self._open_receiver(index)
+                self.receivers.append(receiver)
+                tasks.append(asyncio.ensure_future(receiver[2].run()))
+                # Spread the connects so the relay isn't hit all at once
+                if self.ramp and index < self.connections - 1:
+                    await asyncio.sleep(self.ramp / self.connections)
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), max(self.duration - self.ramp, 0))
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            for _, _, core in self.receivers:
+                core.stop()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for _, pipeline, _ in self.receivers:
+                pipeline.stop()
+            if self.decoder is not None:
+                self.decoder.shutdown(wait=True, cancel_futures=True)
+        wall = time.monotonic() - started
+        cpu = time.process_time() - cpu_started
+        return self.report(wall, cpu, await self.fetch_server_stats())
+
+    def stop(self):
+        """End the run early; call on the event loop"""
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def stats_url(self):
+        """The relay's /api/stats, next to its /ws endpoint"""
+        parts = urlsplit(self.url)
+        scheme = 'https' if parts.scheme == 'wss' else 'http'
+        return urlunsplit((scheme, parts.netloc, '/api/stats', '', ''))
+
+    async def fetch_server_stats(self):
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.get(self.stats_url(), ssl=not self.url.startswith('wss'),
+                                       timeout=aiohttp.ClientTimeout(total=5)) as response:
+                    return await response.json()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.warning(f"Server stats unavailable: {e}")
+            return None
+
+    def report(self, wall, cpu, server_stats=None):
+        rows = []
+        for index, (throughput, _, core) in enumerate(self.receivers):
+            row = {'connection': index}
+            row.update(throughput.get_stats())
+            core_stats = core.get_stats()
+            del core_stats['connected']
+            row.update(core_stats)
+            rows.append(row)
+        totals = {key: sum(row[key] for row in rows) for key in TOTALS}
+        totals['mbps'] = round(sum(row['mbps'] for row in rows), 3)
+        return {
+            'url': self.url,
+            'connections': self.connections,
+            'decode': self.decode,
+            'decode_threads': self.decode_threads if self.decode else 0,
+            'wall_seconds': round(wall, 3),
+            'cpu_seconds': round(cpu, 3),
+            # Fraction of one core each connection used, receiving included
+            'cores_per_connection': round(cpu / wall / max(self.connections, 1), 5) if wall else 0.0,
+            'totals': totals,
+            'receivers': rows,
+            'server': server_stats,
+        }
+
+
+def write_report(report, path):
+    """JSON, or one CSV row per connection when path ends in .csv"""
+    if path.lower().endswith('.csv'):
+        rows = report['receivers']
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ['connection'])
+            writer.writeheader()
+            writer.writerows(rows)
+    else:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='NodeFlow receiver load test - many headless receivers, one report'
+    )
+    parser.add_argument('--server', default='wss://192.168.1.82:5000/ws',
+                        help='NodeFlow server WebSocket URL (default: wss://192.168.1.82:5000/ws)')
+    parser.add_argument('--connections', type=int, default=10,
+                        help='Number of receivers to open (default: 10)')
+    parser.add_argument('--duration', type=float, default=60.0,
+                        help='Seconds to run, ramp included (default: 60)')
+    parser.add_argument('--ramp', type=float, default=0.0,
+                        help='Seconds over which to spread the connects (default: 0)')
+    parser.add_argument('--decode', action='store_true',
+                        help='Also decode every frame, on a shared thread pool')
+    parser.add_argument('--decode-threads', type=int,
+                        help='Decode threads shared by all connections (default: one per CPU)')
+    parser.add_argument('--record', metavar='DIR',
+                        help='Record every connection, still encoded, into DIR')
+    parser.add_argument('--report', default='loadtest.json',
+                        help='Report file, .json or .csv (default: loadtest.json)')
+    args = parser.parse_args()
+
+    test = LoadTest(args.server, args.connections, args.duration, decode=args.decode,
+                    ramp=args.ramp, record_dir=args.record, decode_threads=args.decode_threads)
+    logger.info(f"Opening {args.connections} receivers to {args.server} for {args.duration:.0f}s")
+
+    async def run():
+        task = asyncio.ensure_future(test.run())
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Ctrl+C: stop early and still write the report
+            test.stop()
+            return await task
+
+    try:
+        report = asyncio.run(run())
+    except KeyboardInterrupt:
+        print("\nInterrupted before the report was ready")
+        sys.exit(1)
+
+    write_report(report, args.report)
+    totals = report['totals']
+    logger.info(
+        f"{totals['video_frames']} frames, {totals['mbps']:.2f} Mbit/s total, "
+        f"{totals['video_gaps']} video gaps, {totals['reconnects']} reconnects; "
+        f"{report['cores_per_connection'] * 100:.2f}% of a core per connection"
+    )
+    logger.info(f"Report written to {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,13 @@
 import asyncio
 import logging
-import ssl
-import os
-from pathlib import Path
 from streaming.server_new import StreamingServer
+from utils import tls
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     logger = logging.getLogger(__name__)
     
+    tls.prepare()
     server = StreamingServer()
 
     # Determine a friendly LAN IP to print for mobile connections
@@ -25,23 +24,8 @@ if __name__ == '__main__':
 
     local_ip = get_local_ip()
     
-    # Setup SSL context for HTTPS
-    cert_file = Path(__file__).parent / 'server.crt'
-    key_file = Path(__file__).parent / 'server.key'
-    
-    ssl_context = None
-    if cert_file.exists() and key_file.exists():
-        try:
-            ssl_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ssl_context.load_cert_chain(str(cert_file), str(key_file))
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            logger.info("SSL certificates loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading SSL certificates: {e}")
-            ssl_context = None
-    else:
-        logger.warning(f"SSL certificates not found at {cert_file} or {key_file}")
+    # Shared, cached TLS context (generates a certificate if there is none)
+    ssl_context = tls.get_server_context()
 
     protocol = "https" if ssl_context else "http"
     logger.info(f"Starting dev server (listen on all interfaces) — access at: {protocol}://{local_ip}:5000/")
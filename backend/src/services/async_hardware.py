@@ -0,0 +1,146 @@
+"""
+Asyncio facade over HardwareService
+Blocking device start/stop calls run on a small dedicated executor, so
+slow camera probing or thread joins never tie up the default executor
+the rest of the server relies on. Each device allows one operation at a
+time, every call is bounded by a timeout, and lifecycle events are
+pushed to listeners (the streaming server forwards them to clients).
+"""
+
+import asyncio
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from models.device import DeviceType
+from services.hardware_service import HardwareService
+
+DEVICE_TYPES = tuple(t.value for t in DeviceType)
+
+
+class AsyncHardwareService:
+    """Non-blocking start/stop with per-device serialisation and events
+
+    A call that times out or is cancelled does not abort the underlying
+    hardware operation (a driver call cannot be interrupted); the device
+    stays locked until it finishes and its final event is still emitted.
+    """
+
+    def __init__(self, hardware_service: Optional[HardwareService] = None, timeout: float = 15.0):
+        self.hardware_service = hardware_service or HardwareService()
+        self.timeout = timeout
+        self.logger = logging.getLogger(__name__)
+        # One worker per device type, so one hung device can't block another
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(DEVICE_TYPES), thread_name_prefix="hardware"
+        )
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._listeners = []
+
+    @staticmethod
+    def _device_name(device) -> str:
+        name = device.value if isinstance(device, DeviceType) else str(device).lower()
+        if name not in DEVICE_TYPES:
+            raise ValueError(f"Unknown device type: {device}")
+        return name
+
+    def _lock(self, device: str) -> asyncio.Lock:
+        # Created lazily so the locks belong to the loop that uses them
+        if device not in self._locks:
+            self._locks[device] = asyncio.Lock()
+        return self._locks[device]
+
+    def add_listener(self, callback: Callable[[dict], object]):
+        """Register callback(event); coroutine functions are scheduled as tasks"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def _emit(self, device: str, event: str, message: Optional[str] = None):
+        payload = {"type": "device_event", "device": device, "event": event}
+        if message:
+            payload["message"] = message
+        for callback in list(self._listeners):
+            try:
+                result = callback(payload)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                self.logger.error(f"Device event listener error: {e}")
+
+    async def start_device(self, device, timeout: Optional[float] = None):
+        """Start a device without blocking the event loop"""
+        await self._run(self._device_name(device), "start", timeout)
+
+    async def stop_device(self, device, timeout: Optional[float] = None):
+        """Stop a device without blocking the event loop"""
+        await self._run(self._device_name(device), "stop", timeout)
+
+    async def _run(self, device: str, action: str, timeout: Optional[float]):
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        lock = self._lock(device)
+
+        try:
+            await asyncio.wait_for(lock.acquire(), timeout)
+        except asyncio.TimeoutError:
+            raise asyncio.TimeoutError(f"{device} is busy with another operation")
+
+        func = self.hardware_service.start_device if action == "start" else self.hardware_service.stop_device
+        self._emit(device, "starting" if action == "start" else "stopping")
+        try:
+            future = loop.run_in_executor(self.executor, func, device)
+        except Exception:
+            lock.release()
+            raise
+        # Release the device and report the outcome when the work really
+        # ends, even if the caller has given up waiting
+        future.add_done_callback(lambda f: self._finished(device, action, lock, f))
+
+        remaining = max(deadline - loop.time(), 0)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), remaining)
+        except asyncio.TimeoutError:
+            self.logger.error(f"Timed out waiting for {device} to {action}")
+            self._emit(device, "timeout", f"{action} still in progress after {timeout:.0f}s")
+            raise
+
+    def _finished(self, device: str, action: str, lock: asyncio.Lock, future):
+        lock.release()
+        if future.cancelled():
+            return
+        error = future.exception()
+        if error is not None:
+            self._emit(device, "error", str(error))
+        else:
+            self._emit(device, "started" if action == "start" else "stopped")
+
+    def get_device(self, device: str):
+        """Running device handle (CaptureEngine, MicrophoneCapture, ...) or None"""
+        return {
+            "webcam": self.hardware_service.get_webcam,
+            "microphone": self.hardware_service.get_microphone,
+            "speaker": self.hardware_service.get_speaker,
+        }[self._device_name(device)]()
+
+    def is_busy(self, device) -> bool:
+        lock = self._locks.get(self._device_name(device))
+        return lock is not None and lock.locked()
+
+    async def stop_all(self):
+        """Stop every running device"""
+        running = [d for d in DEVICE_TYPES if d in self.hardware_service.devices]
+        results = await asyncio.gather(
+            *(self.stop_device(d) for d in running), return_exceptions=True
+        )
+        for device, result in zip(running, results):
+            if isinstance(result, Exception):
+                self.logger.error(f"Error stopping {device}: {result}")
+
+    def close(self):
+        """Release the executor (running operations finish in the background)"""
+        self.executor.shutdown(wait=False)
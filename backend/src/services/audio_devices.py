@@ -0,0 +1,172 @@
+"""
+Audio device and stream manager
+Owns one explicit PortAudio stream per named audio path, so several
+input/output devices can run side by side. Nothing here touches the
+process-wide sd.default settings or calls the global sd.stop(); closing
+one stream never affects another.
+"""
+
+import logging
+import threading
+from typing import Dict, List, Optional
+
+try:
+    import sounddevice as sd
+except (ImportError, OSError):
+    # OSError: sounddevice is installed but the PortAudio library is missing
+    sd = None
+
+_CHANNEL_KEYS = {"input": "max_input_channels", "output": "max_output_channels"}
+
+
+class AudioDeviceManager:
+    """Registry of open audio streams plus a cached device list"""
+
+    def __init__(self, backend=None):
+        self.backend = backend if backend is not None else sd
+        self.logger = logging.getLogger(__name__)
+        self.streams: Dict[str, object] = {}
+        self._devices: Optional[List[dict]] = None
+        self._lock = threading.RLock()
+
+    @property
+    def available(self) -> bool:
+        return self.backend is not None
+
+    def _require_backend(self):
+        if self.backend is None:
+            raise RuntimeError("sounddevice not available")
+
+    def query_devices(self, refresh: bool = False) -> List[dict]:
+        """Return the device list, querying PortAudio only when needed"""
+        self._require_backend()
+        with self._lock:
+            if self._devices is None or refresh:
+                self._devices = [dict(d) for d in self.backend.query_devices()]
+            return self._devices
+
+    def refresh(self) -> List[dict]:
+        """Re-scan devices after a hot-plug event
+
+        PortAudio only notices new hardware when it is re-initialised,
+        which is only safe while no stream is open; otherwise the cached
+        list is simply re-read.
+        """
+        self._require_backend()
+        with self._lock:
+            if not self.streams and hasattr(self.backend, "_terminate"):
+                try:
+                    self.backend._terminate()
+                    self.backend._initialize()
+                except Exception as e:
+                    self.logger.warning(f"Could not re-initialise PortAudio: {e}")
+            return self.query_devices(refresh=True)
+
+    def find_device(self, name: str, kind: str = "output") -> Optional[int]:
+        """Index of the first device whose name contains name (case-insensitive)"""
+        key = _CHANNEL_KEYS[kind]
+        name = name.lower()
+        for index, device in enumerate(self.query_devices()):
+            if name in device.get("name", "").lower() and int(device.get(key, 0) or 0) > 0:
+                return index
+        return None
+
+    def _candidates(self, kind: str, channels: int):
+        """(device, channels) pairs to try when the requested device fails"""
+        key = _CHANNEL_KEYS[kind]
+        for index, device in enumerate(self.query_devices()):
+            max_channels = int(device.get(key, 0) or 0)
+            if max_channels >= 1:
+                yield index, max(min(max_channels, channels), 1)
+
+    def open_stream(self, name: str, kind: str, device=None, channels: int = 1,
+                    fallback: bool = False, **kwargs):
+        """Open and start a stream registered under name
+
+        kind is "input" or "output"; device None means the host default.
+        With fallback=True, any other device that can carry the stream is
+        tried if the requested one fails; check stream.channels for the
+        channel count actually opened. Extra kwargs go to sounddevice.
+        """
+        self._require_backend()
+        stream_class = {"input": self.backend.InputStream, "output": self.backend.OutputStream}[kind]
+
+        with self._lock:
+            if name in self.streams:
+                raise ValueError(f"Audio stream already open: {name}")
+
+            attempts = [(device, channels)]
+            if fallback:
+                attempts += [c for c in self._candidates(kind, channels) if c[0] != device]
+
+            error = None
+            for attempt_device, attempt_channels in attempts:
+                try:
+                    stream = stream_class(device=attempt_device, channels=attempt_channels, **kwargs)
+                except Exception as e:
+                    error = error or e
+                    continue
+                try:
+                    stream.start()
+                except Exception as e:
+                    error = error or e
+                    # Opened but unusable: don't leak the PortAudio stream
+                    try:
+                        stream.close()
+                    except Exception as close_error:
+                        self.logger.debug(f"Closing failed audio stream {name}: {close_error}")
+                    continue
+                self.streams[name] = stream
+                if attempt_device != device:
+                    self.logger.info(f"Audio stream {name} using fallback device {attempt_device}")
+                return stream
+
+            raise RuntimeError(f"Could not open {kind} stream {name}: {error}")
+
+    def close_stream(self, name: str):
+        """Stop and close one stream; other streams keep running"""
+        with self._lock:
+            stream = self.streams.pop(name, None)
+        if stream is None:
+            return
+        try:
+            stream.stop()
+        finally:
+            stream.close()
+
+    def close_all(self):
+        for name in list(self.streams):
+            try:
+                self.close_stream(name)
+            except Exception as e:
+                self.logger.error(f"Error closing audio stream {name}: {e}")
+
+    def get_status(self) -> dict:
+        """Describe every open stream"""
+        with self._lock:
+            streams = dict(self.streams)
+        status = {}
+        for name, stream in streams.items():
+            info = {
+                "device": getattr(stream, "device", None),
+                "channels": getattr(stream, "channels", None),
+                "active": getattr(stream, "active", None),
+            }
+            try:
+                info["latency_ms"] = 1000.0 * float(stream.latency)
+            except Exception:
+                pass
+            status[name] = info
+        return status
+
+
+# Global instance
+_device_manager: Optional[AudioDeviceManager] = None
+
+
+def get_audio_device_manager() -> AudioDeviceManager:
+    """Get or create the global audio device manager"""
+    global _device_manager
+    if _device_manager is None:
+        _device_manager = AudioDeviceManager()
+    return _device_manager
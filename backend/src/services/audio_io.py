@@ -0,0 +1,299 @@
+"""
+Server-side audio device pipelines
+MicrophoneCapture streams the local microphone to relay subscribers as
+binary audio packets; SpeakerOutput plays relayed audio. In both, the
+PortAudio callback only copies samples to or from a preallocated ring;
+conversion and packetising happen on other threads.
+"""
+
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Optional, Tuple
+
+import numpy as np
+
+from services.audio_devices import AudioDeviceManager, get_audio_device_manager
+from streaming.media_protocol import MediaPacket, audio_packet
+from utils.sample_ring import SampleRing
+
+
+@dataclass
+class MicrophoneSettings:
+    sample_rate: int = 44100
+    channels: int = 1
+    frame_size: int = 1024  # Frames per callback and per published packet
+    ring_seconds: float = 1.0  # Bounded backlog before overruns
+    device: Optional[int] = None
+
+
+class MicrophoneCapture:
+    """Callback-driven microphone capture with packet fan-out"""
+
+    def __init__(self, settings: MicrophoneSettings = MicrophoneSettings(),
+                 devices: Optional[AudioDeviceManager] = None):
+        self.settings = settings
+        self.devices = devices or get_audio_device_manager()
+        self.stream_name = f"microphone-{id(self)}"
+        self.logger = logging.getLogger(__name__)
+        capacity = max(
+            int(settings.ring_seconds * settings.sample_rate), 2 * settings.frame_size
+        )
+        self.ring = SampleRing(capacity, settings.channels)
+        # Publisher-side buffer, reused for every packet
+        self._scratch = np.zeros((settings.frame_size, settings.channels), dtype=np.float32)
+        self._data_ready = threading.Event()
+        self._running = threading.Event()
+        self._stream = None
+        self._thread: Optional[threading.Thread] = None
+        self._subscribers: Tuple[Tuple[int, Callable[[MediaPacket], None]], ...] = ()
+        self._subscriber_lock = threading.Lock()
+        self._next_token = 0
+
+        # Metrics
+        self.callbacks = 0
+        self.status_errors = 0
+        self.packets = 0
+
+    @property
+    def running(self) -> bool:
+        return self._running.is_set()
+
+    def start(self):
+        """Open the input stream and start publishing"""
+        if self.running:
+            return
+        if not self.devices.available:
+            raise RuntimeError("sounddevice not available, microphone capture disabled")
+
+        s = self.settings
+        self.ring.clear()
+        self._running.set()
+        self._thread = threading.Thread(target=self._publish_loop, name="mic-publish", daemon=True)
+        self._thread.start()
+        try:
+            self._stream = self.devices.open_stream(
+                self.stream_name,
+                "input",
+                device=s.device,
+                channels=s.channels,
+                samplerate=s.sample_rate,
+                blocksize=s.frame_size,
+                dtype=np.float32,
+                callback=self._callback,
+            )
+        except Exception:
+            self.stop()
+            raise
+
+    def stop(self):
+        """Close the input stream and stop the publisher"""
+        self._running.clear()
+        self._data_ready.set()
+        if self._stream is not None:
+            self._stream = None
+            self.devices.close_stream(self.stream_name)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def _callback(self, indata, frames, time_info, status):
+        """PortAudio callback: copy into the ring, never allocate"""
+        self.callbacks += 1
+        if status:
+            self.status_errors += 1
+        self.ring.write(indata)
+        self._data_ready.set()
+
+    def _publish_loop(self):
+        while self.running:
+            self._data_ready.wait(timeout=0.5)
+            self._data_ready.clear()
+            self._drain()
+
+    def _drain(self):
+        """Publish every complete frame_size block in the ring"""
+        while self.ring.available() >= self.settings.frame_size:
+            self.ring.read_into(self._scratch)
+            # audio_packet copies the samples out, so the scratch buffer is
+            # free for the next block; build the wire form here rather than
+            # on the event loop
+            packet = audio_packet(self._scratch, self.settings.sample_rate, self.settings.channels)
+            packet.to_bytes()
+            self.packets += 1
+            for _, callback in self._subscribers:
+                try:
+                    callback(packet)
+                except Exception as e:
+                    self.logger.debug(f"Microphone subscriber error: {e}")
+
+    def subscribe(self, callback: Callable[[MediaPacket], None]) -> int:
+        """Call callback(packet) on the publisher thread for every audio block"""
+        with self._subscriber_lock:
+            self._next_token += 1
+            token = self._next_token
+            self._subscribers = self._subscribers + ((token, callback),)
+            return token
+
+    def unsubscribe(self, token: int):
+        with self._subscriber_lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != token)
+
+    def get_stats(self) -> dict:
+        """Get capture statistics (overruns mean the publisher fell behind)"""
+        stats = self.ring.get_stats(self.settings.sample_rate)
+        stats["callbacks"] = self.callbacks
+        stats["status_errors"] = self.status_errors
+        stats["packets"] = self.packets
+        return stats
+
+
+@dataclass
+class SpeakerSettings:
+    sample_rate: int = 44100
+    channels: int = 1
+    frame_size: int = 1024
+    ring_seconds: float = 1.0
+    target_latency: float = 0.1  # Audio buffered before playback (re)starts
+    test_tone: bool = True  # Play a tone until the first stream audio arrives
+    tone_frequency: int = 440
+    tone_level: float = 0.5
+    device: Optional[int] = None
+    fallback: bool = False  # Try other outputs if device can't be opened
+
+
+class SpeakerOutput:
+    """Callback-driven speaker fed from relayed audio packets
+
+    Packets are downmixed/resampled on the caller's thread and written to
+    a mono ring; the callback copies from the ring (or, until the first
+    packet arrives, from a precomputed one-second tone table) into the
+    output buffer without allocating.
+    """
+
+    def __init__(self, settings: SpeakerSettings = SpeakerSettings(),
+                 devices: Optional[AudioDeviceManager] = None):
+        self.settings = settings
+        self.devices = devices or get_audio_device_manager()
+        self.stream_name = f"speaker-{id(self)}"
+        self.logger = logging.getLogger(__name__)
+        capacity = max(int(settings.ring_seconds * settings.sample_rate), 2 * settings.frame_size)
+        self.ring = SampleRing(capacity, 1)
+        self._scratch = np.zeros((settings.frame_size, 1), dtype=np.float32)
+        self._prefill = int(settings.target_latency * settings.sample_rate)
+        self._primed = False
+        self._received = False  # Any stream audio since start(); ends the test tone
+
+        # One second of tone: a whole number of cycles, so wrapping the read
+        # position keeps the phase continuous across callbacks
+        n = np.arange(settings.sample_rate, dtype=np.float64)
+        self._tone = (
+            settings.tone_level
+            * np.sin(2 * np.pi * settings.tone_frequency * n / settings.sample_rate)
+        ).astype(np.float32).reshape(-1, 1)
+        self._tone_pos = 0
+
+        self._stream = None
+
+        # Metrics
+        self.callbacks = 0
+        self.status_errors = 0
+        self.packets = 0
+        self.resampled = 0
+
+    @property
+    def running(self) -> bool:
+        return self._stream is not None
+
+    def start(self):
+        """Open the output stream"""
+        if self.running:
+            return
+        if not self.devices.available:
+            raise RuntimeError("sounddevice not available, speaker output disabled")
+
+        s = self.settings
+        self.ring.clear()
+        self._primed = False
+        self._received = False
+        self._stream = self.devices.open_stream(
+            self.stream_name,
+            "output",
+            device=s.device,
+            channels=s.channels,
+            fallback=s.fallback,
+            samplerate=s.sample_rate,
+            blocksize=s.frame_size,
+            dtype=np.float32,
+            callback=self._callback,
+        )
+
+    def stop(self):
+        """Close the output stream"""
+        stream, self._stream = self._stream, None
+        if stream is not None:
+            self.devices.close_stream(self.stream_name)
+
+    def play_packet(self, packet: MediaPacket):
+        """Queue a relayed audio packet for playback
+
+        Downmixing and resampling run here, on the caller's thread: the
+        server's event loop for relayed audio, the pipeline thread for
+        desktop receivers.
+        """
+        self._received = True
+        samples = packet.samples()
+        if packet.channels > 1:
+            samples = samples.reshape(-1, packet.channels).mean(axis=1)
+        if packet.sample_rate and packet.sample_rate != self.settings.sample_rate:
+            # Linear resampling; cheap, and keeps the audio callback copy-only
+            count = int(round(len(samples) * self.settings.sample_rate / packet.sample_rate))
+            positions = np.linspace(0, len(samples) - 1, count)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+            self.resampled += 1
+        self.ring.write(samples)
+        self.packets += 1
+
+    def _callback(self, outdata, frames, time_info, status):
+        """PortAudio callback: copy buffered or tone samples, never allocate"""
+        self.callbacks += 1
+        if status:
+            self.status_errors += 1
+
+        if not self._primed and self.ring.available() >= max(self._prefill, frames):
+            self._primed = True
+
+        if self._primed and frames <= len(self._scratch):
+            scratch = self._scratch[:frames]
+            read = self.ring.read_into(scratch)
+            # Mono ring broadcast across however many output channels
+            outdata[:] = scratch
+            if read < frames:
+                # Ran dry: rebuild the jitter buffer before playing again
+                self._primed = False
+            return
+
+        # The tone only says "output works, nothing received yet"; once a
+        # stream has played, jitter gaps and re-priming are silent
+        if self.settings.test_tone and not self._received:
+            self._fill_tone(outdata, frames)
+        else:
+            outdata.fill(0)
+
+    def _fill_tone(self, outdata, frames):
+        table = self._tone
+        pos = self._tone_pos
+        first = min(frames, len(table) - pos)
+        outdata[:first] = table[pos:pos + first]
+        if frames > first:
+            outdata[first:frames] = table[:frames - first]
+        self._tone_pos = (pos + frames) % len(table)
+
+    def get_stats(self) -> dict:
+        """Get playback statistics"""
+        stats = self.ring.get_stats(self.settings.sample_rate)
+        stats["callbacks"] = self.callbacks
+        stats["status_errors"] = self.status_errors
+        stats["packets"] = self.packets
+        stats["resampled"] = self.resampled
+        return stats
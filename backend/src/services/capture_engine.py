@@ -0,0 +1,395 @@
+"""
+Webcam capture engine
+Opens a camera with negotiated format/resolution/FPS and runs a dedicated
+grab thread. Each frame is published once, read-only, to every
+subscriber (relay, preview, recording) without copying.
+
+When the camera delivers MJPEG the engine can grab the compressed frames
+as-is (passthrough) and forward them to the relay without a decode and
+re-encode; pixels are decoded only when a consumer asks for them.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from utils.media_ring import MediaRing
+
+
+@dataclass
+class CaptureSettings:
+    width: int = 1280
+    height: int = 720
+    fps: int = 30
+    fourcc: str = "MJPG"  # Compressed formats reach higher FPS over USB
+    buffer_size: int = 1  # Driver-side queue; 1 keeps latency low
+    jpeg_quality: int = 80
+    passthrough: bool = True  # Grab MJPEG packets undecoded when possible
+    max_probe_index: int = 4
+    probe_timeout: float = 5.0
+
+
+@dataclass
+class CameraInfo:
+    index: int
+    width: int
+    height: int
+    backend: str
+
+
+_probe_cache: Optional[List[CameraInfo]] = None
+_probe_lock = threading.Lock()
+
+
+def _probe_index(index: int) -> Optional[CameraInfo]:
+    cap = cv2.VideoCapture(index)
+    try:
+        if not cap.isOpened():
+            return None
+        ok, frame = cap.read()
+        if not ok or frame is None:
+            return None
+        return CameraInfo(index, frame.shape[1], frame.shape[0], cap.getBackendName())
+    except Exception:
+        return None
+    finally:
+        cap.release()
+
+
+def probe_cameras(max_index: int = 4, timeout: float = 5.0, refresh: bool = False) -> List[CameraInfo]:
+    """Find working cameras, probing all indices in parallel
+
+    Results are cached for the life of the process; pass refresh=True after
+    a device is plugged in or removed.
+    """
+    global _probe_cache
+    with _probe_lock:
+        if _probe_cache is not None and not refresh:
+            return list(_probe_cache)
+
+        executor = ThreadPoolExecutor(max_workers=max_index, thread_name_prefix="camera-probe")
+        futures = [executor.submit(_probe_index, i) for i in range(max_index)]
+        done, _ = wait(futures, timeout=timeout)
+        # A hung driver must not block startup; abandon its probe
+        executor.shutdown(wait=False)
+
+        cameras = [f.result() for f in futures if f in done and f.result() is not None]
+        _probe_cache = cameras
+        logging.getLogger(__name__).info(
+            f"Camera probe found {len(cameras)} device(s): {[c.index for c in cameras]}"
+        )
+        return list(cameras)
+
+
+def _fourcc_name(value: float) -> str:
+    code = int(value)
+    return "".join(chr((code >> (8 * i)) & 0xFF) for i in range(4)).strip("\x00")
+
+
+def _is_jpeg(frame) -> bool:
+    return (
+        frame is not None
+        and frame.dtype == np.uint8
+        and (frame.ndim == 1 or frame.shape[0] == 1)
+        and frame.size > 2
+        and frame.flat[0] == 0xFF
+        and frame.flat[1] == 0xD8
+    )
+
+
+class CaptureEngine:
+    """Threaded camera grabber with zero-copy fan-out
+
+    Frames are marked read-only and shared between subscribers, so a
+    consumer that needs to modify one must copy it. Subscriber callbacks
+    run on the grab thread and must return quickly; slow consumers should
+    use wait_for_frame() / next_jpeg() from their own thread instead.
+
+    In passthrough mode the grab ring holds JPEG packets. Pixel consumers
+    trigger a decode that is shared between them; encoded consumers
+    (subscribe(encoded=True), next_jpeg()) get the camera's bytes as-is.
+    Without passthrough the ring holds pixels and JPEG consumers trigger
+    a shared encode instead.
+    """
+
+    MAX_READ_FAILURES = 30
+    CLOSE_TIMEOUT = 2.0
+
+    def __init__(self, settings: CaptureSettings = CaptureSettings()):
+        self.settings = settings
+        self.logger = logging.getLogger(__name__)
+        self.ring = MediaRing(1)  # Newest grab: pixels, or JPEG in passthrough
+        self.source: Union[int, str, None] = None
+        self.negotiated: Dict[str, object] = {}
+        self.passthrough = False
+        self._capture = None
+        self._capture_lock = threading.Lock()  # Whoever takes _capture releases it
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._subscribers: Tuple[Tuple[int, Callable[[np.ndarray], None]], ...] = ()
+        self._encoded_subscribers: Tuple[Tuple[int, Callable[[np.ndarray], None]], ...] = ()
+        self._subscriber_lock = threading.Lock()
+        self._next_token = 0
+        # Last converted frame, shared by every consumer of that sequence
+        self._converted: Tuple[int, Optional[np.ndarray]] = (0, None)
+        self._convert_lock = threading.Lock()
+
+        # Metrics
+        self.frame_count = 0
+        self.decoded_count = 0
+        self.encoded_count = 0
+        self.read_failures = 0
+        self.subscriber_errors = 0
+        self.current_fps = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def open(self, source: Union[int, str, None] = None):
+        """Open a camera (first probed device by default) and start grabbing"""
+        if self.running:
+            if self._stop.is_set():
+                raise RuntimeError("Camera is still closing")
+            return
+
+        if source is None:
+            cameras = probe_cameras(self.settings.max_probe_index, self.settings.probe_timeout)
+            if not cameras:
+                raise RuntimeError("No working webcam found. Please check your camera connection.")
+            source = cameras[0].index
+
+        cap = self._open_capture(source)
+        self.passthrough = False
+        if self.settings.passthrough and self.settings.fourcc == "MJPG":
+            if self._enable_passthrough(cap):
+                self.passthrough = True
+            else:
+                # Undo the raw-mode request on a fresh handle
+                cap.release()
+                cap = self._open_capture(source)
+        self.negotiated["passthrough"] = self.passthrough
+
+        self._capture = cap
+        self.source = source
+        self._stop.clear()
+        self.ring.reopen()
+        self._thread = threading.Thread(target=self._grab_loop, name="camera-grab", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Camera {source} opened: {self.negotiated}")
+
+    def _open_capture(self, source):
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            raise RuntimeError(f"Could not open camera {source}")
+        self._negotiate(cap)
+        return cap
+
+    def _enable_passthrough(self, cap) -> bool:
+        """Ask the backend for undecoded MJPEG and check that it complied"""
+        try:
+            if cap.getBackendName() == "FFMPEG":
+                # FFmpeg backend hands out demuxed packets in raw mode
+                if not cap.set(cv2.CAP_PROP_FORMAT, -1):
+                    return False
+            elif not cap.set(cv2.CAP_PROP_CONVERT_RGB, 0):
+                # V4L2 / MSMF return the MJPEG buffer when conversion is off
+                return False
+            ok, frame = cap.read()
+            return ok and _is_jpeg(frame)
+        except Exception as e:
+            self.logger.debug(f"MJPEG passthrough unavailable: {e}")
+            return False
+
+    def _negotiate(self, cap):
+        """Request format, size and rate; keep what the driver actually chose"""
+        s = self.settings
+        # FOURCC must be set before the size on several backends
+        if s.fourcc:
+            cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*s.fourcc))
+        cap.set(cv2.CAP_PROP_FRAME_WIDTH, s.width)
+        cap.set(cv2.CAP_PROP_FRAME_HEIGHT, s.height)
+        cap.set(cv2.CAP_PROP_FPS, s.fps)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, s.buffer_size)
+
+        self.negotiated = {
+            "fourcc": _fourcc_name(cap.get(cv2.CAP_PROP_FOURCC)),
+            "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+            "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+            "fps": cap.get(cv2.CAP_PROP_FPS),
+            "backend": cap.getBackendName(),
+        }
+
+    def _grab_loop(self):
+        cap = self._capture
+        failures = 0
+        fps_count = 0
+        fps_timer = time.monotonic()
+        while not self._stop.is_set():
+            ok, frame = cap.read()
+            if not ok or frame is None:
+                self.read_failures += 1
+                failures += 1
+                if failures >= self.MAX_READ_FAILURES:
+                    self.logger.error(f"Camera {self.source} stopped delivering frames")
+                    break
+                time.sleep(0.01)
+                continue
+
+            failures = 0
+            if self.passthrough:
+                frame = frame.reshape(-1)
+            # Shared by reference with every consumer, so freeze it
+            frame.flags.writeable = False
+            self.ring.put(frame)
+            self.frame_count += 1
+
+            subscribers = self._subscribers
+            encoded_subscribers = self._encoded_subscribers
+            if subscribers or encoded_subscribers:
+                seq, _ = self.ring.peek_latest()
+                if subscribers:
+                    self._notify(subscribers, self._pixels(seq, frame))
+                if encoded_subscribers:
+                    self._notify(encoded_subscribers, self._jpeg(seq, frame))
+
+            fps_count += 1
+            now = time.monotonic()
+            if now - fps_timer >= 1.0:
+                self.current_fps = fps_count / (now - fps_timer)
+                fps_count = 0
+                fps_timer = now
+
+        # Wake anyone blocked in wait_for_frame()
+        self.ring.close()
+        if self._stop.is_set():
+            # close() may have given up waiting; the camera is ours to release
+            self._release_capture(cap)
+
+    def _release_capture(self, cap):
+        with self._capture_lock:
+            if cap is None or self._capture is not cap:
+                return
+            self._capture = None
+        cap.release()
+
+    def _notify(self, subscribers, frame):
+        if frame is None:
+            return
+        for _, callback in subscribers:
+            try:
+                callback(frame)
+            except Exception as e:
+                self.subscriber_errors += 1
+                self.logger.debug(f"Frame subscriber error: {e}")
+
+    def _convert(self, seq: int, item: np.ndarray, convert) -> Optional[np.ndarray]:
+        """Convert a grabbed item once per sequence, however many ask"""
+        with self._convert_lock:
+            if self._converted[0] != seq:
+                result = convert(item)
+                if result is not None:
+                    result.flags.writeable = False
+                self._converted = (seq, result)
+            return self._converted[1]
+
+    def _decode(self, jpeg: np.ndarray) -> Optional[np.ndarray]:
+        self.decoded_count += 1
+        return cv2.imdecode(jpeg, cv2.IMREAD_COLOR)
+
+    def _encode(self, frame: np.ndarray) -> Optional[np.ndarray]:
+        self.encoded_count += 1
+        ok, buffer = cv2.imencode(
+            ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), self.settings.jpeg_quality]
+        )
+        return buffer.reshape(-1) if ok else None
+
+    def _pixels(self, seq: int, item: np.ndarray) -> Optional[np.ndarray]:
+        return self._convert(seq, item, self._decode) if self.passthrough else item
+
+    def _jpeg(self, seq: int, item: np.ndarray) -> Optional[np.ndarray]:
+        return item if self.passthrough else self._convert(seq, item, self._encode)
+
+    def subscribe(self, callback: Callable[[np.ndarray], None], encoded: bool = False) -> int:
+        """Call callback on the grab thread for every new frame
+
+        With encoded=True the callback receives a 1-D uint8 JPEG array
+        instead of BGR pixels.
+        """
+        with self._subscriber_lock:
+            self._next_token += 1
+            token = self._next_token
+            # Copy-on-write so the grab thread iterates without locking
+            if encoded:
+                self._encoded_subscribers = self._encoded_subscribers + ((token, callback),)
+            else:
+                self._subscribers = self._subscribers + ((token, callback),)
+            return token
+
+    def unsubscribe(self, token: int):
+        with self._subscriber_lock:
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != token)
+            self._encoded_subscribers = tuple(
+                s for s in self._encoded_subscribers if s[0] != token
+            )
+
+    def latest(self) -> Tuple[int, Optional[np.ndarray]]:
+        """Return (sequence, newest frame as pixels) without waiting"""
+        seq, item = self.ring.peek_latest()
+        return seq, (None if item is None else self._pixels(seq, item))
+
+    def wait_for_frame(self, last_seq: int, timeout: Optional[float] = None) -> Tuple[int, Optional[np.ndarray]]:
+        """Block until a frame newer than last_seq is available, as pixels"""
+        seq, item = self.ring.wait_for_new(last_seq, timeout)
+        return seq, (None if item is None else self._pixels(seq, item))
+
+    def next_jpeg(self, last_seq: int, timeout: Optional[float] = None) -> Tuple[int, Optional[memoryview]]:
+        """Wait for a new frame and return it JPEG-encoded
+
+        In passthrough mode this is the camera's own MJPEG frame, with no
+        decode or encode.
+        """
+        seq, item = self.ring.wait_for_new(last_seq, timeout)
+        if item is None:
+            return seq, None
+        jpeg = self._jpeg(seq, item)
+        return seq, (None if jpeg is None else jpeg.data)
+
+    def get_stats(self) -> dict:
+        """Get capture statistics"""
+        return {
+            "source": self.source,
+            "running": self.running,
+            "fps": self.current_fps,
+            "frames": self.frame_count,
+            "decoded": self.decoded_count,
+            "encoded": self.encoded_count,
+            "read_failures": self.read_failures,
+            "subscribers": len(self._subscribers),
+            "subscriber_errors": self.subscriber_errors,
+            **self.negotiated,
+        }
+
+    def close(self):
+        """Stop the grab thread and release the camera"""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.CLOSE_TIMEOUT)
+            if thread.is_alive():
+                # Stuck in read(): releasing now would pull the camera out
+                # from under it. It releases the camera itself on exit
+                self.logger.warning("Camera grab thread did not stop; leaving the camera to it")
+                self.ring.close()
+                return
+            self._thread = None
+        self._release_capture(self._capture)
+        self.ring.close()
+        self.ring.clear()
@@ -0,0 +1,88 @@
+"""
+Device state store
+Folds hardware lifecycle events into one Device record per device type
+and notifies listeners only when something actually changed, so clients
+can be pushed state instead of polling for it.
+"""
+
+import asyncio
+import inspect
+import logging
+from typing import Callable, Dict
+
+from models.device import Device, DeviceStatus, DeviceType
+
+# Lifecycle event (see AsyncHardwareService) -> resulting status
+_EVENT_STATUS = {
+    "starting": DeviceStatus.STARTING,
+    "started": DeviceStatus.ACTIVE,
+    "stopping": DeviceStatus.STOPPING,
+    "stopped": DeviceStatus.INACTIVE,
+    "error": DeviceStatus.ERROR,
+}
+
+
+class DeviceStateStore:
+    """Current status of every hardware device, with change notifications"""
+
+    def __init__(self, hardware_service=None):
+        self.logger = logging.getLogger(__name__)
+        self.devices: Dict[str, Device] = {t.value: Device(t) for t in DeviceType}
+        self.version = 0
+        self._listeners = []
+        if hardware_service is not None:
+            # Devices started before the store existed
+            for name in hardware_service.devices:
+                if name in self.devices:
+                    self.devices[name].activate()
+
+    def add_listener(self, callback: Callable[[dict], object]):
+        """Register callback(snapshot); coroutine functions are scheduled as tasks"""
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def apply_event(self, event: dict) -> bool:
+        """Update from a device_event; returns True if the state changed"""
+        device = self.devices.get(event.get("device"))
+        status = _EVENT_STATUS.get(event.get("event"))
+        if device is None or status is None:
+            # e.g. "timeout": the operation is still running, nothing to show yet
+            return False
+
+        before = (device.status, device.error_message)
+        if status == DeviceStatus.ERROR:
+            device.set_error(event.get("message") or "unknown error")
+        elif status == DeviceStatus.ACTIVE:
+            device.activate()
+        elif status == DeviceStatus.INACTIVE:
+            device.deactivate()
+        else:
+            device.status = status
+            device.error_message = None
+        if (device.status, device.error_message) == before:
+            return False
+
+        self.version += 1
+        self._notify()
+        return True
+
+    def snapshot(self) -> dict:
+        """device_state message describing every device"""
+        return {
+            "type": "device_state",
+            "version": self.version,
+            "devices": {name: device.to_dict() for name, device in self.devices.items()},
+        }
+
+    def _notify(self):
+        snapshot = self.snapshot()
+        for callback in list(self._listeners):
+            try:
+                result = callback(snapshot)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                self.logger.error(f"Device state listener error: {e}")
@@ -1,23 +1,27 @@
-import cv2
 import logging
-from threading import Lock, Thread
-import time
-import queue
-import numpy as np
-import sounddevice as sd
+from threading import Lock
+from services.audio_io import (
+    MicrophoneCapture, MicrophoneSettings, SpeakerOutput, SpeakerSettings
+)
+from services.capture_engine import CaptureEngine, CaptureSettings
 from utils.audio_handler import AudioHandler
 
 
 class HardwareService:
-    def __init__(self):
+    def __init__(self, capture_settings: CaptureSettings = None,
+                 microphone_settings: MicrophoneSettings = None,
+                 speaker_settings: SpeakerSettings = None):
         self.logger = logging.getLogger(__name__)
+        self.capture_settings = capture_settings or CaptureSettings()
+        self.microphone_settings = microphone_settings or MicrophoneSettings()
+        self.speaker_settings = speaker_settings or SpeakerSettings()
         self.devices = {}
         self.locks = {"webcam": Lock(), "microphone": Lock(), "speaker": Lock()}
         self.running = False
 
     def get_device_status(self, device_type):
-        """Get the status of a device"""
-        device_name = device_type.value.lower()
+        """Get the status of a device (a DeviceType or its name)"""
+        device_name = getattr(device_type, "value", device_type).lower()
         return "running" if device_name in self.devices else "stopped"
 
     def start_device(self, device_type):
@@ -75,152 +79,59 @@ class HardwareService:
                     del self.devices[device_type]
                 raise
 
+    def get_webcam(self):
+        """Return the running webcam CaptureEngine, or None"""
+        webcam = self.devices.get("webcam")
+        return webcam["engine"] if webcam else None
+
     def _start_webcam(self):
         """Initialize and start webcam capture"""
-        for index in range(2):
-            try:
-                cap = cv2.VideoCapture(index)
-                if cap.isOpened():
-                    ret, frame = cap.read()
-                    if ret:
-                        self.devices["webcam"] = {
-                            "device": cap,
-                            "thread": Thread(target=self._webcam_thread),
-                            "running": True,
-                            "index": index,
-                        }
-                        self.devices["webcam"]["thread"].start()
-                        self.logger.info(f"Successfully opened webcam at index {index}")
-                        return
-                    cap.release()
-                else:
-                    cap.release()
-            except Exception as e:
-                self.logger.error(f"Error trying camera index {index}: {e}")
-                if cap:
-                    cap.release()
+        engine = CaptureEngine(self.capture_settings)
+        # Raises RuntimeError if no camera answers the (cached) probe
+        engine.open()
+        self.devices["webcam"] = {
+            "engine": engine,
+            "index": engine.source,
+        }
+        self.logger.info(f"Successfully opened webcam at index {engine.source}")
 
-        raise RuntimeError(
-            "No working webcam found. Please check your camera connection."
-        )
+    def get_microphone(self):
+        """Return the running MicrophoneCapture, or None"""
+        microphone = self.devices.get("microphone")
+        return microphone["capture"] if microphone else None
 
     def _start_microphone(self):
         """Initialize and start microphone capture"""
-        self.devices["microphone"] = {
-            "queue": queue.Queue(),
-            "thread": Thread(target=self._microphone_thread),
-            "running": True,
-            "sample_rate": 44100,
-            "channels": 1,
-            "dtype": np.float32,
-            "blocksize": 1024,
-        }
-        self.devices["microphone"]["thread"].start()
+        capture = MicrophoneCapture(self.microphone_settings)
+        capture.start()
+        self.devices["microphone"] = {"capture": capture}
+
+    def get_speaker(self):
+        """Return the running SpeakerOutput, or None"""
+        speaker = self.devices.get("speaker")
+        return speaker["output"] if speaker else None
 
     def _start_speaker(self):
         """Initialize and start speaker output"""
-        self.devices["speaker"] = {
-            "queue": queue.Queue(),
-            "thread": Thread(target=self._speaker_thread),
-            "running": True,
-            "sample_rate": 44100,
-            "channels": 1,
-            "dtype": np.float32,
-            "blocksize": 1024,
-        }
-        self.devices["speaker"]["thread"].start()
+        output = SpeakerOutput(self.speaker_settings)
+        output.start()
+        self.devices["speaker"] = {"output": output}
 
     def _stop_webcam(self):
         """Stop webcam capture"""
         if "webcam" in self.devices:
-            self.devices["webcam"]["running"] = False
-            self.devices["webcam"]["thread"].join()
-            self.devices["webcam"]["device"].release()
+            self.devices["webcam"]["engine"].close()
 
     def _stop_microphone(self):
         """Stop microphone capture"""
         if "microphone" in self.devices:
-            self.devices["microphone"]["running"] = False
-            self.devices["microphone"]["thread"].join()
-            sd.stop()
+            capture = self.devices["microphone"]["capture"]
+            self.logger.info(f"Microphone stats: {capture.get_stats()}")
+            capture.stop()
 
     def _stop_speaker(self):
         """Stop speaker output"""
         if "speaker" in self.devices:
-            self.devices["speaker"]["running"] = False
-            self.devices["speaker"]["thread"].join()
-            sd.stop()
-
-    def _webcam_thread(self):
-        """Webcam capture thread"""
-        while self.devices["webcam"]["running"]:
-            ret, frame = self.devices["webcam"]["device"].read()
-            if ret:
-                # Process frame here
-                # For example, display it in a window
-                cv2.imshow("NodeFlow Webcam", frame)
-                if cv2.waitKey(1) & 0xFF == ord("q"):
-                    break
-
-        cv2.destroyAllWindows()
-
-    def _microphone_thread(self):
-        """Microphone capture thread"""
-        device_info = self.devices["microphone"]
-
-        def audio_callback(indata, frames, time, status):
-            if status:
-                self.logger.warning(f"Audio input status: {status}")
-            device_info["queue"].put(indata.copy())
-
-        try:
-            with sd.InputStream(
-                channels=device_info["channels"],
-                samplerate=device_info["sample_rate"],
-                blocksize=device_info["blocksize"],
-                dtype=device_info["dtype"],
-                callback=audio_callback,
-            ):
-                while device_info["running"]:
-                    try:
-                        device_info["queue"].get(timeout=1.0)
-                    except queue.Empty:
-                        continue
-
-        except Exception as e:
-            self.logger.error(f"Error in microphone thread: {e}")
-            device_info["running"] = False
-
-    def _speaker_thread(self):
-        """Speaker output thread"""
-        device_info = self.devices["speaker"]
-
-        def audio_callback(outdata, frames, time, status):
-            if status:
-                self.logger.warning(f"Audio output status: {status}")
-
-            try:
-                # Generate a test tone (sine wave) if no data in queue
-                t = np.linspace(0, frames / device_info["sample_rate"], frames)
-                tone = 0.5 * np.sin(2 * np.pi * 440 * t)  # 440 Hz test tone
-                # Expand mono tone to match configured channels
-                tone_col = tone.reshape(-1, 1)
-                outdata[:] = np.tile(tone_col, (1, device_info["channels"]))
-            except Exception as e:
-                self.logger.error(f"Error generating audio: {e}")
-                outdata.fill(0)
-
-        try:
-            with sd.OutputStream(
-                channels=device_info["channels"],
-                samplerate=device_info["sample_rate"],
-                blocksize=device_info["blocksize"],
-                dtype=device_info["dtype"],
-                callback=audio_callback,
-            ):
-                while device_info["running"]:
-                    time.sleep(0.1)
-
-        except Exception as e:
-            self.logger.error(f"Error in speaker thread: {e}")
-            device_info["running"] = False
+            output = self.devices["speaker"]["output"]
+            self.logger.info(f"Speaker stats: {output.get_stats()}")
+            output.stop()
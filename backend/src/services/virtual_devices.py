@@ -8,10 +8,12 @@ import logging
 import threading
 import cv2
 import numpy as np
-import sounddevice as sd
 from typing import Optional, Tuple
 from pathlib import Path
 
+from services.audio_devices import get_audio_device_manager
+from utils.buffer_pool import get_frame_pool
+
 try:
     import pyvirtualcam
     PYVIRTUALCAM_AVAILABLE = True
@@ -63,18 +65,29 @@ class VirtualCameraManager:
         if not self.camera or not PYVIRTUALCAM_AVAILABLE:
             return False
         
+        pool = get_frame_pool()
+        borrowed = []
         try:
             with self.lock:
-                # Ensure frame is BGR and correct size
+                # Ensure frame is BGR and correct size, reusing pooled
+                # buffers for the intermediate results
                 if frame.shape[:2] != (self.height, self.width):
-                    frame = cv2.resize(frame, (self.width, self.height))
+                    resized = pool.acquire((self.height, self.width) + frame.shape[2:], frame.dtype)
+                    borrowed.append(resized)
+                    frame = cv2.resize(frame, (self.width, self.height), dst=resized)
                 
                 if len(frame.shape) == 2:  # Grayscale
-                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR)
+                    converted = pool.acquire((self.height, self.width, 3))
+                    borrowed.append(converted)
+                    frame = cv2.cvtColor(frame, cv2.COLOR_GRAY2BGR, dst=converted)
                 elif frame.shape[2] == 4:  # RGBA
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+                    converted = pool.acquire((self.height, self.width, 3))
+                    borrowed.append(converted)
+                    frame = cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR, dst=converted)
                 elif frame.shape[2] == 3 and np.mean(frame[:,:,0]) > np.mean(frame[:,:,2]):  # RGB
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+                    converted = pool.acquire((self.height, self.width, 3))
+                    borrowed.append(converted)
+                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR, dst=converted)
                 
                 self.camera.send(frame)
                 self.camera.sleep_until_next_frame()
@@ -83,6 +96,9 @@ class VirtualCameraManager:
         except Exception as e:
             logger.debug(f"Virtual camera send error: {e}")
             return False
+        finally:
+            for buffer in borrowed:
+                pool.release(buffer)
     
     def start(self) -> bool:
         """Start virtual camera"""
@@ -125,7 +141,7 @@ class VirtualAudioRouter:
     def _detect_virtual_audio(self):
         """Detect virtual audio devices (VB-Cable, Virtual Audio Cable, etc.)"""
         try:
-            devices = sd.query_devices()
+            devices = get_audio_device_manager().query_devices()
             
             virtual_names = [
                 'CABLE Input',  # VB-Audio Virtual Cable
@@ -165,19 +181,22 @@ class VirtualAudioRouter:
         return self.virtual_device_index is not None
     
     def activate(self) -> bool:
-        """Activate virtual audio routing"""
+        """Activate virtual audio routing
+
+        The process-wide default device is left alone; players pick up
+        the cable through get_output_device() and pass it explicitly.
+        """
         if not self.is_available():
             logger.warning("Virtual audio device not available")
             return False
-        
-        try:
-            sd.default.device = self.virtual_device_index
-            self.is_active = True
-            logger.info(f"✓ Audio routing activated to: {self.device_name}")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to activate virtual audio routing: {e}")
-            return False
+
+        self.is_active = True
+        logger.info(f"✓ Audio routing activated to: {self.device_name}")
+        return True
+
+    def get_output_device(self) -> Optional[int]:
+        """Device index audio should be played to, or None for the default"""
+        return self.virtual_device_index if self.is_active else None
     
     def deactivate(self):
         """Deactivate virtual audio routing"""
@@ -213,6 +232,10 @@ class VirtualDeviceManager:
     def activate_audio_routing(self) -> bool:
         """Activate virtual audio routing"""
         return self.audio_router.activate()
+
+    def get_audio_output_device(self) -> Optional[int]:
+        """Device index for routed audio playback, or None for the default"""
+        return self.audio_router.get_output_device()
     
     def get_virtual_camera_info(self) -> dict:
         """Get virtual camera information"""
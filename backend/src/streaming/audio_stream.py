@@ -1,21 +1,11 @@
 import numpy as np
 import logging
-from queue import Queue
-from threading import Thread, Event
+from threading import Event
 from typing import Optional, Tuple, Any
 from dataclasses import dataclass
 
-# Try to import sounddevice, fallback to pyaudio if not available
-try:
-    import sounddevice as sd
-    HAS_SOUNDDEVICE = True
-except ImportError:
-    try:
-        import pyaudio
-        HAS_SOUNDDEVICE = False
-    except ImportError:
-        HAS_SOUNDDEVICE = False
-        pyaudio = None
+from services.audio_devices import AudioDeviceManager, get_audio_device_manager
+from utils.sample_ring import SampleRing
 
 
 @dataclass
@@ -23,63 +13,63 @@ class AudioConfig:
     channels: int = 1
     sample_rate: int = 44100
     chunk_size: int = 1024
-    max_queue_size: int = 50
+    max_queue_size: int = 50  # Ring capacity, in chunks
     target_latency: float = 0.1  # Target latency in seconds
 
 
 class AudioStreamProcessor:
-    def __init__(self, config: AudioConfig = AudioConfig()):
+    """Plays incoming PCM through a callback-driven output stream
+
+    process_audio() writes into a preallocated sample ring; the PortAudio
+    callback pulls from it. There is no playback thread, so an idle
+    processor costs nothing. Playback starts (and restarts after an
+    underrun) once target_latency worth of audio is buffered.
+    """
+
+    def __init__(self, config: AudioConfig = AudioConfig(),
+                 devices: Optional[AudioDeviceManager] = None, device=None):
         self.config = config
-        self.audio_queue = Queue(maxsize=config.max_queue_size)
+        self.devices = devices or get_audio_device_manager()
+        self.device = device  # None plays on the host default output
+        self.stream_name = f"playback-{id(self)}"
+        self.ring = SampleRing(config.max_queue_size * config.chunk_size, config.channels)
         self.stopped = Event()
         self.logger = logging.getLogger(__name__)
-        self.stream: Optional[sd.OutputStream] = None
-        self.playback_thread: Optional[Thread] = None
+        self.stream = None  # sd.OutputStream
+        self._prefill_frames = int(config.target_latency * config.sample_rate)
+        self._primed = False
+        # For output devices with another channel count than the ring (a
+        # fallback device): the callback reads through this, allocated
+        # before any stream can call back
+        self._scratch = np.zeros((config.chunk_size, config.channels), dtype=np.float32)
+
+        # Metrics
+        self.callbacks = 0
+        self.status_errors = 0
 
     def start_playback(self):
-        """Start audio playback thread"""
-        if self.playback_thread is not None and self.playback_thread.is_alive():
+        """Start callback-driven audio playback"""
+        if self.stream is not None:
             return
 
-        try:
-            if HAS_SOUNDDEVICE:
-                try:
-                    # Try default output device first
-                    self.stream = sd.OutputStream(
-                        channels=self.config.channels,
-                        samplerate=self.config.sample_rate,
-                        blocksize=self.config.chunk_size,
-                        dtype=np.float32,
-                    )
-                    self.stream.start()
-                except Exception:
-                    # Fallback: scan devices for first working output device
-                    devices = sd.query_devices()
-                    for i, d in enumerate(devices):
-                        max_out = int(d.get('max_output_channels', 0) or 0)
-                        if max_out >= 1:
-                            try:
-                                ch = max(min(max_out, self.config.channels), 1)
-                                self.stream = sd.OutputStream(
-                                    channels=ch,
-                                    samplerate=self.config.sample_rate,
-                                    blocksize=self.config.chunk_size,
-                                    dtype=np.float32,
-                                    device=i
-                                )
-                                self.stream.start()
-                                self.logger.info(f"Audio playback using device {i} ({d['name']})")
-                                break
-                            except Exception:
-                                continue
-            else:
-                self.logger.warning("sounddevice not available, audio playback disabled")
-                return
+        if not self.devices.available:
+            self.logger.warning("sounddevice not available, audio playback disabled")
+            return
 
+        try:
+            # Requested device first, then any output that can take the stream
+            self.stream = self.devices.open_stream(
+                self.stream_name,
+                "output",
+                device=self.device,
+                channels=self.config.channels,
+                fallback=True,
+                samplerate=self.config.sample_rate,
+                blocksize=self.config.chunk_size,
+                dtype=np.float32,
+                callback=self._callback,
+            )
             self.stopped.clear()
-            self.playback_thread = Thread(target=self._playback_worker)
-            self.playback_thread.daemon = True
-            self.playback_thread.start()
 
         except Exception as e:
             self.logger.error(f"Error starting audio playback: {str(e)}")
@@ -88,45 +78,62 @@ class AudioStreamProcessor:
         """Stop audio playback"""
         self.stopped.set()
         if self.stream is not None:
-            self.stream.stop()
-            self.stream.close()
             self.stream = None
+            self.devices.close_stream(self.stream_name)
+        self._primed = False
+
+    def _callback(self, outdata, frames, time_info, status):
+        """PortAudio callback: copy buffered samples, never allocate"""
+        self.callbacks += 1
+        if status:
+            self.status_errors += 1
+
+        if not self._primed:
+            if self.ring.available() < self._prefill_frames:
+                outdata.fill(0)
+                return
+            self._primed = True
 
-    def _playback_worker(self):
-        """Worker thread for audio playback"""
-        while not self.stopped.is_set():
-            try:
-                if not self.audio_queue.empty() and self.stream is not None:
-                    audio_data = self.audio_queue.get()
-                    if isinstance(audio_data, np.ndarray):
-                        self.stream.write(audio_data)
-            except Exception as e:
-                self.logger.error(f"Error in audio playback: {str(e)}")
+        if outdata.shape[1] == self.config.channels:
+            read = self.ring.read_into(outdata)
+        elif frames > len(self._scratch):
+            outdata.fill(0)
+            return
+        else:
+            scratch = self._scratch[:frames]
+            read = self.ring.read_into(scratch)
+            outdata[:] = scratch[:, :outdata.shape[1]]
+
+        if read < frames:
+            # Ran dry: rebuild the jitter buffer before playing again
+            self._primed = False
 
     async def process_audio(self, audio_data: bytes) -> Tuple[bool, Any]:
         """Process incoming audio data from WebSocket"""
         try:
-            # Convert bytes to numpy array
+            # View bytes as samples; the ring copies them into its buffer and
+            # overwrites the oldest audio if playback has fallen behind
             audio_array = np.frombuffer(audio_data, dtype=np.float32)
-
-            # Add to queue, drop oldest chunk if full
-            if self.audio_queue.full():
-                try:
-                    self.audio_queue.get_nowait()
-                except Exception:
-                    pass
-
-            self.audio_queue.put(audio_array)
+            self.ring.write(audio_array)
             return True, None
 
         except Exception as e:
             self.logger.error(f"Error processing audio: {str(e)}")
             return False, str(e)
 
-    def clear(self):
-        """Clear audio queue"""
-        while not self.audio_queue.empty():
+    def get_stats(self) -> dict:
+        """Get playback statistics (underruns, overruns, buffered latency)"""
+        stats = self.ring.get_stats(self.config.sample_rate)
+        stats["callbacks"] = self.callbacks
+        stats["status_errors"] = self.status_errors
+        if self.stream is not None:
             try:
-                self.audio_queue.get_nowait()
+                stats["device_latency_ms"] = 1000.0 * float(self.stream.latency)
             except Exception:
                 pass
+        return stats
+
+    def clear(self):
+        """Clear buffered audio"""
+        self.ring.clear()
+        self._primed = False
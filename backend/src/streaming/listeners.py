@@ -0,0 +1,125 @@
+"""
+Server listeners and their access policies
+StreamingServer can listen on several endpoints at once: TLS for phones
+on the LAN, plain TCP on loopback and a Unix socket for receivers on the
+same machine. Local receivers skip the TLS handshake and encryption
+without exposing a plaintext port to the network. Each listener carries
+its own policy.
+"""
+
+import ipaddress
+import os
+import ssl
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from aiohttp import web
+
+# Plaintext loopback port for local receivers (ws://127.0.0.1:5001/ws)
+LOOPBACK_PORT = 5001
+
+
+@dataclass
+class ListenerPolicy:
+    publish: bool = True  # May send media into the relay
+    receive: bool = True  # Gets relayed media
+    device_control: bool = True  # May start/stop the server's devices
+    require_permission: bool = True  # Device commands checked by SecurityManager
+    loopback_only: bool = False  # Refuse peers that aren't on this machine
+
+
+# Where the request's listener policy is stored (typed keys need a newer aiohttp)
+POLICY_KEY = web.RequestKey("policy", ListenerPolicy) if hasattr(web, "RequestKey") else "policy"
+
+
+@dataclass
+class Listener:
+    name: str
+    host: Optional[str] = None
+    port: Optional[int] = None
+    path: Optional[str] = None  # Unix socket path; host/port unused
+    ssl_context: Optional[ssl.SSLContext] = None
+    policy: ListenerPolicy = field(default_factory=ListenerPolicy)
+
+    @property
+    def is_unix(self) -> bool:
+        return self.path is not None
+
+    @property
+    def url(self) -> str:
+        if self.is_unix:
+            return f"unix:{self.path}"
+        protocol = "https" if self.ssl_context else "http"
+        return f"{protocol}://{self.host}:{self.port}"
+
+    def create_site(self, runner: web.AppRunner):
+        if self.is_unix:
+            return web.UnixSite(runner, self.path)
+        return web.TCPSite(runner, self.host, self.port, ssl_context=self.ssl_context)
+
+    def matches(self, sockname) -> bool:
+        """Whether a connection's local address belongs to this listener"""
+        if self.is_unix:
+            return isinstance(sockname, (str, bytes)) and os.fsdecode(sockname) == self.path
+        return isinstance(sockname, tuple) and len(sockname) >= 2 and sockname[1] == self.port
+
+
+def network_listener(host: str = "0.0.0.0", port: int = 5000,
+                     ssl_context: Optional[ssl.SSLContext] = None) -> Listener:
+    """The LAN listener phones connect to (TLS when a context is given)"""
+    name = "lan-tls" if ssl_context else "lan"
+    return Listener(name, host=host, port=port, ssl_context=ssl_context)
+
+
+def loopback_listener(port: int = LOOPBACK_PORT) -> Listener:
+    """Plaintext TCP on 127.0.0.1 for receivers on this machine"""
+    return Listener("loopback", host="127.0.0.1", port=port,
+                    policy=ListenerPolicy(loopback_only=True))
+
+
+def unix_socket_path(port: int = 5000) -> str:
+    """Default Unix socket of the relay whose LAN listener is on port"""
+    return str(Path.home() / ".nodeflow" / f"nodeflow-{port}.sock")
+
+
+def unix_listener(path: Optional[str] = None) -> Listener:
+    """Unix socket usable by the current user only
+
+    Filesystem permissions already restrict who can connect, so device
+    commands skip the permission check.
+    """
+    if path is None:
+        path = unix_socket_path()
+    return Listener("unix", path=path, policy=ListenerPolicy(require_permission=False))
+
+
+def unix_sockets_supported() -> bool:
+    # asyncio has no Unix server support on Windows
+    return sys.platform != "win32"
+
+
+def default_listeners(host: str = "0.0.0.0", port: int = 5000,
+                      ssl_context: Optional[ssl.SSLContext] = None) -> List[Listener]:
+    """LAN listener plus the local ones this platform supports"""
+    listeners = [network_listener(host, port, ssl_context)]
+    if port != LOOPBACK_PORT:
+        listeners.append(loopback_listener())
+    if unix_sockets_supported():
+        listeners.append(unix_listener(unix_socket_path(port)))
+    return listeners
+
+
+def is_loopback(remote) -> bool:
+    """Whether a peer address (request.remote) is on this machine"""
+    if not remote:
+        # Unix socket peers have no address
+        return True
+    try:
+        address = ipaddress.ip_address(remote.split("%")[0])
+    except ValueError:
+        return False
+    # ::ffff:127.0.0.1 from dual-stack sockets
+    mapped = getattr(address, "ipv4_mapped", None)
+    return (mapped or address).is_loopback
@@ -0,0 +1,190 @@
+"""
+NodeFlow binary media protocol
+Media travels as WebSocket binary messages: a fixed 16-byte little-endian
+header followed by the raw payload (JPEG bytes or float32 PCM samples).
+
+    offset  size  field
+    0       1     version (1)
+    1       1     kind (1 = JPEG video, 2 = float32 PCM audio)
+    2       1     flags (bit 0 = keyframe)
+    3       1     channels (audio only)
+    4       4     sample rate in Hz (audio only)
+    8       8     capture timestamp, ms since the Unix epoch (float64)
+
+Older clients use JSON text messages with base64/float-list payloads.
+MediaPacket converts between the two lazily, so a packet is only re-encoded
+if some subscriber actually needs the other representation.
+"""
+
+import base64
+import json
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+
+HEADER = struct.Struct("<BBBBId")
+HEADER_SIZE = HEADER.size
+VERSION = 1
+
+KIND_VIDEO = 1
+KIND_AUDIO = 2
+
+FLAG_KEYFRAME = 0x01
+
+_KIND_NAMES = {KIND_VIDEO: "video", KIND_AUDIO: "audio"}
+_NAME_KINDS = {name: kind for kind, name in _KIND_NAMES.items()}
+
+
+class ProtocolError(ValueError):
+    """Raised for malformed media messages"""
+
+
+class MediaPacket:
+    """One video frame or audio block, in either wire representation"""
+
+    __slots__ = (
+        "kind", "timestamp", "sample_rate", "channels", "keyframe",
+        "_payload", "_binary", "_json_data", "_json_text",
+    )
+
+    def __init__(
+        self,
+        kind: int,
+        payload=None,
+        timestamp: Optional[float] = None,
+        sample_rate: int = 0,
+        channels: int = 0,
+        keyframe: bool = True,
+    ):
+        if kind not in _KIND_NAMES:
+            raise ProtocolError(f"Unknown media kind: {kind}")
+        self.kind = kind
+        self.timestamp = time.time() * 1000.0 if timestamp is None else float(timestamp)
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.keyframe = bool(keyframe)
+        self._payload = payload
+        self._binary = None
+        self._json_data = None
+        self._json_text = None
+
+    @property
+    def is_video(self) -> bool:
+        return self.kind == KIND_VIDEO
+
+    @property
+    def is_audio(self) -> bool:
+        return self.kind == KIND_AUDIO
+
+    @property
+    def type_name(self) -> str:
+        return _KIND_NAMES[self.kind]
+
+    @classmethod
+    def parse(cls, data) -> "MediaPacket":
+        """Parse a binary message; the payload is a view, not a copy"""
+        if len(data) < HEADER_SIZE:
+            raise ProtocolError("Media message shorter than header")
+        version, kind, flags, channels, sample_rate, timestamp = HEADER.unpack_from(data)
+        if version != VERSION:
+            raise ProtocolError(f"Unsupported media protocol version: {version}")
+        packet = cls(
+            kind,
+            memoryview(data)[HEADER_SIZE:],
+            timestamp=timestamp,
+            sample_rate=sample_rate,
+            channels=channels,
+            keyframe=bool(flags & FLAG_KEYFRAME),
+        )
+        if isinstance(data, bytes):
+            packet._binary = data
+        return packet
+
+    @classmethod
+    def from_json(cls, data: dict, text: Optional[str] = None) -> "MediaPacket":
+        """Wrap a legacy JSON video/audio message
+
+        The payload is decoded only when the binary form is requested, and
+        the original text (if given) is reused for JSON subscribers.
+        """
+        kind = _NAME_KINDS.get(data.get("type"))
+        if kind is None:
+            raise ProtocolError(f"Not a media message: {data.get('type')}")
+        if not data.get("data"):
+            raise ProtocolError("Media message without data")
+        packet = cls(
+            kind,
+            timestamp=data.get("timestamp"),
+            sample_rate=data.get("sampleRate", 16000) if kind == KIND_AUDIO else 0,
+            channels=data.get("channelCount", 1) if kind == KIND_AUDIO else 0,
+            keyframe=data.get("keyframe", True),
+        )
+        packet._json_data = data
+        packet._json_text = text
+        return packet
+
+    @property
+    def payload(self):
+        """Raw payload bytes (JPEG or float32 PCM)"""
+        if self._payload is None:
+            field = self._json_data.get("data")
+            if isinstance(field, list):
+                self._payload = np.asarray(field, dtype=np.float32).tobytes()
+            else:
+                self._payload = base64.b64decode(field)
+        return self._payload
+
+    def samples(self) -> np.ndarray:
+        """Audio payload as a float32 array view"""
+        return np.frombuffer(self.payload, dtype=np.float32)
+
+    def header(self) -> bytes:
+        flags = FLAG_KEYFRAME if self.keyframe else 0
+        return HEADER.pack(
+            VERSION, self.kind, flags, self.channels, self.sample_rate, self.timestamp
+        )
+
+    def to_bytes(self) -> bytes:
+        """Binary wire form (cached)"""
+        if self._binary is None:
+            self._binary = self.header() + bytes(self.payload)
+        return self._binary
+
+    def to_json_data(self) -> dict:
+        """Legacy JSON message dict"""
+        if self._json_data is None:
+            data = {
+                "type": self.type_name,
+                "data": base64.b64encode(self.payload).decode("ascii"),
+                "timestamp": self.timestamp,
+            }
+            if self.is_audio:
+                data["sampleRate"] = self.sample_rate
+                data["channelCount"] = self.channels
+            elif not self.keyframe:
+                data["keyframe"] = False
+            self._json_data = data
+        return self._json_data
+
+    def to_json_text(self) -> str:
+        """Legacy JSON wire form (cached)"""
+        if self._json_text is None:
+            self._json_text = json.dumps(self.to_json_data())
+        return self._json_text
+
+
+def video_packet(jpeg, timestamp: Optional[float] = None, keyframe: bool = True) -> MediaPacket:
+    """Build a JPEG video packet"""
+    return MediaPacket(KIND_VIDEO, jpeg, timestamp=timestamp, keyframe=keyframe)
+
+
+def audio_packet(samples, sample_rate: int, channels: int = 1,
+                 timestamp: Optional[float] = None) -> MediaPacket:
+    """Build a float32 PCM audio packet from an array or raw bytes"""
+    if isinstance(samples, np.ndarray):
+        samples = samples.astype(np.float32, copy=False).tobytes()
+    return MediaPacket(
+        KIND_AUDIO, samples, timestamp=timestamp, sample_rate=sample_rate, channels=channels
+    )
@@ -0,0 +1,363 @@
+"""
+Receiver core shared by every desktop frontend
+ReceiverPipeline takes packets from any source (a relay connection, the
+shared-memory bus, an in-process server), keeps a small drop-oldest
+backlog per kind and dispatches them on one thread: each video frame is
+decoded at most once (see DecodedFrame in sinks.py) and fanned out to
+the sinks, audio goes out ahead of queued video.
+
+ReceiverCore is the network source: an aiohttp WebSocket client that asks
+the relay for binary frames, reconnects with jittered backoff
+(reconnect.py) and resumes its session (sessions.py). The frontends
+(receiver.py, receiver_gui.py, receiver_console.py and
+virtual_devices_windows.py) only choose sinks and show status.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional, Union
+
+import aiohttp
+
+from streaming.media_protocol import MediaPacket, ProtocolError
+from streaming.reconnect import Backoff
+from streaming.sinks import DecodedFrame, Sink
+
+
+class ReceiverPipeline:
+    """Decode-once fan-out from packet sources to sinks
+
+    submit() may be called from any thread and never blocks; dispatch
+    runs on the pipeline's own thread once start() is called. An inline
+    pipeline has no thread and dispatches in submit() itself, on the
+    caller's thread: for cheap sinks only, e.g. the load tester's
+    hundreds of connections on one event loop.
+    """
+
+    def __init__(self, sinks: Iterable[Sink] = (), max_video: int = 2, max_audio: int = 64,
+                 inline: bool = False):
+        self.sinks = tuple(sinks)
+        self.inline = inline
+        self.video = deque(maxlen=max_video)
+        self.audio = deque(maxlen=max_audio)
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition(threading.Lock())
+        self._sinks_lock = threading.Lock()
+        self._thread = None
+        self._running = False
+
+        # Metrics
+        self.video_packets = 0
+        self.audio_packets = 0
+        self.dropped_video = 0
+        self.dropped_audio = 0
+        self.decoded = 0
+        self.sink_errors = 0
+
+    def add_sink(self, sink: Sink):
+        with self._sinks_lock:
+            self.sinks = self.sinks + (sink,)
+
+    def remove_sink(self, sink: Sink):
+        with self._sinks_lock:
+            self.sinks = tuple(s for s in self.sinks if s is not sink)
+
+    def submit(self, packet: Union[MediaPacket, DecodedFrame]):
+        """Queue a packet for dispatch; the oldest of its kind goes if full
+
+        A source that had to decode in place (DecodedFrame.decode_now) may
+        submit the frame instead of the packet.
+        """
+        if self.inline:
+            self.dispatch(packet)
+            return
+        is_audio = not isinstance(packet, DecodedFrame) and packet.is_audio
+        with self._cond:
+            queue = self.audio if is_audio else self.video
+            if len(queue) == queue.maxlen:
+                if is_audio:
+                    self.dropped_audio += 1
+                else:
+                    self.dropped_video += 1
+            queue.append(packet)
+            self._cond.notify()
+
+    def dispatch(self, packet: Union[MediaPacket, DecodedFrame]):
+        """Hand one packet to every sink, on the calling thread"""
+        sinks = self.sinks
+        if isinstance(packet, DecodedFrame) or packet.is_video:
+            self.video_packets += 1
+            frame = packet if isinstance(packet, DecodedFrame) else DecodedFrame(packet)
+            for sink in sinks:
+                self._call(sink.on_video, frame)
+            if frame.decoded:
+                self.decoded += 1
+        else:
+            self.audio_packets += 1
+            for sink in sinks:
+                self._call(sink.on_audio, packet)
+
+    def _call(self, method, item):
+        try:
+            method(item)
+        except Exception as e:
+            self.sink_errors += 1
+            self.logger.debug(f"Sink {getattr(method, '__self__', method)} failed: {e}")
+
+    def start(self):
+        """Start the dispatch thread"""
+        if self.inline:
+            return
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="receiver-pipeline", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._running and not self.audio and not self.video:
+                    self._cond.wait()
+                if not self._running:
+                    return
+                packet = self.audio.popleft() if self.audio else self.video.popleft()
+            self.dispatch(packet)
+
+    def stop(self, close_sinks: bool = True):
+        """Stop dispatching (queued packets are discarded) and close the sinks"""
+        with self._cond:
+            self._running = False
+            self.audio.clear()
+            self.video.clear()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        self._thread = None
+        if close_sinks:
+            for sink in self.sinks:
+                self._call(lambda s: s.close(), sink)
+
+    def get_stats(self) -> dict:
+        stats = {
+            "video_packets": self.video_packets,
+            "audio_packets": self.audio_packets,
+            "dropped_video": self.dropped_video,
+            "dropped_audio": self.dropped_audio,
+            "decoded": self.decoded,
+            "sink_errors": self.sink_errors,
+        }
+        for sink in self.sinks:
+            sink_stats = sink.get_stats()
+            if sink_stats:
+                stats[sink.name] = sink_stats
+        return stats
+
+
+class ReceiverCore:
+    """Relay connection feeding a ReceiverPipeline
+
+    run() is a coroutine that connects, reconnects after drops and
+    returns once stop() is called; start() runs it on a thread of its own
+    for frontends that aren't asyncio based. The backoff resets only
+    after a connection stayed up for stable_after seconds, so a relay
+    that accepts and immediately drops clients still gets spaced retries.
+    """
+
+    def __init__(self, url: str, pipeline: ReceiverPipeline, client: str = "receiver",
+                 on_status: Optional[Callable[[str], None]] = None,
+                 on_control: Optional[Callable[[dict], None]] = None,
+                 backoff: Optional[Backoff] = None, verify_ssl: bool = False,
+                 stable_after: float = 10.0, heartbeat: float = 15.0):
+        self.url = url
+        self.pipeline = pipeline
+        self.client = client
+        self.on_status = on_status
+        self.on_control = on_control
+        self.backoff = backoff or Backoff()
+        # The relay's certificate is self-signed
+        self.ssl = verify_ssl or not url.startswith("wss")
+        self.stable_after = stable_after
+        self.heartbeat = heartbeat
+        self.session = None
+        self.logger = logging.getLogger(__name__)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._stop_requested = False
+        self._ws = None
+        self._thread = None
+        self._connected_at = None
+        self._disconnected_at = None
+        self._last_uptime = 0.0
+
+        # Metrics
+        self.attempts = 0
+        self.connects = 0
+        self.failures = 0  # Attempts that never opened
+        self.resumed = 0
+        self.invalid = 0  # Media messages that failed to parse
+        self.last_delay = 0.0
+        self.downtime = 0.0
+
+    @property
+    def connected(self) -> bool:
+        return self._connected_at is not None
+
+    def _status(self, text: str):
+        if self.on_status is not None:
+            try:
+                self.on_status(text)
+            except Exception as e:
+                self.logger.debug(f"Status callback error: {e}")
+
+    async def run(self):
+        """Receive until stop(); the pipeline must be started by the caller"""
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        if self._stop_requested:
+            self._stop_event.set()
+
+        async with aiohttp.ClientSession() as session:
+            while not self._stop_event.is_set():
+                self.attempts += 1
+                self._status("Connecting...")
+                opened = self.connects
+                self._last_uptime = 0.0
+                try:
+                    async with session.ws_connect(self.url, ssl=self.ssl, heartbeat=self.heartbeat) as ws:
+                        self._ws = ws
+                        await self._on_open(ws)
+                        await self._receive(ws)
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError) as e:
+                    self.logger.warning(f"Connection to {self.url} failed: {e}")
+                finally:
+                    self._ws = None
+                    self._mark_closed()
+                if self._stop_event.is_set():
+                    break
+
+                if self.connects == opened:
+                    self.failures += 1
+                elif self._last_uptime >= self.stable_after:
+                    self.backoff.reset()
+                self.last_delay = self.backoff.next_delay()
+                self.logger.info(f"Reconnecting to {self.url} in {self.last_delay:.1f}s")
+                self._status(f"Reconnecting in {self.last_delay:.1f}s")
+                try:
+                    await asyncio.wait_for(self._stop_event.wait(), self.last_delay)
+                except asyncio.TimeoutError:
+                    pass
+        self._status("Disconnected")
+
+    async def _on_open(self, ws):
+        now = time.monotonic()
+        if self._disconnected_at is not None:
+            self.downtime += now - self._disconnected_at
+            self._disconnected_at = None
+        self._connected_at = now
+        self.connects += 1
+        self._status("Connected")
+        hello = {"type": "hello", "client": self.client, "binary": True}
+        if self.session:
+            hello["session"] = self.session
+        await ws.send_json(hello)
+
+    async def _receive(self, ws):
+        async for msg in ws:
+            if msg.type == aiohttp.WSMsgType.BINARY:
+                try:
+                    self.pipeline.submit(MediaPacket.parse(msg.data))
+                except ProtocolError as e:
+                    self.invalid += 1
+                    self.logger.debug(f"Invalid media message: {e}")
+            elif msg.type == aiohttp.WSMsgType.TEXT:
+                self._on_text(msg.data)
+            elif msg.type == aiohttp.WSMsgType.ERROR:
+                self.logger.warning(f"WebSocket error: {ws.exception()}")
+                break
+
+    def _on_text(self, text: str):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            return
+        if not isinstance(data, dict):
+            return
+        msg_type = data.get("type")
+        if msg_type in ("video", "audio"):
+            # Servers that ignore the binary request still send JSON media
+            try:
+                self.pipeline.submit(MediaPacket.from_json(data, text=text))
+            except ProtocolError:
+                self.invalid += 1
+            return
+        if msg_type == "connection" and data.get("session"):
+            self.session = data["session"]
+            if data.get("resumed"):
+                self.resumed += 1
+            self._status("Ready")
+        if self.on_control is not None:
+            try:
+                self.on_control(data)
+            except Exception as e:
+                self.logger.debug(f"Control callback error: {e}")
+
+    def _mark_closed(self):
+        if self._connected_at is None:
+            return
+        now = time.monotonic()
+        self._last_uptime = now - self._connected_at
+        self._connected_at = None
+        self._disconnected_at = now
+        self._status("Disconnected")
+
+    def stop(self):
+        """End run(); safe from any thread"""
+        self._stop_requested = True
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._stop_now)
+        except RuntimeError:
+            # Loop already finished
+            pass
+
+    def _stop_now(self):
+        self._stop_event.set()
+        if self._ws is not None:
+            asyncio.ensure_future(self._ws.close())
+
+    def start(self) -> threading.Thread:
+        """Run on a background thread with its own event loop"""
+        self._stop_requested = False
+        self._thread = threading.Thread(
+            target=lambda: asyncio.run(self.run()), name="receiver-core", daemon=True
+        )
+        self._thread.start()
+        return self._thread
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> dict:
+        downtime = self.downtime
+        if self._disconnected_at is not None:
+            downtime += time.monotonic() - self._disconnected_at
+        return {
+            "connected": self.connected,
+            "attempts": self.attempts,
+            "connects": self.connects,
+            "reconnects": max(self.connects - 1, 0),
+            "failures": self.failures,
+            "resumed": self.resumed,
+            "invalid": self.invalid,
+            "last_delay": round(self.last_delay, 3),
+            "downtime": round(downtime, 3),
+        }
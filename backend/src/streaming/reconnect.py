@@ -0,0 +1,34 @@
+"""
+Reconnect backoff
+After a drop, receivers (receiver_core.py) retry with capped exponential
+backoff and full jitter, a random delay between zero and the current cap,
+so a relay restart doesn't bring every receiver back in the same instant.
+index.html implements the same schedule for phones.
+"""
+
+import random
+from typing import Optional
+
+
+class Backoff:
+    """Capped exponential backoff with full jitter"""
+
+    def __init__(self, initial: float = 0.5, maximum: float = 30.0, multiplier: float = 2.0,
+                 rng: Optional[random.Random] = None):
+        self.initial = initial
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.attempt = 0
+        self._random = rng or random.Random()
+
+    def ceiling(self) -> float:
+        """Upper bound of the next delay"""
+        return min(self.maximum, self.initial * self.multiplier ** self.attempt)
+
+    def next_delay(self) -> float:
+        delay = self._random.uniform(0, self.ceiling())
+        self.attempt += 1
+        return delay
+
+    def reset(self):
+        self.attempt = 0
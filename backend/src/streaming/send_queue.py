@@ -0,0 +1,143 @@
+"""
+Sender-side helpers for the binary media protocol
+MediaSendQueue is a bounded, drop-oldest outbox that lives on the
+WebSocket's event loop; capture threads hand it finished packets without
+creating a coroutine per message. AudioCoalescer batches small capture
+blocks into fewer, larger audio packets.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+import numpy as np
+
+from streaming.media_protocol import MediaPacket
+
+
+class MediaSendQueue:
+    """Bounded per-kind outbox drained by a single sender task
+
+    Audio is always sent before video, and each kind drops its oldest
+    entry when full, so a slow uplink loses stale video frames first
+    instead of building up latency.
+    """
+
+    def __init__(self, max_video: int = 2, max_audio: int = 16):
+        self.video = deque(maxlen=max_video)
+        self.audio = deque(maxlen=max_audio)
+        self.logger = logging.getLogger(__name__)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._closed = False
+
+        # Metrics
+        self.sent = 0
+        self.dropped_video = 0
+        self.dropped_audio = 0
+
+    def put(self, packet: MediaPacket):
+        """Queue a packet; must be called on the sender's event loop"""
+        self._put(packet.is_audio, packet.to_bytes())
+
+    def put_threadsafe(self, packet: MediaPacket) -> bool:
+        """Queue a packet from another thread
+
+        Serialisation happens in the calling thread; the loop only appends
+        the finished bytes. Returns False if the sender is not running.
+        """
+        loop = self._loop
+        if loop is None or self._closed:
+            return False
+        data = packet.to_bytes()
+        try:
+            loop.call_soon_threadsafe(self._put, packet.is_audio, data)
+        except RuntimeError:
+            # Loop already closed
+            return False
+        return True
+
+    def _put(self, is_audio: bool, data: bytes):
+        queue = self.audio if is_audio else self.video
+        if len(queue) == queue.maxlen:
+            if is_audio:
+                self.dropped_audio += 1
+            else:
+                self.dropped_video += 1
+        queue.append(data)
+        if self._ready is not None:
+            self._ready.set()
+
+    async def run(self, send: Callable[[bytes], Awaitable[None]]):
+        """Send queued packets until close() is called"""
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        try:
+            while not self._closed:
+                if not self.audio and not self.video:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                data = self.audio.popleft() if self.audio else self.video.popleft()
+                await send(data)
+                self.sent += 1
+        except Exception as e:
+            self.logger.info(f"Media sender stopped: {e}")
+        finally:
+            self._loop = None
+
+    def close(self):
+        """Stop the sender task and discard anything queued"""
+        self._closed = True
+        self.video.clear()
+        self.audio.clear()
+        loop = self._loop
+        if loop is not None and self._ready is not None:
+            try:
+                loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                pass
+
+    def get_stats(self) -> dict:
+        """Get queue statistics"""
+        return {
+            "sent": self.sent,
+            "queued_video": len(self.video),
+            "queued_audio": len(self.audio),
+            "dropped_video": self.dropped_video,
+            "dropped_audio": self.dropped_audio,
+        }
+
+
+class AudioCoalescer:
+    """Convert int16 capture blocks to float32 and batch them
+
+    push() returns a float32 array once at least min_frames frames have
+    accumulated, otherwise None.
+    """
+
+    def __init__(self, min_frames: int = 4096, channels: int = 1):
+        self.min_frames = min_frames
+        self.channels = channels
+        self._blocks = []
+        self._frames = 0
+
+    def push(self, data: bytes) -> Optional[np.ndarray]:
+        """Add one block of interleaved int16 PCM"""
+        block = np.frombuffer(data, dtype=np.int16)
+        self._blocks.append(block)
+        self._frames += len(block) // self.channels
+        if self._frames < self.min_frames:
+            return None
+        return self.flush()
+
+    def flush(self) -> Optional[np.ndarray]:
+        """Return everything buffered so far as float32, or None"""
+        if not self._blocks:
+            return None
+        samples = np.concatenate(self._blocks).astype(np.float32)
+        samples *= 1.0 / 32768.0
+        self._blocks.clear()
+        self._frames = 0
+        return samples
@@ -1,19 +1,50 @@
 import asyncio
+import base64
+import binascii
 import logging
 import json
 import socket
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 from aiohttp import web
 import aiohttp
 import ssl
 
+import numpy as np
+
+from streaming.audio_stream import AudioStreamProcessor
+from streaming.video_stream import VideoStreamProcessor, VideoConfig
+
 
 class StreamingServer:
-    def __init__(self):
+    def __init__(self, video_config: VideoConfig = None, executor=None,
+                 on_video_frame: Optional[Callable] = None):
         self.app = web.Application()
         self.logger = logging.getLogger(__name__)
 
+        # Server-side video processing is opt-in: frames are only decoded
+        # when on_video_frame(frame) wants them (a resized BGR array, valid
+        # until the call returns). Decoding runs on worker threads so the
+        # event loop keeps serving sockets.
+        self.on_video_frame = on_video_frame
+        self._owns_executor = executor is None and on_video_frame is not None
+        self.executor = executor
+        self.video_processor = None
+        if on_video_frame is not None:
+            self.executor = executor or ThreadPoolExecutor(thread_name_prefix="media")
+            self.video_processor = VideoStreamProcessor(
+                video_config or VideoConfig(), executor=self.executor
+            )
+        self.audio_processor = AudioStreamProcessor()
+        self._video_consumer = None
+
+        # Clients currently sending each kind of media
+        self.publishers = {"video": set(), "audio": set()}
+
         # Enable CORS
         self.app.on_response_prepare.append(self._on_prepare_response)
+        self.app.on_startup.append(self._on_startup)
+        self.app.on_cleanup.append(self._on_cleanup)
 
         # Set up routes
         self.setup_routes()
@@ -69,7 +100,7 @@ class StreamingServer:
             async for msg in ws:
                 if msg.type == aiohttp.WSMsgType.TEXT:
                     try:
-                        self.logger.info(f"Received message: {msg.data}")
+                        self.logger.debug(f"Received message ({len(msg.data)} bytes)")
                         data = json.loads(msg.data)
                         msg_type = data.get("type")
                         msg_data = data.get("data")
@@ -79,19 +110,28 @@ class StreamingServer:
                                 {"type": "test_response", "message": "Test successful!"}
                             )
                         elif msg_type == "video" and msg_data:
-                            # Process video frame
-                            await self.loop.run_in_executor(
-                                self.executor,
-                                self.video_processor.process_frame,
-                                msg_data,
-                            )
+                            self.publishers["video"].add(ws)
+                            if self.video_processor is not None:
+                                try:
+                                    frame_data = base64.b64decode(msg_data)
+                                except (binascii.Error, ValueError, TypeError) as e:
+                                    self.logger.warning(f"Invalid video frame from {request.remote}: {e}")
+                                    continue
+                                # Hand the frame to the decode stage; it drops
+                                # stale frames instead of blocking this reader
+                                self.video_processor.submit(frame_data)
                         elif msg_type == "audio" and msg_data:
-                            # Process audio data
-                            await self.loop.run_in_executor(
-                                self.executor,
-                                self.audio_processor.process_audio,
-                                msg_data,
-                            )
+                            self.publishers["audio"].add(ws)
+                            # Browsers send a float list, other senders base64 float32
+                            try:
+                                if isinstance(msg_data, list):
+                                    audio_bytes = np.asarray(msg_data, dtype=np.float32).tobytes()
+                                else:
+                                    audio_bytes = base64.b64decode(msg_data)
+                            except (binascii.Error, ValueError, TypeError) as e:
+                                self.logger.warning(f"Invalid audio frame from {request.remote}: {e}")
+                                continue
+                            await self.audio_processor.process_audio(audio_bytes)
                     except json.JSONDecodeError as e:
                         self.logger.error(f"Invalid JSON message: {e}")
                 elif msg.type == aiohttp.WSMsgType.ERROR:
@@ -109,15 +149,57 @@ class StreamingServer:
             if ws and not ws.closed:
                 await ws.close()
             self.logger.info("Cleaning up WebSocket connection")
-            self.cleanup()
+            self.release_client(ws)
             self.logger.info("Client disconnected")
             return ws
 
+    def release_client(self, ws):
+        """Drop what a disconnecting client was streaming
+
+        The processors are shared, so they are only reset when the last
+        client sending that kind of media goes away; viewers and other
+        senders are unaffected.
+        """
+        video, audio = self.publishers["video"], self.publishers["audio"]
+        if ws in video:
+            video.discard(ws)
+            if not video and self.video_processor is not None:
+                self.video_processor.clear()
+        if ws in audio:
+            audio.discard(ws)
+            if not audio:
+                self.audio_processor.clear()
+                self.audio_processor.stop_playback()
+
     def cleanup(self):
         """Clean up resources"""
-        self.video_processor.clear()
+        if self.video_processor is not None:
+            self.video_processor.close()
         self.audio_processor.clear()
         self.audio_processor.stop_playback()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
+
+    async def _consume_video(self):
+        async for frame in self.video_processor.frames():
+            try:
+                self.on_video_frame(frame)
+            except Exception as e:
+                self.logger.error(f"Video frame consumer error: {e}")
+
+    async def _on_startup(self, app):
+        if self.video_processor is not None:
+            self._video_consumer = asyncio.ensure_future(self._consume_video())
+
+    async def _on_cleanup(self, app):
+        if self._video_consumer is not None:
+            self._video_consumer.cancel()
+            try:
+                await self._video_consumer
+            except asyncio.CancelledError:
+                pass
+            self._video_consumer = None
+        self.cleanup()
 
     def get_local_ip(self):
         """Get the local IP address"""
@@ -134,6 +216,7 @@ class StreamingServer:
 
     async def run(self, host="0.0.0.0", port=5000, ssl_context=None):
         """Start the streaming server"""
+        runner = None
         try:
             self.loop = asyncio.get_event_loop()
 
@@ -160,9 +243,11 @@ class StreamingServer:
 
         except Exception as e:
             self.logger.error(f"Server error: {e}")
+            raise
+        finally:
+            # Runs the on_cleanup hooks: processors and executor are released
             if runner:
                 await runner.cleanup()
-            raise
 
 
 if __name__ == "__main__":
@@ -1,25 +1,99 @@
 import asyncio
+import binascii
 import logging
 import json
+import math
 import socket
+import struct
 import os
 from aiohttp import web
 import aiohttp
 import ssl
+import threading
 
+from services.async_hardware import AsyncHardwareService
+from services.device_state import DeviceStateStore
 from services.hardware_service import HardwareService
+from streaming.listeners import (
+    POLICY_KEY, Listener, ListenerPolicy, default_listeners, is_loopback
+)
+from streaming.media_protocol import MediaPacket, ProtocolError, video_packet
+from streaming.sessions import SessionStore
+from streaming.shm_bus import SharedFrameBus, frame_bus_name
+from streaming.stream_cache import StreamCache
+from streaming.subscription import FrameSubscription
+from streaming.ws_compression import CompressionPolicy
 from utils.security import SecurityManager
 
+# Stream ids used for the server's own devices in the stream cache
+LOCAL_STREAMS = {"webcam": "local-webcam", "microphone": "local-microphone"}
+# Microphone packets buffered for the relay before the oldest is dropped
+LOCAL_AUDIO_BACKLOG = 16
+# Fields kept from browser sender_stats reports (index.html), and their types
+SENDER_STATS_FIELDS = {
+    "bufferedAmount": int,
+    "maxBufferedAmount": int,
+    "skippedVideoFrames": int,
+    "skippedAudioFrames": int,
+    "framesSent": int,
+    "audioFramesSent": int,
+    "rateLimitedFrames": int,
+    "avgCaptureLatencyMs": float,
+    "reconnects": int,
+    "resumedSessions": int,
+    "lastReconnectDelayMs": int,
+}
+
 
 class StreamingServer:
-    def __init__(self, hardware_service: HardwareService = None, security_manager: SecurityManager = None):
+    def __init__(self, hardware_service: HardwareService = None, security_manager: SecurityManager = None,
+                 shared_frames: bool = True):
         self.app = web.Application()
         self.logger = logging.getLogger(__name__)
         self.app.on_response_prepare.append(self._on_prepare_response)
         
-        # Track all connected clients
-        self.connected_clients = set()
+        # Connected clients: ws -> (client id, policy of the listener it came in on)
+        self.connected_clients = {}
         self.clients_lock = asyncio.Lock()
+        # Receivers that asked for binary media frames in their hello
+        self.binary_clients = set()
+
+        # Latest keyframe/audio format per publishing client, replayed to
+        # receivers when they subscribe so they don't wait for the next frame
+        self.stream_cache = StreamCache()
+
+        # Sender-side queue depth reported by browser clients
+        self.sender_stats = {}
+
+        # Session tokens let reconnecting clients get their options back
+        self.sessions = SessionStore()
+
+        # Which outgoing messages are deflated: control JSON yes, media no
+        self.compression = CompressionPolicy()
+
+        # Tasks relaying the server's own webcam/microphone while they run
+        self.local_relays = {}
+        # Fire-and-forget work (device commands, closing dead clients);
+        # referenced here until done so it isn't collected, cancelled on shutdown
+        self._tasks = set()
+
+        # Shared-memory copy of every relayed packet for receivers on this
+        # machine (see streaming/shm_bus.py); opened in run()
+        self.shared_frames = shared_frames
+        self.frame_bus = None
+
+        # In-process consumers of relayed packets (e.g. the bundled desktop
+        # receiver); copy-on-write, so a callback may subscribe or
+        # unsubscribe while the relay iterates. Registration happens on the
+        # loop (see subscribe()); the lock only guards the bookkeeping and
+        # is never held while a callback runs
+        self._subscribers = ()
+        self._subscriber_lock = threading.Lock()
+        self._next_subscriber = 0
+        self._pending_subscribers = set()
+
+        # The loop run() serves on; None until it starts
+        self.loop = None
 
         # Add middleware to log incoming HTTP requests
         @web.middleware
@@ -37,9 +111,20 @@ class StreamingServer:
 
         self.app.middlewares.append(request_logger_middleware)
 
+        # Listeners started by run(); each request is tagged with the
+        # policy of the listener it arrived on
+        self.listeners = []
+        self.app.middlewares.append(self._listener_policy_middleware)
+
         # Inject or create services
         self.hardware_service = hardware_service or HardwareService()
         self.security_manager = security_manager or SecurityManager()
+        # Device start/stop runs on its own executor; lifecycle events and
+        # resulting state changes are pushed to every connected client
+        self.devices = AsyncHardwareService(self.hardware_service)
+        self.device_state = DeviceStateStore(self.hardware_service)
+        self.devices.add_listener(self._on_device_event)
+        self.device_state.add_listener(self._broadcast_json)
 
         # If running locally with no explicit permissions, grant short-lived permissions
         try:
@@ -52,6 +137,32 @@ class StreamingServer:
 
         self.setup_routes()
 
+    def _listener_for(self, request):
+        sockname = request.transport.get_extra_info("sockname") if request.transport else None
+        for listener in self.listeners:
+            if listener.matches(sockname):
+                return listener
+        return None
+
+    @web.middleware
+    async def _listener_policy_middleware(self, request, handler):
+        listener = self._listener_for(request)
+        # Requests that bypass run()'s listeners (tests, embedding) get the default policy
+        policy = listener.policy if listener else ListenerPolicy()
+        if policy.loopback_only and not is_loopback(request.remote):
+            self.logger.warning(f"Refused {request.remote} on loopback-only listener {listener.name}")
+            return web.json_response({"status": "error", "message": "forbidden"}, status=403)
+        request[POLICY_KEY] = policy
+        return await handler(request)
+
+    def _authorize_device(self, policy, command, device):
+        """Error message if the client may not run a device command, else None"""
+        if not policy.device_control:
+            return "device control not allowed on this connection"
+        if policy.require_permission and not self.security_manager.validate_command(command, device):
+            return "unauthorized"
+        return None
+
     async def _on_prepare_response(self, request, response):
         response.headers["Access-Control-Allow-Origin"] = "*"
         response.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
@@ -69,6 +180,7 @@ class StreamingServer:
         self.app.router.add_options("/ws", self.handle_options)
         # REST endpoint for device control (used by frontend)
         self.app.router.add_post("/api/device/{device}", self.handle_device_control)
+        self.app.router.add_get("/api/stats", self.handle_stats)
 
     async def handle_options(self, request):
         response = web.Response(status=204)  # No content
@@ -88,6 +200,16 @@ class StreamingServer:
             self.logger.error(f"Error serving index.html: {e}")
             return web.Response(text="Internal server error", status=500)
 
+    async def handle_stats(self, request):
+        """Relay counters: WebSocket compression, frame bus, sender backlog"""
+        return web.json_response({
+            "clients": len(self.connected_clients),
+            "compression": self.compression.get_stats(),
+            "frame_bus": self.frame_bus.get_stats() if self.frame_bus is not None else None,
+            "sessions": self.sessions.get_stats(),
+            "senders": self.sender_stats,
+        })
+
     async def handle_device_control(self, request):
         """REST endpoint to start/stop devices from frontend"""
         device = request.match_info.get("device")
@@ -100,19 +222,20 @@ class StreamingServer:
         if not command:
             return web.json_response({"status": "error", "message": "missing command"}, status=400)
 
-        if not self.security_manager.validate_command(command, device):
-            return web.json_response({"status": "error", "message": "unauthorized"}, status=403)
+        error = self._authorize_device(request.get(POLICY_KEY, ListenerPolicy()), command, device)
+        if error:
+            return web.json_response({"status": "error", "message": error}, status=403)
 
-        loop = asyncio.get_event_loop()
         try:
-            if command == "start":
-                await loop.run_in_executor(None, self.hardware_service.start_device, device)
-                return web.json_response({"status": "success", "message": f"{device} started"})
-            elif command == "stop":
-                await loop.run_in_executor(None, self.hardware_service.stop_device, device)
-                return web.json_response({"status": "success", "message": f"{device} stopped"})
+            if command in ("start", "stop"):
+                await self._control_device(command, device)
+                state = "started" if command == "start" else "stopped"
+                return web.json_response({"status": "success", "message": f"{device} {state}"})
             else:
                 return web.json_response({"status": "error", "message": "unknown command"}, status=400)
+        except asyncio.TimeoutError as e:
+            message = str(e) or f"{device} {command} timed out"
+            return web.json_response({"status": "error", "message": message}, status=504)
         except Exception as e:
             self.logger.error(f"Device control error: {e}")
             return web.json_response({"status": "error", "message": str(e)}, status=500)
@@ -121,17 +244,21 @@ class StreamingServer:
         self.logger.info(f"WebSocket connection attempt from {request.remote}")
         ws = None
         client_id = f"{request.remote}-{id(request)}"
+        policy = request.get(POLICY_KEY, ListenerPolicy())
+        session = None
 
         try:
-            ws = web.WebSocketResponse(heartbeat=30)
+            ws = web.WebSocketResponse(heartbeat=30, compress=self.compression.negotiate(request))
             await ws.prepare(request)
+            self.compression.prepare(ws)
             self.logger.info("WebSocket connection established")
             
             # Add to connected clients
             async with self.clients_lock:
-                self.connected_clients.add(ws)
+                self.connected_clients[ws] = (client_id, policy)
 
-            await ws.send_json(
+            await self.compression.send_control(
+                ws,
                 {
                     "type": "connection",
                     "status": "connected",
@@ -146,59 +273,89 @@ class StreamingServer:
                         msg_type = data.get("type")
 
                         # Log message type (not full data to avoid spam)
-                        if msg_type in ("video", "audio"):
+                        if msg_type in ("video", "audio", "sender_stats"):
                             self.logger.debug(f"Received {msg_type} frame from {request.remote}")
                         else:
                             self.logger.info(f"Received {msg_type} message from {request.remote}")
 
                         # Handle test messages
                         if msg_type == "test":
-                            await ws.send_json({"type": "test_response", "message": "Test successful!"})
+                            await self.compression.send_control(
+                                ws, {"type": "test_response", "message": "Test successful!"}
+                            )
 
                         # Handle hello/connection init
                         elif msg_type == "hello":
-                            client_type = data.get('receiver', data.get('client', 'unknown'))
-                            self.logger.info(f"Client identified: {client_type}")
-                            await ws.send_json({
+                            previous = session
+                            session, options, resumed = self.sessions.open(data)
+                            if previous is not None and previous != session:
+                                self.sessions.release(previous)
+                            client_type = options.get('receiver', options.get('client', 'unknown'))
+                            self.logger.info(
+                                f"Client identified: {client_type}" + (" (resumed session)" if resumed else "")
+                            )
+                            if options.get("binary"):
+                                self.binary_clients.add(ws)
+                            await self.compression.send_control(ws, {
                                 "type": "connection",
                                 "status": "ready",
-                                "message": "Ready to receive streams"
+                                "message": "Ready to receive streams",
+                                "session": session,
+                                "resumed": resumed,
                             })
-
-                        # Handle video stream (base64 encoded JPEG)
-                        elif msg_type == "video":
-                            video_data = data.get("data")
-                            if video_data:
-                                self.logger.debug(f"Video frame size: {len(video_data)} bytes")
-                                # Broadcast to all other connected clients (desktop receivers)
-                                await self._broadcast_to_receivers(data, request.remote)
-
-                        # Handle audio stream
-                        elif msg_type == "audio":
-                            audio_data = data.get("data")
-                            sample_rate = data.get("sampleRate", 16000)
-                            if audio_data:
-                                self.logger.debug(f"Audio frame: sample rate {sample_rate}Hz")
-                                # Broadcast to all other connected clients
-                                await self._broadcast_to_receivers(data, request.remote)
+                            await self.compression.send_control(ws, self.device_state.snapshot())
+                            await self._send_cached_streams(ws, client_id)
+
+                        # Handle legacy JSON video (base64 JPEG) / audio (float list or base64)
+                        elif msg_type in ("video", "audio"):
+                            if not (data.get("data") and policy.publish):
+                                continue
+                            try:
+                                packet = MediaPacket.from_json(data, text=msg.data)
+                                # Decode and pack once here, so a malformed frame is
+                                # dropped now rather than failing for every receiver
+                                packet.to_bytes()
+                            except (ProtocolError, ValueError, TypeError, binascii.Error, struct.error) as e:
+                                self.logger.warning(f"Invalid {msg_type} message from {request.remote}: {e}")
+                                continue
+                            await self._relay_packet(packet, client_id)
+
+                        # Sender-side backlog reports (bufferedAmount, skipped frames)
+                        elif msg_type == "sender_stats":
+                            data = self._sender_stats(data)
+                            self.sender_stats[client_id] = data
+                            if data.get("maxBufferedAmount", 0) > 256 * 1024:
+                                self.logger.debug(
+                                    f"Sender {client_id} backed up: {data.get('maxBufferedAmount')} bytes, "
+                                    f"{data.get('skippedVideoFrames', 0)} video frames skipped"
+                                )
 
                         # Handle device control via websocket
                         elif msg_type == "device":
                             command = data.get("command")
                             device = data.get("device")
-                            if not self.security_manager.validate_command(command, device):
-                                await ws.send_json({"status": "error", "message": "unauthorized"})
-                            else:
-                                loop = asyncio.get_event_loop()
-                                if command == "start":
-                                    await loop.run_in_executor(None, self.hardware_service.start_device, device)
-                                    await ws.send_json({"status": "success", "message": f"{device} started"})
-                                elif command == "stop":
-                                    await loop.run_in_executor(None, self.hardware_service.stop_device, device)
-                                    await ws.send_json({"status": "success", "message": f"{device} stopped"})
+                            error = self._authorize_device(policy, command, device)
+                            if error:
+                                await self.compression.send_control(ws, {"status": "error", "message": error})
+                            elif command in ("start", "stop"):
+                                # Don't hold up this client's media while the device toggles
+                                self._spawn(self._ws_device_control(ws, command, device))
 
                     except json.JSONDecodeError as e:
                         self.logger.error(f"Invalid JSON from {request.remote}: {e}")
+
+                # Binary media protocol (see streaming/media_protocol.py)
+                elif msg.type == aiohttp.WSMsgType.BINARY:
+                    if not policy.publish:
+                        continue
+                    try:
+                        packet = MediaPacket.parse(msg.data)
+                    except ProtocolError as e:
+                        self.logger.warning(f"Invalid media message from {request.remote}: {e}")
+                        continue
+                    self.logger.debug(f"Received binary {packet.type_name} frame from {request.remote}")
+                    await self._relay_packet(packet, client_id)
+
                 elif msg.type == aiohttp.WSMsgType.ERROR:
                     self.logger.error(f"WebSocket error from {request.remote}: {ws.exception()}")
                     break
@@ -207,29 +364,285 @@ class StreamingServer:
         finally:
             # Remove from connected clients
             async with self.clients_lock:
-                self.connected_clients.discard(ws)
+                self.connected_clients.pop(ws, None)
+            self.binary_clients.discard(ws)
+            self.stream_cache.drop(client_id)
+            self.sender_stats.pop(client_id, None)
+            self.sessions.release(session)
             if ws and not ws.closed:
                 await ws.close()
             return ws
     
-    async def _broadcast_to_receivers(self, data, sender_ip):
-        """Broadcast video/audio to all connected receiver clients"""
+    @staticmethod
+    def _sender_stats(report: dict) -> dict:
+        """Known numeric fields of a sender_stats report; anything else is dropped"""
+        stats = {}
+        for field, kind in SENDER_STATS_FIELDS.items():
+            value = report.get(field)
+            if value is None or isinstance(value, bool):
+                continue
+            try:
+                value = kind(value)
+            except (TypeError, ValueError, OverflowError):
+                continue
+            if math.isfinite(value):
+                stats[field] = value
+        return stats
+
+    async def _control_device(self, command, device):
+        """Start/stop a hardware device, relaying local capture while it runs"""
+        if command == "start":
+            await self.devices.start_device(device)
+            self._start_local_relay(device)
+        else:
+            await self._stop_local_relay(device)
+            await self.devices.stop_device(device)
+
+    async def _ws_device_control(self, ws, command, device):
+        """Run a device command for a WebSocket client and send the result"""
+        try:
+            await self._control_device(command, device)
+            state = "started" if command == "start" else "stopped"
+            response = {"status": "success", "message": f"{device} {state}"}
+        except asyncio.TimeoutError as e:
+            response = {"status": "error", "message": str(e) or f"{device} {command} timed out"}
+        except Exception as e:
+            self.logger.error(f"Device control error: {e}")
+            response = {"status": "error", "message": str(e)}
+        if not ws.closed:
+            try:
+                await self.compression.send_control(ws, response)
+            except Exception as e:
+                self.logger.debug(f"Could not send device response: {e}")
+
+    async def _on_device_event(self, event):
+        """Forward a device lifecycle event and fold it into the state store"""
+        await self._broadcast_json(event)
+        # Broadcasts device_state only if the status changed
+        self.device_state.apply_event(event)
+
+    async def _broadcast_json(self, message):
+        """Push a control message (device events/state) to every connected client"""
+        async with self.clients_lock:
+            clients = list(self.connected_clients)
+        for client_ws in clients:
+            try:
+                await self.compression.send_control(client_ws, message)
+            except Exception as e:
+                self.logger.debug(f"Failed to send {message.get('type')} message: {e}")
+
+    def _start_local_relay(self, device):
+        task = self.local_relays.get(device)
+        if task is not None and not task.done():
+            return
+        if device == "webcam":
+            source = self.hardware_service.get_webcam()
+            relay = self._relay_local_webcam
+        elif device == "microphone":
+            source = self.hardware_service.get_microphone()
+            relay = self._relay_local_microphone
+        else:
+            return
+        if source is not None:
+            self.local_relays[device] = asyncio.ensure_future(relay(source))
+
+    def _spawn(self, coro):
+        """Run coro in the background, keeping the task until it is done"""
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _cancel_tasks(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _stop_local_relay(self, device):
+        task = self.local_relays.pop(device, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if device in LOCAL_STREAMS:
+            self.stream_cache.drop(LOCAL_STREAMS[device])
+
+    async def _relay_local_webcam(self, engine):
+        """Stream the server's own webcam to receivers
+
+        Waiting and JPEG encoding happen on the executor; the event loop
+        only relays finished packets.
+        """
+        loop = asyncio.get_running_loop()
+        seq = 0
+        try:
+            while engine.running:
+                seq, jpeg = await loop.run_in_executor(None, engine.next_jpeg, seq, 0.5)
+                if jpeg is not None:
+                    await self._relay_packet(video_packet(jpeg), LOCAL_STREAMS["webcam"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Local webcam relay error: {e}")
+
+    async def _relay_local_microphone(self, microphone):
+        """Stream the server's own microphone to receivers"""
+        loop = asyncio.get_running_loop()
+        packets = asyncio.Queue(maxsize=LOCAL_AUDIO_BACKLOG)
+
+        def offer(packet):
+            # Runs on the loop; keep the newest audio if receivers lag
+            if packets.full():
+                packets.get_nowait()
+            packets.put_nowait(packet)
+
+        token = microphone.subscribe(lambda packet: loop.call_soon_threadsafe(offer, packet))
+        try:
+            while True:
+                packet = await packets.get()
+                await self._relay_packet(packet, LOCAL_STREAMS["microphone"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Local microphone relay error: {e}")
+        finally:
+            microphone.unsubscribe(token)
+
+    async def _send_cached_streams(self, ws, client_id):
+        """Replay cached keyframes and audio formats to a new subscriber"""
+        messages = self.stream_cache.snapshot(exclude=client_id)
+        for message in messages:
+            if isinstance(message, MediaPacket):
+                await self._send_media(ws, message)
+            else:
+                # Audio-format notices are stream metadata; keep them with the media
+                await self.compression.send_media(ws, message)
+        if messages:
+            self.logger.debug(f"Sent {len(messages)} cached stream messages to {client_id}")
+
+    async def _relay_packet(self, packet, client_id):
+        """Cache a media packet for late joiners and broadcast it"""
+        # Cache and deliver without awaiting in between: subscribers are
+        # registered on this loop too, so each sees a packet exactly once,
+        # in its replay or live
+        if packet.is_video:
+            # JPEG frames are all keyframes; inter-frame codecs flag deltas
+            self.stream_cache.update_video(client_id, packet, keyframe=packet.keyframe)
+        else:
+            self.stream_cache.update_audio_format(client_id, packet.sample_rate, packet.channels)
+        for _, callback in self._subscribers:
+            try:
+                callback(packet)
+            except Exception as e:
+                self.logger.error(f"Media subscriber error: {e}")
+        if packet.is_audio:
+            # Play remote audio on the server's speaker; never our own mic
+            speaker = self.hardware_service.get_speaker()
+            if speaker is not None and client_id not in LOCAL_STREAMS.values():
+                speaker.play_packet(packet)
+        if self.frame_bus is not None:
+            self.frame_bus.publish(packet)
+        await self._broadcast_to_receivers(packet, client_id)
+
+    def subscribe(self, callback, replay: bool = True) -> int:
+        """Call callback(packet) for every relayed MediaPacket, in process
+
+        Callbacks run on the server's event loop and must not block; hand
+        work to another thread (a Qt signal, a queue) if it is slow. The
+        packet and its payload are shared, not copied. With replay, the
+        cached keyframes and audio are delivered first, so no packet is
+        missed or delivered twice in between. Safe to call from any thread
+        (and from a callback): off the loop, the replay and registration
+        are scheduled on it and the callback starts shortly after this
+        returns. Returns a token for unsubscribe().
+        """
+        with self._subscriber_lock:
+            self._next_subscriber += 1
+            token = self._next_subscriber
+        loop = self.loop
+        if loop is None or not loop.is_running() or self._on_loop(loop):
+            self._attach(token, callback, replay)
+        else:
+            with self._subscriber_lock:
+                self._pending_subscribers.add(token)
+            loop.call_soon_threadsafe(self._attach, token, callback, replay, True)
+        return token
+
+    @staticmethod
+    def _on_loop(loop):
+        try:
+            return asyncio.get_running_loop() is loop
+        except RuntimeError:
+            return False
+
+    def _attach(self, token, callback, replay, pending=False):
+        """Replay the cache to callback and register it; runs on the loop"""
+        if pending:
+            with self._subscriber_lock:
+                if token not in self._pending_subscribers:
+                    # Unsubscribed before it was attached
+                    return
+                self._pending_subscribers.discard(token)
+        if replay:
+            for message in self.stream_cache.snapshot():
+                # Audio-format notices are for network receivers; packets carry their format
+                if isinstance(message, MediaPacket):
+                    try:
+                        callback(message)
+                    except Exception as e:
+                        self.logger.error(f"Media subscriber error: {e}")
+        with self._subscriber_lock:
+            self._subscribers = self._subscribers + ((token, callback),)
+
+    def unsubscribe(self, token: int):
+        with self._subscriber_lock:
+            self._pending_subscribers.discard(token)
+            self._subscribers = tuple(s for s in self._subscribers if s[0] != token)
+
+    def frames(self, max_video: int = 2, max_audio: int = 64) -> FrameSubscription:
+        """Async iterator of relayed packets; call and iterate on the server loop
+
+            async with server.frames() as frames:
+                async for packet in frames:
+                    ...
+        """
+        subscription = FrameSubscription(max_video, max_audio)
+        token = self.subscribe(subscription.put)
+        subscription.on_close = lambda: self.unsubscribe(token)
+        return subscription
+
+    async def _send_media(self, ws, packet):
+        """Send a packet in the representation the client negotiated"""
+        if ws in self.binary_clients:
+            await self.compression.send_media(ws, packet.to_bytes())
+        else:
+            await self.compression.send_media(ws, packet.to_json_text())
+
+    async def _broadcast_to_receivers(self, packet, sender_id):
+        """Broadcast a video/audio packet to all connected receiver clients"""
         async with self.clients_lock:
             dead_clients = []
-            for client_ws in self.connected_clients:
-                # Don't send back to sender
-                if client_ws.get_extra_info('peername')[0] == sender_ip:
+            for client_ws, (client_id, policy) in self.connected_clients.items():
+                # Don't send back to the sender, or to listeners that don't receive
+                if client_id == sender_id or not policy.receive:
                     continue
                 
                 try:
-                    await client_ws.send_json(data)
-                except Exception as e:
+                    await self._send_media(client_ws, packet)
+                except (OSError, aiohttp.ClientError) as e:
                     self.logger.debug(f"Failed to send to client: {e}")
                     dead_clients.append(client_ws)
+                except Exception as e:
+                    # Not the receiver's fault; keep it
+                    self.logger.error(f"Could not send {packet.type_name} to {client_id}: {e}")
             
-            # Remove dead clients
+            # Remove dead clients; their handlers finish the cleanup once closed
             for client in dead_clients:
-                self.connected_clients.discard(client)
+                self.connected_clients.pop(client, None)
+                self._spawn(client.close())
 
     def get_local_ip(self):
         try:
@@ -241,18 +654,80 @@ class StreamingServer:
         except Exception:
             return "127.0.0.1"
 
-    async def run(self, host="0.0.0.0", port=5000, ssl_context=None):
+    def _open_frame_bus(self, port):
+        """Create the same-host frame bus; streaming works without it"""
+        try:
+            self.frame_bus = SharedFrameBus(frame_bus_name(port))
+            self.logger.info(f"Same-host frame bus: {self.frame_bus.name}")
+        except Exception as e:
+            self.logger.warning(f"Shared frame bus unavailable, receivers will use WebSocket: {e}")
+            self.frame_bus = None
+
+    def _close_frame_bus(self):
+        if self.frame_bus is not None:
+            self.logger.info(f"Frame bus stats: {self.frame_bus.get_stats()}")
+            self.frame_bus.close()
+            self.frame_bus = None
+
+    async def _start_listener(self, runner, listener: Listener):
+        if listener.is_unix:
+            socket_dir = os.path.dirname(listener.path)
+            os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+            if os.path.exists(listener.path):
+                # Left behind by a previous run; binding fails while it exists
+                os.unlink(listener.path)
+        await listener.create_site(runner).start()
+        if listener.is_unix:
+            # Only this user may connect
+            os.chmod(listener.path, 0o600)
+
+    def _remove_unix_sockets(self):
+        for listener in self.listeners:
+            if listener.is_unix:
+                try:
+                    os.unlink(listener.path)
+                except OSError:
+                    pass
+
+    async def run(self, host="0.0.0.0", port=5000, ssl_context=None, listeners=None):
+        """Serve until cancelled
+
+        listeners defaults to default_listeners(host, port, ssl_context):
+        the LAN listener plus plaintext loopback and, where supported, a
+        Unix socket. The first listener must start; the others are skipped
+        with a warning if they can't bind.
+        """
+        if listeners is None:
+            listeners = default_listeners(host, port, ssl_context)
+        self.loop = asyncio.get_running_loop()
+        runner = web.AppRunner(self.app)
         try:
-            runner = web.AppRunner(self.app)
             await runner.setup()
-            site = web.TCPSite(runner, host, port, ssl_context=ssl_context)
-
             local_ip = self.get_local_ip()
-            protocol = "https" if ssl_context else "http"
-            self.logger.info(f"Starting server on {host}:{port}")
-            self.logger.info(f"Access at: {protocol}://{local_ip}:{port}")
 
-            await site.start()
+            started = []
+            for index, listener in enumerate(listeners):
+                try:
+                    await self._start_listener(runner, listener)
+                except OSError as e:
+                    if index == 0:
+                        raise
+                    self.logger.warning(f"Listener {listener.name} not started ({listener.url}): {e}")
+                    continue
+                started.append(listener)
+                self.logger.info(f"Listening ({listener.name}): {listener.url}")
+            self.listeners = started
+
+            main = started[0]
+            if not main.is_unix:
+                protocol = "https" if main.ssl_context else "http"
+                self.logger.info(f"Starting server on {main.host}:{main.port}")
+                self.logger.info(f"Access at: {protocol}://{local_ip}:{main.port}")
+
+            # Only once the port is ours, so a second instance can't take
+            # over the running relay's bus
+            if self.shared_frames:
+                self._open_frame_bus(main.port or port)
 
             while True:
                 await asyncio.sleep(3600)
@@ -260,3 +735,9 @@ class StreamingServer:
         except Exception as e:
             self.logger.error(f"Server error: {e}")
             raise
+        finally:
+            await self._cancel_tasks()
+            self.logger.info(f"WebSocket compression stats: {self.compression.get_stats()}")
+            self._close_frame_bus()
+            self._remove_unix_sockets()
+            await runner.cleanup()
@@ -0,0 +1,80 @@
+"""
+Client sessions that survive a reconnect
+The server hands every client a session token in its "ready" reply. A
+client that reconnects sends the token back in its hello, and the server
+restores what the client had asked for (binary frames, client type)
+even if the new hello leaves it out. Tokens outlive their connection by
+ttl seconds, which covers Wi-Fi blips and a client backing off. They do
+not outlive the server process; after a restart clients simply get a new
+session (cached keyframes are replayed either way).
+"""
+
+import secrets
+import time
+from typing import Dict, Optional, Tuple
+
+# Hello fields remembered for the session
+SESSION_FIELDS = ("binary", "client", "receiver")
+
+
+class SessionStore:
+    def __init__(self, ttl: float = 300.0, max_sessions: int = 1024):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        # token -> [options, disconnected at (None while connected)]
+        self._sessions: Dict[str, list] = {}
+
+        # Metrics
+        self.created = 0
+        self.resumed = 0
+        self.expired = 0
+
+    def open(self, hello: dict) -> Tuple[str, dict, bool]:
+        """Start or resume the session named in a hello message
+
+        Returns (token, options, resumed); options are the stored hello
+        fields updated with whatever this hello sets.
+        """
+        self._prune()
+        token = hello.get("session")
+        entry = self._sessions.get(token) if isinstance(token, str) else None
+        resumed = entry is not None
+        if entry is None:
+            token = secrets.token_urlsafe(16)
+            entry = [{}, None]
+            self._sessions[token] = entry
+            self.created += 1
+        else:
+            self.resumed += 1
+        entry[0].update({k: hello[k] for k in SESSION_FIELDS if k in hello})
+        entry[1] = None
+        return token, dict(entry[0]), resumed
+
+    def release(self, token: Optional[str]):
+        """The session's connection closed; keep it for ttl seconds"""
+        entry = self._sessions.get(token)
+        if entry is not None:
+            entry[1] = time.monotonic()
+
+    def _prune(self):
+        now = time.monotonic()
+        for token, (_, closed) in list(self._sessions.items()):
+            if closed is not None and now - closed > self.ttl:
+                del self._sessions[token]
+                self.expired += 1
+        if len(self._sessions) >= self.max_sessions:
+            # Oldest disconnected sessions go first
+            idle = sorted(
+                (closed, token) for token, (_, closed) in self._sessions.items() if closed is not None
+            )
+            for _, token in idle[:len(self._sessions) - self.max_sessions + 1]:
+                del self._sessions[token]
+                self.expired += 1
+
+    def get_stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "created": self.created,
+            "resumed": self.resumed,
+            "expired": self.expired,
+        }
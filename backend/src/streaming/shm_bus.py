@@ -0,0 +1,298 @@
+"""
+Shared-memory frame bus for same-host receivers
+The relay publishes every media packet (in its binary wire form, see
+media_protocol.py) into a ring of fixed-size slots in a named shared
+memory block. Receivers on the same machine map the block and read
+packets in place instead of going through TLS WebSocket loopback.
+
+    block header (64 bytes)
+    offset  size  field
+    0       8     magic b"NFBUS\\x00\\x00\\x01"
+    8       4     slot count
+    12      4     slot size (bytes of packet data per slot)
+    16      4     notify UDP port on 127.0.0.1 (0 = none)
+    24      8     sequence number of the newest complete packet
+
+    slot header (24 bytes), followed by slot size bytes of data
+    0       8     seqlock counter (odd while the writer is inside the slot)
+    8       8     sequence number of the packet in the slot
+    16      4     packet length
+
+There is a single writer. Readers never block it: they re-check the slot
+counter after using the data and discard anything the writer overwrote
+meanwhile (a seqlock). Wake-ups come over a tiny UDP channel; readers
+register by sending a datagram to the notify port and renew it
+periodically, the writer sends each subscriber the new sequence number.
+"""
+
+import logging
+import select
+import socket
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Callable, List, Tuple
+
+from streaming.media_protocol import MediaPacket, ProtocolError
+
+MAGIC = b"NFBUS\x00\x00\x01"
+BLOCK_HEADER = struct.Struct("<8sIII4xQ")
+BLOCK_HEADER_SIZE = 64
+WRITE_SEQ_OFFSET = 24
+SLOT_HEADER = struct.Struct("<QQI4x")
+SEQ = struct.Struct("<Q")
+
+SUBSCRIBE = b"sub"
+# Readers renew their subscription this often; the writer forgets
+# subscribers it hasn't heard from in SUBSCRIBER_TTL seconds
+SUBSCRIBE_INTERVAL = 2.0
+SUBSCRIBER_TTL = 10.0
+
+
+def frame_bus_name(port: int = 5000) -> str:
+    """Shared memory name used by the relay listening on port"""
+    return f"nodeflow-frames-{port}"
+
+
+def copy_packet(packet: MediaPacket) -> MediaPacket:
+    """Copy a packet out of shared memory"""
+    return MediaPacket.parse(packet.to_bytes())
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Map an existing block without taking ownership of it"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13: the resource tracker would unlink the writer's
+        # block when this process exits
+        shm = shared_memory.SharedMemory(name=name)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+class SharedFrameBus:
+    """Single writer side of the bus (owned by the relay)"""
+
+    def __init__(self, name: str, slot_count: int = 32, slot_size: int = 1024 * 1024,
+                 notify: bool = True):
+        self.name = name
+        self.slot_count = slot_count
+        self.slot_size = slot_size
+        self.slot_stride = SLOT_HEADER.size + slot_size
+        self.logger = logging.getLogger(__name__)
+
+        size = BLOCK_HEADER_SIZE + slot_count * self.slot_stride
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a relay that crashed; nobody else writes here
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.buf = self.shm.buf
+
+        self._socket = None
+        self._subscribers = {}
+        port = 0
+        if notify:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind(("127.0.0.1", 0))
+            self._socket.setblocking(False)
+            port = self._socket.getsockname()[1]
+
+        self.seq = 0
+        BLOCK_HEADER.pack_into(self.buf, 0, MAGIC, slot_count, slot_size, port, 0)
+
+        # Metrics
+        self.published = 0
+        self.oversized = 0
+
+    def publish(self, packet: MediaPacket) -> bool:
+        """Copy a packet into the next slot; False if it doesn't fit"""
+        data = packet.to_bytes()
+        if len(data) > self.slot_size:
+            self.oversized += 1
+            return False
+
+        seq = self.seq + 1
+        offset = BLOCK_HEADER_SIZE + (seq % self.slot_count) * self.slot_stride
+        (lock,) = SEQ.unpack_from(self.buf, offset)
+        # Odd: readers treat the slot as being written
+        SEQ.pack_into(self.buf, offset, lock + 1)
+        SLOT_HEADER.pack_into(self.buf, offset, lock + 1, seq, len(data))
+        start = offset + SLOT_HEADER.size
+        self.buf[start:start + len(data)] = data
+        SEQ.pack_into(self.buf, offset, lock + 2)
+        SEQ.pack_into(self.buf, WRITE_SEQ_OFFSET, seq)
+        self.seq = seq
+        self.published += 1
+
+        if self._socket is not None:
+            self._notify(seq)
+        return True
+
+    def _notify(self, seq: int):
+        now = time.monotonic()
+        # Registrations and renewals queued since the last packet
+        while True:
+            try:
+                message, address = self._socket.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # Windows reports an ICMP unreachable from an earlier send here
+                continue
+            if message == SUBSCRIBE:
+                self._subscribers[address] = now
+
+        message = SEQ.pack(seq)
+        for address, seen in list(self._subscribers.items()):
+            if now - seen > SUBSCRIBER_TTL:
+                del self._subscribers[address]
+                continue
+            try:
+                self._socket.sendto(message, address)
+            except OSError:
+                del self._subscribers[address]
+
+    def get_stats(self) -> dict:
+        return {
+            "name": self.name,
+            "published": self.published,
+            "oversized": self.oversized,
+            "subscribers": len(self._subscribers),
+        }
+
+    def close(self):
+        """Remove the block; attached readers keep their mapping until they close"""
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self.buf = None
+        self.shm.close()
+        try:
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class SharedFrameReader:
+    """Reader side of the bus; one per receiving thread"""
+
+    def __init__(self, name: str, notify: bool = True):
+        self.name = name
+        self.shm = _attach(name)
+        self.buf = self.shm.buf
+        magic, self.slot_count, self.slot_size, port, _ = BLOCK_HEADER.unpack_from(self.buf, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ProtocolError(f"{name} is not a NodeFlow frame bus")
+        self.slot_stride = SLOT_HEADER.size + self.slot_size
+        self.logger = logging.getLogger(__name__)
+
+        self._socket = None
+        self._notify_address = ("127.0.0.1", port)
+        self._last_subscribe = 0.0
+        if notify and port:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self._socket.bind(("127.0.0.1", 0))
+            self._socket.setblocking(False)
+            self._subscribe()
+
+        # Start from the newest packet rather than replaying the ring
+        self.last_seq = self.write_seq()
+
+        # Metrics
+        self.received = 0
+        self.dropped = 0
+
+    def write_seq(self) -> int:
+        return SEQ.unpack_from(self.buf, WRITE_SEQ_OFFSET)[0]
+
+    def _subscribe(self):
+        try:
+            self._socket.sendto(SUBSCRIBE, self._notify_address)
+        except OSError as e:
+            self.logger.debug(f"Frame bus subscribe failed: {e}")
+        self._last_subscribe = time.monotonic()
+
+    def wait(self, timeout: float = 0.5) -> bool:
+        """Block until the writer announces a packet newer than last_seq"""
+        if self.write_seq() > self.last_seq:
+            return True
+        if self._socket is None:
+            time.sleep(min(timeout, 0.005))
+            return self.write_seq() > self.last_seq
+
+        if time.monotonic() - self._last_subscribe > SUBSCRIBE_INTERVAL:
+            self._subscribe()
+        readable, _, _ = select.select([self._socket], [], [], timeout)
+        if readable:
+            # Several notifications may be queued; one read pass serves them all
+            while True:
+                try:
+                    self._socket.recv(64)
+                except (BlockingIOError, InterruptedError):
+                    break
+                except OSError:
+                    break
+        return self.write_seq() > self.last_seq
+
+    def read(self, consume: Callable[[MediaPacket], object] = None) -> List:
+        """Run consume(packet) on every new packet, in order, and return the results
+
+        The packet's payload is a view into shared memory, so consume can
+        decode it in place (e.g. cv2.imdecode) without a copy, but must not
+        keep the view. Results from slots the writer overwrote meanwhile
+        are discarded and counted as dropped. The default consume copies
+        the packet out.
+        """
+        consume = consume or copy_packet
+        newest = self.write_seq()
+        first = max(self.last_seq + 1, newest - self.slot_count + 2)
+        self.dropped += max(first - self.last_seq - 1, 0)
+        results = []
+        for seq in range(first, newest + 1):
+            ok, result = self._read_slot(seq, consume)
+            if ok:
+                results.append(result)
+            else:
+                self.dropped += 1
+        self.last_seq = max(self.last_seq, newest)
+        self.received += len(results)
+        return results
+
+    def _read_slot(self, seq: int, consume) -> Tuple[bool, object]:
+        offset = BLOCK_HEADER_SIZE + (seq % self.slot_count) * self.slot_stride
+        lock, slot_seq, length = SLOT_HEADER.unpack_from(self.buf, offset)
+        if lock & 1 or slot_seq != seq or length > self.slot_size:
+            return False, None
+        start = offset + SLOT_HEADER.size
+        view = self.buf[start:start + length]
+        try:
+            result = consume(MediaPacket.parse(view))
+        except ProtocolError:
+            # Torn header: the writer got here first
+            return False, None
+        finally:
+            view.release()
+        # Seqlock check: the data consumed must not have changed under us
+        if SEQ.unpack_from(self.buf, offset)[0] != lock:
+            return False, None
+        return True, result
+
+    def get_stats(self) -> dict:
+        return {"name": self.name, "received": self.received, "dropped": self.dropped}
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+        self.buf = None
+        self.shm.close()
@@ -0,0 +1,401 @@
+"""
+Receiver sinks
+A sink is one destination for received media: the on-screen display, a
+virtual camera, the speaker, a recording. ReceiverPipeline (see
+receiver_core.py) hands every video frame to all sinks as a DecodedFrame,
+which decodes the JPEG the first time a sink asks for pixels and shares
+the result with the rest, so adding a sink never adds a decode.
+"""
+
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Iterator, Optional
+
+import cv2
+import numpy as np
+
+from services.audio_io import SpeakerOutput, SpeakerSettings
+from streaming.media_protocol import MediaPacket
+from utils.buffer_pool import BufferPool
+
+RECORD_LENGTH = struct.Struct("<I")
+
+
+class DecodedFrame:
+    """A received video packet and its pixels, decoded at most once"""
+
+    __slots__ = ("packet", "_image", "_decoded", "_nbytes")
+
+    def __init__(self, packet: MediaPacket):
+        self.packet = packet
+        self._image = None
+        self._decoded = False
+        self._nbytes = None
+
+    @classmethod
+    def decode_now(cls, packet: MediaPacket) -> "DecodedFrame":
+        """Decode packet's pixels now and keep its header, not its payload
+
+        For payloads only valid during the call, like a shared-memory slot
+        (shm_bus.SharedFrameReader.read): the pixels are the only new
+        memory. The frame's jpeg is then empty; nbytes keeps its size.
+        """
+        frame = cls(MediaPacket(packet.kind, b"", timestamp=packet.timestamp,
+                                sample_rate=packet.sample_rate, channels=packet.channels,
+                                keyframe=packet.keyframe))
+        frame._nbytes = len(packet.payload)
+        frame._decoded = True
+        frame._image = cv2.imdecode(np.frombuffer(packet.payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        return frame
+
+    @property
+    def jpeg(self):
+        """Encoded frame (bytes or a view), for sinks that don't need pixels"""
+        return self.packet.payload
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the encoded frame"""
+        return len(self.packet.payload) if self._nbytes is None else self._nbytes
+
+    @property
+    def decoded(self) -> bool:
+        return self._decoded
+
+    def image(self) -> Optional[np.ndarray]:
+        """BGR pixels, or None if the frame can't be decoded
+
+        Shared by every sink; treat it as read-only.
+        """
+        if not self._decoded:
+            self._decoded = True
+            data = np.frombuffer(self.packet.payload, dtype=np.uint8)
+            self._image = cv2.imdecode(data, cv2.IMREAD_COLOR)
+        return self._image
+
+
+class Sink:
+    """Base sink; override what you need
+
+    Methods run on the pipeline's dispatch thread, one packet at a time,
+    and should return quickly: a slow sink delays all the others.
+    """
+
+    name = "sink"
+
+    def on_video(self, frame: DecodedFrame):
+        pass
+
+    def on_audio(self, packet: MediaPacket):
+        pass
+
+    def close(self):
+        pass
+
+    def get_stats(self) -> dict:
+        return {}
+
+
+class CallbackSink(Sink):
+    """Forwards frames and audio packets to plain callables (e.g. Qt signals)"""
+
+    def __init__(self, video: Optional[Callable[[DecodedFrame], None]] = None,
+                 audio: Optional[Callable[[MediaPacket], None]] = None, name: str = "callback"):
+        self.video = video
+        self.audio = audio
+        self.name = name
+
+    def on_video(self, frame: DecodedFrame):
+        if self.video is not None:
+            self.video(frame)
+
+    def on_audio(self, packet: MediaPacket):
+        if self.audio is not None:
+            self.audio(packet)
+
+
+class StatsSink(Sink):
+    """Counts frames, audio packets and bytes, with a rolling frame rate"""
+
+    name = "stats"
+
+    def __init__(self, window: int = 30):
+        self.frame_times = deque(maxlen=window)
+        self.video_frames = 0
+        self.audio_frames = 0
+        self.bytes_received = 0
+        self.sample_rate = 0
+
+    def on_video(self, frame: DecodedFrame):
+        self.video_frames += 1
+        self.bytes_received += frame.nbytes
+        self.frame_times.append(time.monotonic())
+
+    def on_audio(self, packet: MediaPacket):
+        self.audio_frames += 1
+        self.bytes_received += len(packet.payload)
+        self.sample_rate = packet.sample_rate
+
+    @property
+    def fps(self) -> float:
+        times = self.frame_times
+        if len(times) < 2 or time.monotonic() - times[-1] > 2.0:
+            return 0.0
+        return (len(times) - 1) / max(times[-1] - times[0], 1e-3)
+
+    def get_stats(self) -> dict:
+        return {
+            "video_frames": self.video_frames,
+            "audio_frames": self.audio_frames,
+            "bytes_received": self.bytes_received,
+            "fps": self.fps,
+            "sample_rate": self.sample_rate,
+        }
+
+
+class ThroughputSink(Sink):
+    """Throughput, latency and gap counters for load tests
+
+    Latency is arrival time minus the packet's capture timestamp, so it
+    includes any clock offset between the sender and this machine (none
+    for the server's local webcam/microphone). A video gap is a frame
+    captured more than twice the usual interval after the previous one:
+    frames dropped along the way, or the sender skipping.
+
+    The counters are cheap enough to run inline on the receiving event
+    loop. Decoding is not: with a decoder (an Executor, typically shared
+    by every connection) each frame is decoded there, like a displaying
+    receiver would, and frames arriving while max_decodes of this sink's
+    frames are still in flight are counted as skipped rather than queued.
+    """
+
+    name = "throughput"
+
+    def __init__(self, decoder: Optional[Executor] = None, max_decodes: int = 2, window: int = 2048):
+        self.decoder = decoder
+        self.max_decodes = max_decodes
+        self.latencies = deque(maxlen=window)  # ms, most recent packets
+        self.first_arrival = None
+        self.last_arrival = None
+        self.video_frames = 0
+        self.audio_packets = 0
+        self.bytes_received = 0
+        self.decoded = 0
+        self.decode_errors = 0
+        self.decode_skipped = 0
+        self.video_gaps = 0
+        self.max_latency = 0.0
+        self._last_capture = None
+        self._interval = None  # Smoothed capture interval, ms
+        self._decoding = 0
+        self._decode_lock = threading.Lock()
+
+    def _arrived(self, packet: MediaPacket, size: int) -> float:
+        now = time.time()
+        if self.first_arrival is None:
+            self.first_arrival = now
+        self.last_arrival = now
+        self.bytes_received += size
+        latency = now * 1000.0 - packet.timestamp
+        self.latencies.append(latency)
+        self.max_latency = max(self.max_latency, latency)
+        return latency
+
+    def on_video(self, frame: DecodedFrame):
+        packet = frame.packet
+        self.video_frames += 1
+        self._arrived(packet, frame.nbytes)
+        if self._last_capture is not None:
+            delta = packet.timestamp - self._last_capture
+            if self._interval is not None and delta > 2 * self._interval:
+                self.video_gaps += 1
+            elif delta > 0:
+                self._interval = delta if self._interval is None else 0.9 * self._interval + 0.1 * delta
+        self._last_capture = packet.timestamp
+        if self.decoder is not None:
+            with self._decode_lock:
+                if self._decoding >= self.max_decodes:
+                    self.decode_skipped += 1
+                    return
+                self._decoding += 1
+            self.decoder.submit(frame.image).add_done_callback(self._decode_done)
+
+    def _decode_done(self, future):
+        # Runs on the decoder thread
+        ok = future.exception() is None and future.result() is not None
+        with self._decode_lock:
+            self._decoding -= 1
+            if ok:
+                self.decoded += 1
+            else:
+                self.decode_errors += 1
+
+    def on_audio(self, packet: MediaPacket):
+        self.audio_packets += 1
+        self._arrived(packet, len(packet.payload))
+
+    def get_stats(self) -> dict:
+        elapsed = (self.last_arrival - self.first_arrival) if self.first_arrival is not None else 0.0
+        rate = 1.0 / elapsed if elapsed > 0 else 0.0
+        if self.latencies:
+            p50, p95 = np.percentile(np.fromiter(self.latencies, float), (50, 95))
+        else:
+            p50 = p95 = 0.0
+        return {
+            "video_frames": self.video_frames,
+            "audio_packets": self.audio_packets,
+            "bytes_received": self.bytes_received,
+            "elapsed": round(elapsed, 3),
+            "fps": round(max(self.video_frames - 1, 0) * rate, 2),
+            "mbps": round(self.bytes_received * 8 * rate / 1e6, 3),
+            "latency_p50_ms": round(float(p50), 1),
+            "latency_p95_ms": round(float(p95), 1),
+            "latency_max_ms": round(self.max_latency, 1),
+            "video_gaps": self.video_gaps,
+            "decoded": self.decoded,
+            "decode_errors": self.decode_errors,
+            "decode_skipped": self.decode_skipped,
+        }
+
+
+class SpeakerSink(Sink):
+    """Plays received audio through SpeakerOutput
+
+    The output opens at the first packet's sample rate; later packets at
+    another rate are resampled by SpeakerOutput. No test tone: silence
+    while nothing is buffered. With fallback, another output is tried when
+    the device can't be opened.
+    """
+
+    name = "speaker"
+
+    def __init__(self, device=None, target_latency: float = 0.1, fallback: bool = True):
+        self.device = device
+        self.target_latency = target_latency
+        self.fallback = fallback
+        self.speaker: Optional[SpeakerOutput] = None
+        self.failed = False
+        self.logger = logging.getLogger(__name__)
+
+    def on_audio(self, packet: MediaPacket):
+        if self.speaker is None:
+            if self.failed:
+                return
+            settings = SpeakerSettings(
+                sample_rate=packet.sample_rate or 16000,
+                target_latency=self.target_latency,
+                test_tone=False,
+                device=self.device,
+                fallback=self.fallback,
+            )
+            try:
+                speaker = SpeakerOutput(settings)
+                speaker.start()
+            except Exception as e:
+                self.failed = True
+                self.logger.warning(f"Audio output unavailable, continuing without audio: {e}")
+                return
+            self.speaker = speaker
+        self.speaker.play_packet(packet)
+
+    def close(self):
+        if self.speaker is not None:
+            self.speaker.stop()
+            self.speaker = None
+
+    def get_stats(self) -> dict:
+        return self.speaker.get_stats() if self.speaker is not None else {}
+
+
+class VirtualCameraSink(Sink):
+    """Feeds decoded frames to a virtual camera
+
+    send_frame takes a BGR array (pyvirtualcam's Camera.send with
+    PixelFormat.BGR, VirtualDeviceManager.send_video_frame). With a size,
+    frames are resized into pooled buffers first; the camera copies the
+    frame on send, so the buffer is recycled right away.
+    """
+
+    name = "virtual_camera"
+
+    def __init__(self, send_frame: Callable[[np.ndarray], object],
+                 width: Optional[int] = None, height: Optional[int] = None):
+        self.send_frame = send_frame
+        self.size = (width, height) if width and height else None
+        self.pool = BufferPool()
+        self.sent = 0
+
+    def on_video(self, frame: DecodedFrame):
+        image = frame.image()
+        if image is None:
+            return
+        if self.size is None or image.shape[1::-1] == self.size:
+            self.send_frame(image)
+        else:
+            width, height = self.size
+            resized = self.pool.acquire((height, width, 3))
+            try:
+                cv2.resize(image, self.size, dst=resized, interpolation=cv2.INTER_LINEAR)
+                self.send_frame(resized)
+            finally:
+                self.pool.release(resized)
+        self.sent += 1
+
+    def get_stats(self) -> dict:
+        return {"sent": self.sent}
+
+
+class RecorderSink(Sink):
+    """Appends every packet, still encoded, to a file
+
+    Records are a 4-byte little-endian length followed by the packet's
+    binary wire form (media_protocol.py); read them back with
+    read_recording(). Nothing is decoded or re-encoded.
+    """
+
+    name = "recorder"
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "ab")
+        self.packets = 0
+        self.bytes = 0
+
+    def _write(self, packet: MediaPacket):
+        data = packet.to_bytes()
+        self.file.write(RECORD_LENGTH.pack(len(data)))
+        self.file.write(data)
+        self.packets += 1
+        self.bytes += len(data)
+
+    def on_video(self, frame: DecodedFrame):
+        self._write(frame.packet)
+
+    def on_audio(self, packet: MediaPacket):
+        self._write(packet)
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+    def get_stats(self) -> dict:
+        return {"packets": self.packets, "bytes": self.bytes}
+
+
+def read_recording(path: str) -> Iterator[MediaPacket]:
+    """Packets written by RecorderSink, in order"""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(RECORD_LENGTH.size)
+            if len(header) < RECORD_LENGTH.size:
+                return
+            (length,) = RECORD_LENGTH.unpack(header)
+            data = f.read(length)
+            if len(data) < length:
+                # Truncated by a crash mid-write
+                return
+            yield MediaPacket.parse(data)
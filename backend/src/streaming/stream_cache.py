@@ -0,0 +1,103 @@
+"""
+Per-stream media cache for instant join
+Keeps the most recent decodable video state (keyframe plus the frames that
+depend on it) and the current audio format for every publishing client, so a
+receiver that subscribes mid-stream can render immediately.
+"""
+
+import json
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class CachedStream:
+    keyframe: Optional[Any] = None
+    dependents: List[Any] = field(default_factory=list)
+    audio_format: Optional[Dict[str, int]] = None
+    updated_at: float = 0.0
+
+
+class StreamCache:
+    """Latest keyframe/audio-format cache, keyed by stream id
+
+    Cached messages are stored exactly as they were relayed so they can be
+    replayed to a new subscriber without re-serialization.
+    """
+
+    def __init__(self, max_dependents: int = 120):
+        self.max_dependents = max_dependents
+        self.streams: Dict[str, CachedStream] = {}
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def update_video(self, stream_id: str, message: Any, keyframe: bool = True):
+        """Record a relayed video message for a stream"""
+        with self.lock:
+            stream = self.streams.setdefault(stream_id, CachedStream())
+            stream.updated_at = time.time()
+
+            if keyframe:
+                stream.keyframe = message
+                stream.dependents.clear()
+                return
+
+            # Delta frames are only useful on top of the keyframe they follow
+            if stream.keyframe is None:
+                return
+
+            if len(stream.dependents) >= self.max_dependents:
+                # Too far from the last keyframe to be worth replaying; wait
+                # for the next one instead of flooding the new subscriber
+                self.logger.debug(f"Dropping stale GOP cache for {stream_id}")
+                stream.keyframe = None
+                stream.dependents.clear()
+                return
+
+            stream.dependents.append(message)
+
+    def update_audio_format(self, stream_id: str, sample_rate: int, channels: int = 1) -> bool:
+        """Record the audio format of a stream, returns True if it changed"""
+        audio_format = {"sampleRate": int(sample_rate), "channelCount": int(channels)}
+        with self.lock:
+            stream = self.streams.setdefault(stream_id, CachedStream())
+            stream.updated_at = time.time()
+            if stream.audio_format == audio_format:
+                return False
+            stream.audio_format = audio_format
+            return True
+
+    def snapshot(self, exclude: Optional[str] = None) -> List[Any]:
+        """Messages a new subscriber needs to start rendering every stream
+
+        Audio format announcements come first, followed by the cached
+        keyframe and its dependents in their original order.
+        """
+        messages = []
+        with self.lock:
+            for stream_id, stream in self.streams.items():
+                if stream_id == exclude:
+                    continue
+                if stream.audio_format:
+                    messages.append(json.dumps({
+                        "type": "audio_format",
+                        "stream": stream_id,
+                        **stream.audio_format,
+                    }))
+                if stream.keyframe is not None:
+                    messages.append(stream.keyframe)
+                    messages.extend(stream.dependents)
+        return messages
+
+    def drop(self, stream_id: str):
+        """Forget a stream (its publisher went away)"""
+        with self.lock:
+            self.streams.pop(stream_id, None)
+
+    def clear(self):
+        """Forget all streams"""
+        with self.lock:
+            self.streams.clear()
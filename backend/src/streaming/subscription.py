@@ -0,0 +1,73 @@
+"""
+In-process media subscriptions
+Lets code running in the same process as StreamingServer consume relayed
+packets directly, as MediaPacket objects, with no socket, TLS or
+serialisation in between.
+"""
+
+import asyncio
+from collections import deque
+from typing import Callable, Optional
+
+from streaming.media_protocol import MediaPacket
+
+
+class FrameSubscription:
+    """Async iterator over relayed packets, bounded per kind
+
+    Filled on the server's event loop; iterate it from a coroutine on the
+    same loop. Audio is yielded before video and each kind drops its
+    oldest packet when full, so a slow consumer skips stale video frames
+    rather than falling behind.
+    """
+
+    def __init__(self, max_video: int = 2, max_audio: int = 64,
+                 on_close: Optional[Callable[[], None]] = None):
+        self.video = deque(maxlen=max_video)
+        self.audio = deque(maxlen=max_audio)
+        self._ready = asyncio.Event()
+        self.on_close = on_close
+        self._closed = False
+
+        # Metrics
+        self.dropped_video = 0
+        self.dropped_audio = 0
+
+    def put(self, packet: MediaPacket):
+        queue = self.audio if packet.is_audio else self.video
+        if len(queue) == queue.maxlen:
+            if packet.is_audio:
+                self.dropped_audio += 1
+            else:
+                self.dropped_video += 1
+        queue.append(packet)
+        self._ready.set()
+
+    def close(self):
+        """Stop the subscription; iteration ends once the backlog is drained"""
+        if self._closed:
+            return
+        self._closed = True
+        self._ready.set()
+        if self.on_close is not None:
+            self.on_close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> MediaPacket:
+        while True:
+            if self.audio:
+                return self.audio.popleft()
+            if self.video:
+                return self.video.popleft()
+            if self._closed:
+                raise StopAsyncIteration
+            self._ready.clear()
+            await self._ready.wait()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
@@ -2,12 +2,16 @@ import cv2
 import numpy as np
 import asyncio
 import logging
-import queue
-from queue import Queue
+import time
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
 from threading import Thread, Event
-from typing import Optional, Tuple, Any
+from typing import AsyncIterator, Optional, Tuple, Any
 from dataclasses import dataclass
 
+from utils.buffer_pool import BufferPool, get_frame_pool
+from utils.media_ring import MediaRing
+
 
 @dataclass
 class VideoConfig:
@@ -16,90 +20,248 @@ class VideoConfig:
     fps: int = 20
     quality: int = 60  # JPEG quality (0-100)
     max_queue_size: int = 10
+    workers: int = 2  # Decode threads (OpenCV releases the GIL)
+    max_in_flight: int = 2  # Frames being decoded at once
+    max_pending: int = 2  # Raw frames waiting for a decode slot
 
 
 class VideoStreamProcessor:
-    def __init__(self, config: VideoConfig = VideoConfig()):
+    """Decode/resize pipeline stage for incoming JPEG frames
+
+    Raw frames go in through submit() (fire and forget) or process_frame()
+    (awaitable). CPU work runs on an executor so the event loop never
+    blocks; at most max_in_flight frames are decoded concurrently and when
+    more arrive the oldest waiting frame is dropped. Frames are published
+    in submission order: one that finishes after a newer frame is dropped.
+    Processed frames come out through frames() / ``async for`` or
+    get_latest_frame(), newest first.
+    """
+
+    def __init__(
+        self,
+        config: VideoConfig = VideoConfig(),
+        pool: Optional[BufferPool] = None,
+        executor: Optional[Executor] = None,
+    ):
         self.config = config
-        self.frame_queue = Queue(maxsize=config.max_queue_size)
         self.last_frame: Optional[np.ndarray] = None
+        # Resized frames are written into pooled buffers and handed back to
+        # the pool when they are dropped or superseded
+        self.pool = pool or get_frame_pool()
+        self.frame_queue = MediaRing(config.max_queue_size, on_drop=self.pool.release)
         self.stopped = Event()
         self.logger = logging.getLogger(__name__)
 
+        # Decode stage
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=config.workers, thread_name_prefix="video-decode"
+        )
+        self._pending = deque()  # (frame_data, future or None)
+        self._in_flight = 0
+        self._submitted = 0  # Sequence number of the last frame started
+        self._published = 0  # Sequence number of the newest frame published
+        self._tasks = set()
+        self._frame_ready: Optional[asyncio.Event] = None
+
         # Performance metrics
         self.fps_counter = 0
-        self.fps_timer = asyncio.get_event_loop().time()
+        self.fps_timer = time.monotonic()
         self.current_fps = 0.0
+        self.dropped_frames = 0  # Pending frames dropped, or superseded while decoding
+
+    def decode_frame(self, frame_data: bytes) -> Optional[np.ndarray]:
+        """Decode and resize a JPEG frame (CPU bound, runs on the executor)"""
+        # Wrap bytes without copying, decoder output is its own buffer
+        nparr = np.frombuffer(frame_data, np.uint8)
+        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+        if frame is None:
+            return None
+
+        # Resize if needed, into a recycled buffer
+        if (
+            frame.shape[1] != self.config.width
+            or frame.shape[0] != self.config.height
+        ):
+            resized = self.pool.acquire((self.config.height, self.config.width, 3))
+            cv2.resize(frame, (self.config.width, self.config.height), dst=resized)
+            frame = resized
+        return frame
+
+    def submit(self, frame_data: bytes) -> bool:
+        """Queue a raw frame for decoding without waiting for the result
+
+        Must be called from the event loop. Returns False if an older
+        pending frame had to be dropped to make room.
+        """
+        return self._enqueue(frame_data, None)
 
     async def process_frame(self, frame_data: bytes) -> Tuple[bool, Any]:
         """Process incoming frame data from WebSocket"""
+        future = asyncio.get_running_loop().create_future()
+        self._enqueue(frame_data, future)
+        return await future
+
+    def _enqueue(self, frame_data, future) -> bool:
+        accepted = True
+        if len(self._pending) >= self.config.max_pending:
+            _, dropped = self._pending.popleft()
+            self.dropped_frames += 1
+            accepted = False
+            if dropped is not None and not dropped.done():
+                dropped.set_result((False, "Frame dropped"))
+
+        self._pending.append((frame_data, future))
+        self._pump()
+        return accepted
+
+    def _pump(self):
+        """Start decode tasks while there are free in-flight slots"""
+        while self._pending and self._in_flight < self.config.max_in_flight:
+            if self.stopped.is_set():
+                break
+            frame_data, future = self._pending.popleft()
+            self._in_flight += 1
+            self._submitted += 1
+            task = asyncio.ensure_future(self._run(frame_data, future, self._submitted))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, frame_data, future, seq):
+        try:
+            result = await self._decode_and_publish(frame_data, seq)
+        except Exception as e:
+            result = (False, str(e))
+        finally:
+            self._in_flight -= 1
+            self._pump()
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    async def _decode_and_publish(self, frame_data: bytes, seq: int) -> Tuple[bool, Any]:
         try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(frame_data, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            loop = asyncio.get_running_loop()
+            frame = await loop.run_in_executor(self.executor, self.decode_frame, frame_data)
 
             if frame is None:
                 return False, "Invalid frame data"
 
-            # Resize if needed
-            if (
-                frame.shape[1] != self.config.width
-                or frame.shape[0] != self.config.height
-            ):
-                frame = cv2.resize(frame, (self.config.width, self.config.height))
-
-            # Update FPS counter
-            self.fps_counter += 1
-            current_time = asyncio.get_event_loop().time()
-            if current_time - self.fps_timer >= 1.0:
-                self.current_fps = self.fps_counter
-                self.fps_counter = 0
-                self.fps_timer = current_time
-
-            # Add to queue, drop oldest frame if full
-            if self.frame_queue.full():
-                try:
-                    self.frame_queue.get_nowait()
-                except queue.Empty:
-                    pass
-
-            self.frame_queue.put(frame)
+            if not self._publish(frame, seq):
+                return False, "Superseded by a newer frame"
             return True, None
 
         except Exception as e:
             self.logger.error(f"Error processing frame: {str(e)}")
             return False, str(e)
 
-    def encode_frame(self, frame: np.ndarray) -> Optional[bytes]:
-        """Encode frame as JPEG"""
+    def _publish(self, frame: np.ndarray, seq: int) -> bool:
+        if seq < self._published:
+            # A newer frame finished decoding first
+            self.dropped_frames += 1
+            self.pool.release(frame)
+            return False
+        self._published = seq
+
+        # Update FPS counter
+        self.fps_counter += 1
+        current_time = time.monotonic()
+        if current_time - self.fps_timer >= 1.0:
+            self.current_fps = self.fps_counter
+            self.fps_counter = 0
+            self.fps_timer = current_time
+
+        # Add to ring, the oldest frame is overwritten (and recycled) if
+        # full; the ring counts those drops
+        self.frame_queue.put(frame)
+        self._ready_event().set()
+        return True
+
+    def _ready_event(self) -> asyncio.Event:
+        # Created lazily so the event belongs to the loop that uses it
+        if self._frame_ready is None:
+            self._frame_ready = asyncio.Event()
+        return self._frame_ready
+
+    async def frames(self) -> AsyncIterator[np.ndarray]:
+        """Yield the newest processed frame each time one becomes available
+
+        Frames that were superseded while the consumer was busy are
+        skipped. Each yielded frame stays valid until the next one is
+        requested.
+        """
+        ready = self._ready_event()
+        while not self.stopped.is_set():
+            if self.frame_queue.empty():
+                ready.clear()
+                await ready.wait()
+                continue
+            frame = self.get_latest_frame()
+            if frame is not None:
+                yield frame
+
+    def __aiter__(self):
+        return self.frames()
+
+    def encode_frame(self, frame: np.ndarray) -> Optional[memoryview]:
+        """Encode frame as JPEG
+
+        Returns a bytes-like view over the encoder's output buffer rather
+        than copying it into a new bytes object.
+        """
         try:
             # Encode frame as JPEG
             encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.config.quality]
-            _, buffer = cv2.imencode(".jpg", frame, encode_param)
-            return buffer.tobytes()
+            ok, buffer = cv2.imencode(".jpg", frame, encode_param)
+            if not ok:
+                return None
+            return buffer.data
         except Exception as e:
             self.logger.error(f"Error encoding frame: {str(e)}")
             return None
 
     def get_latest_frame(self) -> Optional[np.ndarray]:
-        """Get the latest frame from queue"""
-        try:
-            if not self.frame_queue.empty():
-                frame = self.frame_queue.get_nowait()
-                self.last_frame = frame
-                return frame
-            return self.last_frame
-        except Exception:
+        """Get the newest processed frame, dropping any older queued ones
+
+        Returns the previous frame again if nothing new arrived. The
+        returned frame stays valid until the next call, when its buffer is
+        recycled.
+        """
+        frame = self.frame_queue.get_latest()
+        if frame is None:
             return self.last_frame
+        self.pool.release(self.last_frame)
+        self.last_frame = frame
+        return frame
 
     def get_current_fps(self) -> float:
         """Get current FPS"""
         return self.current_fps
 
+    def get_stats(self) -> dict:
+        """Get pipeline statistics"""
+        return {
+            "fps": self.current_fps,
+            "in_flight": self._in_flight,
+            "pending": len(self._pending),
+            "queued": len(self.frame_queue),
+            "dropped": self.dropped_frames + self.frame_queue.dropped,
+        }
+
     def clear(self):
         """Clear all queued frames"""
-        while not self.frame_queue.empty():
-            try:
-                self.frame_queue.get_nowait()
-            except queue.Empty:
-                pass
+        while self._pending:
+            _, future = self._pending.popleft()
+            if future is not None and not future.done():
+                future.set_result((False, "Frame dropped"))
+        for frame in self.frame_queue.clear():
+            self.pool.release(frame)
+
+    def close(self):
+        """Stop the pipeline and release the decode executor"""
+        self.stopped.set()
+        self.clear()
+        if self._frame_ready is not None:
+            self._frame_ready.set()
+        if self._owns_executor:
+            self.executor.shutdown(wait=False)
@@ -0,0 +1,150 @@
+"""
+WebSocket compression policy
+permessage-deflate is worth it for control JSON (device state, events,
+acknowledgements) and wasted CPU on media: JPEG frames and PCM audio are
+already dense and deflate saves next to nothing on them. aiohttp applies a
+connection's negotiated compression to every message, so after the
+handshake the connection default is switched to uncompressed and control
+messages ask for deflate one message at a time.
+
+Clients that only publish media (the phone page) can skip negotiation
+entirely with /ws?compress=0, which also stops the browser from deflating
+every frame it uploads.
+
+For the stats, one in sample_every messages of each class is also
+deflated here, timed, to estimate what compression saves (or would save)
+and the CPU it costs.
+"""
+
+import json
+import time
+import zlib
+from dataclasses import dataclass
+
+CONTROL = "control"
+MEDIA = "media"
+
+
+@dataclass
+class CompressionSettings:
+    negotiate: bool = True  # Offer permessage-deflate at all
+    compress_control: bool = True
+    compress_media: bool = False
+    min_size: int = 128  # Control messages smaller than this go out as is
+    sample_every: int = 32  # One in N messages is measured for the stats
+
+
+class _ClassStats:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.compressed_messages = 0
+        self.compressed_bytes = 0
+        self.sampled_bytes = 0
+        self.sampled_deflated = 0
+        self.sampled_cpu = 0.0
+
+    def ratio(self) -> float:
+        """Estimated deflated/raw size, 1.0 until something was sampled"""
+        if not self.sampled_bytes:
+            return 1.0
+        return self.sampled_deflated / self.sampled_bytes
+
+    def cpu_per_byte(self) -> float:
+        """Measured deflate CPU seconds per raw byte, 0.0 until sampled"""
+        if not self.sampled_bytes:
+            return 0.0
+        return self.sampled_cpu / self.sampled_bytes
+
+    def to_dict(self) -> dict:
+        ratio = self.ratio()
+        cpu_per_byte = self.cpu_per_byte()
+        return {
+            "messages": self.messages,
+            "bytes": self.bytes,
+            "compressed_messages": self.compressed_messages,
+            "deflate_ratio": round(ratio, 3),
+            # Estimated deflate CPU for the messages that were deflated, and
+            # for all of them; the sends themselves aren't timed, since other
+            # coroutines run while a send awaits
+            "deflate_cpu_ms": round(self.compressed_bytes * cpu_per_byte * 1000, 3),
+            "potential_deflate_cpu_ms": round(self.bytes * cpu_per_byte * 1000, 3),
+            # What deflate saved on the messages it was applied to
+            "bytes_saved": int(self.compressed_bytes * (1 - ratio)),
+            # What it would save if every message in this class were deflated
+            "potential_bytes_saved": int(self.bytes * (1 - ratio)),
+        }
+
+
+class CompressionPolicy:
+    """Decides per message whether a WebSocket send is deflated"""
+
+    def __init__(self, settings: CompressionSettings = None):
+        self.settings = settings or CompressionSettings()
+        self._stats = {CONTROL: _ClassStats(), MEDIA: _ClassStats()}
+
+    def negotiate(self, request) -> bool:
+        """compress argument for a new WebSocketResponse"""
+        return self.settings.negotiate and request.query.get("compress") != "0"
+
+    def prepare(self, ws):
+        """Make uncompressed the connection default once the handshake is done
+
+        The writer is private in aiohttp; if it ever moves, every message
+        keeps the negotiated default, which is how it behaved before.
+        """
+        writer = getattr(ws, "_writer", None)
+        if ws.compress and writer is not None and hasattr(writer, "compress"):
+            writer.compress = 0
+
+    def _wbits(self, ws, kind: str, size: int):
+        """Per-message compress argument, None to send uncompressed"""
+        settings = self.settings
+        wanted = settings.compress_media if kind == MEDIA else (
+            settings.compress_control and size >= settings.min_size
+        )
+        if wanted and ws.compress:
+            return int(ws.compress)
+        return None
+
+    async def send_control(self, ws, message: dict):
+        """Send a control/status JSON message, deflated when worthwhile"""
+        await self._send(ws, json.dumps(message), CONTROL)
+
+    async def send_media(self, ws, data):
+        """Send a media frame (binary packet or legacy JSON text)"""
+        await self._send(ws, data, MEDIA)
+
+    async def _send(self, ws, data, kind: str):
+        # JSON is ASCII (json.dumps escapes the rest), so characters are bytes
+        size = len(data)
+        stats = self._stats[kind]
+        wbits = self._wbits(ws, kind, size)
+
+        stats.messages += 1
+        stats.bytes += size
+        # The first message of each class, then one in sample_every
+        if (stats.messages - 1) % self.settings.sample_every == 0:
+            self._sample(stats, data if isinstance(data, bytes) else data.encode("utf-8"))
+
+        if isinstance(data, bytes):
+            await ws.send_bytes(data, compress=wbits)
+        else:
+            await ws.send_str(data, compress=wbits)
+        if wbits:
+            stats.compressed_messages += 1
+            stats.compressed_bytes += size
+
+    @staticmethod
+    def _sample(stats: _ClassStats, raw: bytes):
+        # Fresh raw deflate stream, like one message without context takeover
+        started = time.thread_time()
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -zlib.MAX_WBITS)
+        deflated = compressor.compress(raw) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        stats.sampled_cpu += time.thread_time() - started
+        stats.sampled_bytes += len(raw)
+        # permessage-deflate strips the trailing 00 00 ff ff
+        stats.sampled_deflated += len(deflated) - 4
+
+    def get_stats(self) -> dict:
+        return {kind: stats.to_dict() for kind, stats in self._stats.items()}
@@ -0,0 +1,114 @@
+"""
+Reusable frame buffer pool
+Hands out shape-keyed numpy arrays and size-keyed bytearrays so the per-frame
+hot paths (decode, resize, color conversion, encode) can write into existing
+memory via OpenCV's dst= arguments instead of allocating fresh buffers.
+"""
+
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class BufferPool:
+    """Thread-safe pool of ndarrays and bytearrays
+
+    Buffers are borrowed with acquire()/acquire_bytes() and must be handed
+    back with release()/release_bytes() once the consumer is done with them.
+    A released buffer may be handed out again immediately, so callers must
+    not keep references to it after releasing.
+    """
+
+    def __init__(self, max_per_key: int = 4):
+        self.max_per_key = max_per_key
+        self._arrays: Dict[Tuple, List[np.ndarray]] = defaultdict(list)
+        self._bytes: Dict[int, List[bytearray]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(shape, dtype) -> Tuple:
+        return (tuple(shape), np.dtype(dtype).str)
+
+    def acquire(self, shape, dtype=np.uint8) -> np.ndarray:
+        """Borrow an uninitialized array of the given shape and dtype"""
+        key = self._key(shape, dtype)
+        with self._lock:
+            free = self._arrays.get(key)
+            if free:
+                self.hits += 1
+                return free.pop()
+            self.misses += 1
+        return np.empty(key[0], dtype=dtype)
+
+    def release(self, array: np.ndarray):
+        """Return a borrowed array to the pool"""
+        if array is None or array.base is not None:
+            # Views share memory with someone else's buffer; never pool them
+            return
+        key = self._key(array.shape, array.dtype)
+        with self._lock:
+            free = self._arrays[key]
+            if len(free) < self.max_per_key:
+                free.append(array)
+
+    def acquire_bytes(self, size: int) -> bytearray:
+        """Borrow a bytearray of exactly size bytes"""
+        with self._lock:
+            free = self._bytes.get(size)
+            if free:
+                self.hits += 1
+                return free.pop()
+            self.misses += 1
+        return bytearray(size)
+
+    def release_bytes(self, buffer: bytearray):
+        """Return a borrowed bytearray to the pool"""
+        if buffer is None:
+            return
+        with self._lock:
+            free = self._bytes[len(buffer)]
+            if len(free) < self.max_per_key:
+                free.append(buffer)
+
+    @contextmanager
+    def borrow(self, shape, dtype=np.uint8):
+        """Context manager that releases the array on exit"""
+        array = self.acquire(shape, dtype)
+        try:
+            yield array
+        finally:
+            self.release(array)
+
+    def clear(self):
+        """Drop all pooled buffers"""
+        with self._lock:
+            self._arrays.clear()
+            self._bytes.clear()
+
+    def get_stats(self) -> dict:
+        """Get pool hit/miss statistics"""
+        with self._lock:
+            pooled = sum(len(v) for v in self._arrays.values())
+            pooled += sum(len(v) for v in self._bytes.values())
+        return {"hits": self.hits, "misses": self.misses, "pooled": pooled}
+
+
+# Global instance
+_frame_pool = None
+
+
+def get_frame_pool() -> BufferPool:
+    """Get or create the global frame buffer pool"""
+    global _frame_pool
+    if _frame_pool is None:
+        _frame_pool = BufferPool()
+    return _frame_pool
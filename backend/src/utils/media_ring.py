@@ -0,0 +1,149 @@
+"""
+Bounded latest-N ring for media items
+Producers never block: when the ring is full the oldest item is overwritten
+and counted as dropped. Consumers can poll, block with a timeout, or wait
+for an item newer than one they have already seen.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, List, Optional, Tuple
+
+
+class MediaRing:
+    """Thread-safe overwrite-oldest ring buffer
+
+    Every put() is assigned an increasing sequence number so consumers that
+    only care about the newest item can use wait_for_new() instead of
+    draining the ring.
+    """
+
+    def __init__(self, capacity: int, on_drop: Optional[Callable[[Any], None]] = None):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.on_drop = on_drop
+        self._items = deque()
+        self._cond = threading.Condition(threading.Lock())
+        self._seq = 0
+        self._closed = False
+
+        # Metrics
+        self.put_count = 0
+        self.dropped = 0
+
+    def put(self, item: Any) -> bool:
+        """Add an item, overwriting the oldest one if full
+
+        Returns False if an older item was dropped to make room.
+        """
+        evicted = None
+        with self._cond:
+            if len(self._items) >= self.capacity:
+                evicted = self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._seq += 1
+            self.put_count += 1
+            self._cond.notify_all()
+
+        if evicted is not None and self.on_drop is not None:
+            self.on_drop(evicted)
+        return evicted is None
+
+    def get_nowait(self) -> Optional[Any]:
+        """Pop the oldest item, or None if empty"""
+        with self._cond:
+            if self._items:
+                return self._items.popleft()
+            return None
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Pop the oldest item, waiting up to timeout seconds for one
+
+        Returns None on timeout or once the ring is closed.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self._items:
+                if self._closed:
+                    return None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._items.popleft()
+
+    def get_latest(self) -> Optional[Any]:
+        """Pop the newest item, dropping anything older"""
+        with self._cond:
+            if not self._items:
+                return None
+            item = self._items.pop()
+            stale = list(self._items)
+            self._items.clear()
+            self.dropped += len(stale)
+
+        if self.on_drop is not None:
+            for old in stale:
+                self.on_drop(old)
+        return item
+
+    def peek_latest(self) -> Tuple[int, Optional[Any]]:
+        """Return (sequence, newest item) without removing it"""
+        with self._cond:
+            return self._seq, (self._items[-1] if self._items else None)
+
+    def wait_for_new(self, last_seq: int, timeout: Optional[float] = None) -> Tuple[int, Optional[Any]]:
+        """Wait until an item newer than last_seq arrives
+
+        Returns (sequence, newest item) without removing it, or
+        (last_seq, None) on timeout / close.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._seq <= last_seq or not self._items:
+                if self._closed:
+                    return last_seq, None
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return last_seq, None
+                self._cond.wait(remaining)
+            return self._seq, self._items[-1]
+
+    def clear(self) -> List[Any]:
+        """Remove and return all items"""
+        with self._cond:
+            items = list(self._items)
+            self._items.clear()
+            return items
+
+    def close(self):
+        """Wake all waiters; subsequent waits return immediately"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def reopen(self):
+        """Allow waiting again after close()"""
+        with self._cond:
+            self._closed = False
+
+    def empty(self) -> bool:
+        with self._cond:
+            return not self._items
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._items)
+
+    def get_stats(self) -> dict:
+        """Get ring statistics"""
+        with self._cond:
+            return {
+                "capacity": self.capacity,
+                "size": len(self._items),
+                "put": self.put_count,
+                "dropped": self.dropped,
+            }
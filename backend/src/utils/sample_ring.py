@@ -0,0 +1,134 @@
+"""
+Preallocated PCM sample ring
+A fixed-size float32 ring that audio callbacks can read from (and write to)
+without allocating: samples are copied into and out of one buffer created
+up front. When the writer gets too far ahead the oldest samples are
+overwritten so latency stays bounded.
+"""
+
+import threading
+from typing import Optional
+
+import numpy as np
+
+
+class SampleRing:
+    """Frame-oriented audio ring buffer with underrun/overrun counters
+
+    A frame is one sample per channel. write() accepts mono/interleaved
+    1-D arrays or (frames, channels) arrays; read_into() fills a
+    (frames, channels) array such as a PortAudio ``outdata`` block.
+    """
+
+    def __init__(self, capacity_frames: int, channels: int = 1, dtype=np.float32):
+        if capacity_frames < 1:
+            raise ValueError("capacity_frames must be at least 1")
+        self.capacity = int(capacity_frames)
+        self.channels = int(channels)
+        self.dtype = np.dtype(dtype)
+        self._buf = np.zeros((self.capacity, self.channels), dtype=self.dtype)
+        self._read = 0
+        self._write = 0
+        self._size = 0
+        self._starved = True
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.frames_written = 0
+        self.frames_read = 0
+        self.overruns = 0  # Writes that overwrote unread samples
+        self.overrun_frames = 0
+        self.underruns = 0  # Reads that ran dry after data had been flowing
+
+    def _as_frames(self, samples) -> np.ndarray:
+        data = np.asarray(samples, dtype=self.dtype)
+        if data.ndim == 1:
+            data = data.reshape(-1, self.channels)
+        return data
+
+    def write(self, samples) -> int:
+        """Append samples, overwriting the oldest ones if the ring is full"""
+        data = self._as_frames(samples)
+        n = len(data)
+        if n == 0:
+            return 0
+
+        with self._lock:
+            cap = self.capacity
+            if n > cap:
+                self.overrun_frames += n - cap
+                data = data[n - cap:]
+                n = cap
+
+            free = cap - self._size
+            if n > free:
+                drop = n - free
+                self._read = (self._read + drop) % cap
+                self._size -= drop
+                self.overruns += 1
+                self.overrun_frames += drop
+
+            first = min(n, cap - self._write)
+            self._buf[self._write:self._write + first] = data[:first]
+            if n > first:
+                self._buf[:n - first] = data[first:]
+
+            self._write = (self._write + n) % cap
+            self._size += n
+            self.frames_written += n
+            self._starved = False
+        return n
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Fill out with buffered frames, zero-padding any shortfall
+
+        Returns the number of real frames copied. Safe to call from an audio
+        callback: it copies into the caller's array and allocates nothing.
+        """
+        frames = len(out)
+        with self._lock:
+            cap = self.capacity
+            n = min(frames, self._size)
+            first = min(n, cap - self._read)
+            if first:
+                out[:first] = self._buf[self._read:self._read + first]
+            if n > first:
+                out[first:n] = self._buf[:n - first]
+
+            self._read = (self._read + n) % cap
+            self._size -= n
+            self.frames_read += n
+
+            if n < frames:
+                out[n:] = 0
+                if not self._starved:
+                    self.underruns += 1
+                    self._starved = True
+        return n
+
+    def available(self) -> int:
+        """Number of buffered frames"""
+        with self._lock:
+            return self._size
+
+    def clear(self):
+        """Discard all buffered frames"""
+        with self._lock:
+            self._read = self._write = self._size = 0
+            self._starved = True
+
+    def get_stats(self, sample_rate: Optional[int] = None) -> dict:
+        """Get buffer statistics, including latency if sample_rate is given"""
+        with self._lock:
+            stats = {
+                "capacity": self.capacity,
+                "buffered": self._size,
+                "written": self.frames_written,
+                "read": self.frames_read,
+                "overruns": self.overruns,
+                "overrun_frames": self.overrun_frames,
+                "underruns": self.underruns,
+            }
+        if sample_rate:
+            stats["buffered_ms"] = 1000.0 * stats["buffered"] / sample_rate
+        return stats
@@ -0,0 +1,194 @@
+"""
+Server TLS setup
+One place that loads (or, if needed, generates) the server certificate and
+builds the SSLContext every entry point shares. Certificates are ECDSA
+P-256, which makes handshakes much cheaper than RSA-2048; the context
+prefers ECDHE with AES-GCM/ChaCha20 and keeps session tickets on, so a
+phone reconnecting after a Wi-Fi blip resumes its session instead of
+doing a full handshake. The certificate is only regenerated when missing,
+unreadable or close to expiry, and that work runs on a background thread
+so it can overlap the rest of startup.
+"""
+
+import datetime
+import ipaddress
+import logging
+import os
+import socket
+import ssl
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# backend/src, where server.crt/server.key have always lived
+DEFAULT_CERT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CERT_FILE = DEFAULT_CERT_DIR / "server.crt"
+DEFAULT_KEY_FILE = DEFAULT_CERT_DIR / "server.key"
+
+CERT_VALID_DAYS = 825  # Longest validity Apple platforms accept
+RENEW_BEFORE_DAYS = 30
+CIPHERS = "ECDHE+AESGCM:ECDHE+CHACHA20"
+TLS13_TICKETS = 2  # Tickets per handshake, so parallel reconnects can all resume
+
+_lock = threading.Lock()
+_prepared: Dict[Tuple[str, str], Future] = {}
+
+
+def _paths(cert_path=None, key_path=None) -> Tuple[str, str]:
+    # Normalised so every spelling of the same files shares one context
+    return (
+        os.path.abspath(str(cert_path or DEFAULT_CERT_FILE)),
+        os.path.abspath(str(key_path or DEFAULT_KEY_FILE)),
+    )
+
+
+def _local_ip() -> Optional[str]:
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except OSError:
+        return None
+
+
+def generate_certificate(cert_path=None, key_path=None, days: int = CERT_VALID_DAYS):
+    """Write a self-signed ECDSA P-256 certificate and key
+
+    The certificate names localhost, 127.0.0.1 and the current LAN
+    address. Files are written to temporaries and renamed into place, so
+    a crash never leaves a half-written pair; the key is private to the user.
+    """
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    cert_path, key_path = _paths(cert_path, key_path)
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "NodeFlow")])
+
+    alt_names = [x509.DNSName("localhost"), x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]
+    local_ip = _local_ip()
+    if local_ip and local_ip != "127.0.0.1":
+        alt_names.append(x509.IPAddress(ipaddress.ip_address(local_ip)))
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=days))
+        .add_extension(x509.SubjectAlternativeName(alt_names), critical=False)
+        .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    _write_atomic(key_path, key_pem, mode=0o600)
+    _write_atomic(cert_path, cert.public_bytes(serialization.Encoding.PEM))
+    logger.info(f"Generated ECDSA P-256 certificate {cert_path} (valid {days} days)")
+
+
+def _write_atomic(path: str, data: bytes, mode: int = 0o644):
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, mode)
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def certificate_is_current(cert_path=None, key_path=None) -> bool:
+    """Whether the existing pair can be used as is (present, readable, not expiring)"""
+    cert_path, key_path = _paths(cert_path, key_path)
+    if not (os.path.exists(cert_path) and os.path.exists(key_path)):
+        return False
+    try:
+        from cryptography import x509
+
+        with open(cert_path, "rb") as f:
+            cert = x509.load_pem_x509_certificate(f.read())
+        expires = getattr(cert, "not_valid_after_utc", None)
+        if expires is None:
+            expires = cert.not_valid_after.replace(tzinfo=datetime.timezone.utc)
+    except ImportError:
+        # Can't inspect it; trust whatever is there
+        return True
+    except Exception as e:
+        logger.warning(f"Unreadable certificate {cert_path}: {e}")
+        return False
+    remaining = expires - datetime.datetime.now(datetime.timezone.utc)
+    return remaining > datetime.timedelta(days=RENEW_BEFORE_DAYS)
+
+
+def create_server_context(cert_path=None, key_path=None) -> ssl.SSLContext:
+    """Build a tuned server context for an existing certificate pair"""
+    cert_path, key_path = _paths(cert_path, key_path)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    # TLS 1.2 suites; TLS 1.3 ones are all AEAD already
+    context.set_ciphers(CIPHERS)
+    context.options |= ssl.OP_NO_COMPRESSION | ssl.OP_CIPHER_SERVER_PREFERENCE
+    # Session tickets stay enabled (OP_NO_TICKET unset) for resumption
+    context.options &= ~ssl.OP_NO_TICKET
+    if hasattr(context, "num_tickets"):
+        context.num_tickets = TLS13_TICKETS
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+def _load_or_generate(cert_path: str, key_path: str) -> ssl.SSLContext:
+    if not certificate_is_current(cert_path, key_path):
+        logger.info("Server certificate missing or expiring, generating a new one...")
+        generate_certificate(cert_path, key_path)
+    context = create_server_context(cert_path, key_path)
+    logger.info("SSL context ready")
+    return context
+
+
+def prepare(cert_path=None, key_path=None) -> Future:
+    """Start loading/generating the certificate in the background
+
+    Idempotent: every caller for the same pair shares one Future and, once
+    it resolves, one SSLContext (and with it, one session ticket key).
+    """
+    paths = _paths(cert_path, key_path)
+    with _lock:
+        future = _prepared.get(paths)
+        if future is not None:
+            return future
+        future = Future()
+        _prepared[paths] = future
+
+    def work():
+        try:
+            future.set_result(_load_or_generate(*paths))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=work, name="tls-prepare", daemon=True).start()
+    return future
+
+
+def get_server_context(cert_path=None, key_path=None,
+                       timeout: Optional[float] = None) -> Optional[ssl.SSLContext]:
+    """The shared server context, or None if TLS could not be set up"""
+    future = prepare(cert_path, key_path)
+    try:
+        return future.result(timeout)
+    except Exception as e:
+        logger.error(f"Error setting up SSL: {e}")
+        with _lock:
+            # Allow a later call to retry (e.g. after fixing permissions)
+            if _prepared.get(_paths(cert_path, key_path)) is future and future.done():
+                del _prepared[_paths(cert_path, key_path)]
+        return None
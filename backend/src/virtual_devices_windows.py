@@ -21,31 +21,25 @@ python virtual_devices_windows.py --server wss://192.168.1.82:5000/ws
 
 What happens:
 1. Connects to NodeFlow server WebSocket
-2. Receives video frames (base64 JPEG)
-3. Decodes JPEG → RGB array
-4. Feeds RGB to virtual camera (Windows sees as "OBS Virtual Camera")
-5. Receives audio frames (raw PCM float32)
-6. Writes audio to virtual cable device
+2. Receives binary video frames (JPEG) and audio frames (raw PCM float32)
+3. Decodes JPEG → BGR array
+4. Feeds BGR to virtual camera (Windows sees as "OBS Virtual Camera")
+5. Writes audio to virtual cable device
+6. Reconnects with backoff if the server goes away
 7. Other apps (Discord, Zoom, Teams, OBS) can select:
    - Webcam: "OBS Virtual Camera"
    - Microphone: "Cable Input (VB-Audio Virtual Cable)"
 
 Performance:
 - Video: 15-30 FPS depending on bandwidth and PC specs
-- Audio: Real-time with 10-second buffer to handle jitter
+- Audio: Real-time with a ~100 ms jitter buffer
 - CPU: ~5-15% (mostly JPEG decoding and frame resizing)
 """
 
 import argparse
-import base64
-import json
+import asyncio
 import logging
 import sys
-from collections import deque
-from io import BytesIO
-
-import numpy as np
-import websocket
 
 try:
     import pyvirtualcam
@@ -63,12 +57,15 @@ except ImportError:
     sys.exit(1)
 
 try:
-    from PIL import Image
+    import cv2
 except ImportError:
-    print("ERROR: Pillow not installed")
-    print("Install with: pip install Pillow")
+    print("ERROR: OpenCV not installed")
+    print("Install with: pip install opencv-python")
     sys.exit(1)
 
+from streaming.receiver_core import ReceiverCore, ReceiverPipeline
+from streaming.sinks import SpeakerSink, VirtualCameraSink
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger('virtual_devices')
 
@@ -81,21 +78,22 @@ class VirtualDevicesBridge:
         self.camera_fps = camera_fps
         self.audio_device = audio_device
         
-        self.ws = None
         self.camera = None
-        self.audio_stream = None
-        self.audio_buffer = deque(maxlen=480000)  # ~10 seconds @ 48kHz
-        self.sample_rate = 16000
-        self.running = False
+        self.pipeline = ReceiverPipeline()
+        self.core = ReceiverCore(
+            server, self.pipeline, client='virtual-devices-windows', on_status=self.on_status
+        )
 
     def init_camera(self):
         """Initialize virtual camera"""
         logger.info(f"Initializing virtual camera: {self.camera_width}x{self.camera_height}@{self.camera_fps}fps")
         try:
+            # Take BGR directly so decoded frames need no color conversion
             self.camera = pyvirtualcam.Camera(
                 width=self.camera_width,
                 height=self.camera_height,
-                fps=self.camera_fps
+                fps=self.camera_fps,
+                fmt=pyvirtualcam.PixelFormat.BGR
             )
             logger.info("✓ Virtual camera initialized")
             logger.info("  Windows now sees: OBS Virtual Camera")
@@ -107,147 +105,24 @@ class VirtualDevicesBridge:
             logger.error("  2. Or download from: https://github.com/obsproject/obs-studio/releases")
             return False
 
-    def init_audio(self, sample_rate=16000):
-        """Initialize virtual audio output"""
+    def init_audio(self):
+        """Route received audio to the virtual cable
+
+        The output opens with the first audio frame; if the cable can't be
+        opened, audio is dropped rather than played on the speakers.
+        """
         if not self.audio_device:
             logger.info("Audio device not specified; audio will not be routed")
-            return True
-
-        logger.info(f"Initializing audio to device: {self.audio_device}")
-        self.sample_rate = sample_rate
-        self.audio_buffer.clear()
-
-        def audio_callback(outdata, frames, time_info, status):
-            if status:
-                logger.debug(f"Audio callback status: {status}")
-            
-            samples = []
-            for _ in range(frames):
-                if self.audio_buffer:
-                    samples.append(self.audio_buffer.popleft())
-                else:
-                    samples.append(0.0)
-            
-            outdata[:, 0] = np.array(samples, dtype=np.float32)
-
-        try:
-            self.audio_stream = sd.OutputStream(
-                samplerate=sample_rate,
-                channels=1,
-                dtype='float32',
-                device=self.audio_device,
-                callback=audio_callback
-            )
-            self.audio_stream.start()
-            logger.info("✓ Virtual audio output initialized")
-            return True
-        except Exception as e:
-            logger.error(f"Failed to initialize audio: {e}")
-            logger.warning("Audio will not be routed. Make sure VB-Cable is installed:")
-            logger.warning("  https://vb-audio.com/Cable/")
-            logger.warning("  Then set audio_device to: 'Cable Input (VB-Audio Virtual Cable)'")
-            return False
-
-    def on_message(self, ws, message):
-        """Handle incoming WebSocket message"""
-        try:
-            data = json.loads(message)
-            msg_type = data.get('type')
-
-            if msg_type == 'video':
-                self._handle_video(data)
-            elif msg_type == 'audio':
-                self._handle_audio(data)
-
-        except Exception as e:
-            logger.debug(f"Message error: {e}")
-
-    def _handle_video(self, data):
-        """Handle incoming video frame"""
-        if not self.camera:
-            return
-
-        try:
-            b64_data = data.get('data', '')
-            if not b64_data:
-                return
-
-            # Decode base64 JPEG
-            jpeg_data = base64.b64decode(b64_data)
-            image = Image.open(BytesIO(jpeg_data))
-
-            # Convert to RGB (in case it's RGBA or grayscale)
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-
-            # Resize to match camera resolution
-            image = image.resize((self.camera_width, self.camera_height), Image.Resampling.LANCZOS)
-
-            # Convert to numpy array
-            frame = np.array(image, dtype=np.uint8)
-
-            # Send to virtual camera
-            self.camera.send(frame)
-
-        except Exception as e:
-            logger.debug(f"Video frame error: {e}")
-
-    def _handle_audio(self, data):
-        """Handle incoming audio frame"""
-        if not self.audio_stream:
             return
+        logger.info(f"Audio will be routed to device: {self.audio_device}")
+        self.pipeline.add_sink(SpeakerSink(device=self.audio_device, fallback=False))
 
-        try:
-            audio_field = data.get('data')
-            sample_rate = int(data.get('sampleRate', 16000))
-            samples = None
-
-            # Recreate stream if sample rate changed
-            if sample_rate != self.sample_rate:
-                logger.info(f"Sample rate change: {self.sample_rate}Hz → {sample_rate}Hz")
-                if self.audio_stream:
-                    self.audio_stream.stop()
-                    self.audio_stream.close()
-                self.init_audio(sample_rate)
-
-            # Decode audio data
-            if isinstance(audio_field, str):
-                try:
-                    decoded = base64.b64decode(audio_field)
-                    samples = np.frombuffer(decoded, dtype=np.float32)
-                except Exception:
-                    samples = None
-            elif isinstance(audio_field, list):
-                samples = np.array(audio_field, dtype=np.float32)
-
-            # Add to buffer
-            if samples is not None and samples.size > 0:
-                flat = samples.flatten().astype(np.float32)
-                for s in flat.tolist():
-                    self.audio_buffer.append(s)
-
-        except Exception as e:
-            logger.debug(f"Audio frame error: {e}")
-
-    def on_open(self, ws):
-        """WebSocket connected"""
-        logger.info("✓ Connected to NodeFlow server")
-        try:
-            ws.send(json.dumps({
-                'type': 'hello',
-                'client': 'virtual-devices-windows'
-            }))
-        except Exception:
-            pass
-
-    def on_close(self, ws, close_status, close_msg):
-        """WebSocket closed"""
-        logger.info("WebSocket disconnected")
-        self.running = False
-
-    def on_error(self, ws, err):
-        """WebSocket error"""
-        logger.error(f"WebSocket error: {err}")
+    def on_status(self, status):
+        """Connection status from the receiver core"""
+        if status == 'Ready':
+            logger.info("✓ Connected to NodeFlow server")
+        elif status.startswith('Reconnecting'):
+            logger.info(f"Disconnected; {status.lower()}")
 
     def run(self):
         """Main loop"""
@@ -255,7 +130,9 @@ class VirtualDevicesBridge:
             logger.error("Cannot proceed without virtual camera. Exiting.")
             return False
 
-        self.init_audio(self.sample_rate)
+        # Frames are resized to the camera resolution into pooled buffers
+        self.pipeline.add_sink(VirtualCameraSink(self.camera.send, self.camera_width, self.camera_height))
+        self.init_audio()
 
         logger.info("\n" + "=" * 70)
         logger.info("NodeFlow Virtual Devices Bridge (Windows)")
@@ -272,27 +149,17 @@ class VirtualDevicesBridge:
         logger.info("\nPress Ctrl+C to stop\n")
         logger.info("=" * 70 + "\n")
 
-        self.running = True
-        self.ws = websocket.WebSocketApp(
-            self.server,
-            on_message=self.on_message,
-            on_open=self.on_open,
-            on_close=self.on_close,
-            on_error=self.on_error
-        )
-        self.ws.run_forever(sslopt={'cert_reqs': 0})
+        self.pipeline.start()
+        asyncio.run(self.core.run())
 
         return True
 
     def stop(self):
         """Clean up"""
+        self.core.stop()
+        self.pipeline.stop()
         if self.camera:
             self.camera.close()
-        if self.audio_stream:
-            self.audio_stream.stop()
-            self.audio_stream.close()
-        if self.ws:
-            self.ws.close()
 
 
 def list_audio_devices():
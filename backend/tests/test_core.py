@@ -1,6 +1,9 @@
 import pytest
 import sys
 import os
+import socket
+import ssl
+import threading
 from pathlib import Path
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
@@ -8,6 +11,7 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from core.config import Config, ConfigManager, NetworkConfig, StreamConfig
 from models.device import Device, DeviceType, DeviceStatus
 from utils.security import SecurityManager
+from utils import tls
 
 
 class TestConfig:
@@ -82,5 +86,68 @@ class TestSecurityManager:
         assert not manager.validate_command('start', 'invalid_device')
 
 
+
+class TestTLS:
+    def test_generates_ecdsa_certificate_once(self, tmp_path):
+        from cryptography import x509
+        from cryptography.hazmat.primitives.asymmetric import ec
+
+        cert, key = tmp_path / 'server.crt', tmp_path / 'server.key'
+        assert not tls.certificate_is_current(cert, key)
+        context = tls.get_server_context(cert, key)
+        assert context is not None
+        # Same pair, any spelling: one cached context, no regeneration
+        assert tls.get_server_context(str(tmp_path / '.' / 'server.crt'), key) is context
+        assert tls.certificate_is_current(cert, key)
+        public_key = x509.load_pem_x509_certificate(cert.read_bytes()).public_key()
+        assert isinstance(public_key.curve, ec.SECP256R1)
+        if os.name == 'posix':
+            assert key.stat().st_mode & 0o777 == 0o600
+
+    def test_expiring_certificate_is_replaced(self, tmp_path):
+        cert, key = tmp_path / 'server.crt', tmp_path / 'server.key'
+        tls.generate_certificate(cert, key, days=10)
+        assert not tls.certificate_is_current(cert, key)
+
+    def test_sessions_resume(self, tmp_path):
+        server_context = tls.create_server_context(*_generated(tmp_path))
+        client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        client_context.check_hostname = False
+        client_context.verify_mode = ssl.CERT_NONE
+
+        listener = socket.create_server(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+
+        def serve():
+            for _ in range(2):
+                conn, _ = listener.accept()
+                with server_context.wrap_socket(conn, server_side=True) as tls_conn:
+                    tls_conn.sendall(b'ok')
+                    tls_conn.recv(1)
+
+        thread = threading.Thread(target=serve, daemon=True)
+        thread.start()
+        session = None
+        reused = []
+        try:
+            for _ in range(2):
+                with socket.create_connection(('127.0.0.1', port)) as sock:
+                    with client_context.wrap_socket(sock, session=session) as conn:
+                        conn.recv(2)  # TLS 1.3 tickets arrive after the handshake
+                        reused.append(conn.session_reused)
+                        session = conn.session
+                        conn.sendall(b'x')
+        finally:
+            thread.join(5)
+            listener.close()
+        assert reused == [False, True]
+
+
+def _generated(tmp_path):
+    cert, key = tmp_path / 'server.crt', tmp_path / 'server.key'
+    tls.generate_certificate(cert, key)
+    return cert, key
+
+
 if __name__ == '__main__':
     pytest.main([__file__, '-v'])
@@ -0,0 +1,404 @@
+import pytest
+import sys
+import os
+import asyncio
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from services.audio_io import (
+    MicrophoneCapture, MicrophoneSettings, SpeakerOutput, SpeakerSettings
+)
+from services.async_hardware import AsyncHardwareService
+from services.audio_devices import AudioDeviceManager
+from services.device_state import DeviceStateStore
+from services.hardware_service import HardwareService
+from models.device import DeviceType
+from services.capture_engine import CaptureEngine, CaptureSettings
+from streaming.media_protocol import MediaPacket, audio_packet
+
+
+def _write_clip(path, frames=10, width=160, height=120):
+    """Write a small MJPG clip that stands in for a camera"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'MJPG'), 30, (width, height))
+    for i in range(frames):
+        frame = np.full((height, width, 3), i * 20, dtype=np.uint8)
+        writer.write(frame)
+    writer.release()
+    return str(path)
+
+
+class TestCaptureEngine:
+    def test_subscribers_share_read_only_frames(self, tmp_path):
+        clip = _write_clip(tmp_path / 'clip.avi')
+        engine = CaptureEngine(CaptureSettings(width=160, height=120, fourcc=''))
+        received = []
+        got_frame = threading.Event()
+
+        def on_frame(frame):
+            received.append(frame)
+            got_frame.set()
+
+        engine.subscribe(on_frame)
+        try:
+            engine.open(clip)
+            assert got_frame.wait(5)
+            seq, latest = engine.wait_for_frame(0, timeout=5)
+            assert seq >= 1
+            assert not received[0].flags.writeable
+            assert received[0].shape == (120, 160, 3)
+        finally:
+            engine.close()
+
+    def test_next_jpeg_and_unsubscribe(self, tmp_path):
+        clip = _write_clip(tmp_path / 'clip.avi')
+        engine = CaptureEngine(CaptureSettings(fourcc=''))
+        token = engine.subscribe(lambda frame: None)
+        engine.unsubscribe(token)
+        try:
+            engine.open(clip)
+            seq, jpeg = engine.next_jpeg(0, timeout=5)
+            assert jpeg is not None
+            assert bytes(jpeg[:2]) == b'\xff\xd8'
+            assert engine.get_stats()['subscribers'] == 0
+        finally:
+            engine.close()
+        assert not engine.running
+
+    def test_mjpeg_passthrough_skips_codec(self, tmp_path):
+        clip = _write_clip(tmp_path / 'clip.avi')
+        engine = CaptureEngine(CaptureSettings(width=160, height=120))
+        try:
+            engine.open(clip)
+            assert engine.passthrough
+            # Let the clip run out so the newest frame stops changing
+            deadline = time.monotonic() + 5
+            while engine.running and time.monotonic() < deadline:
+                time.sleep(0.01)
+            seq, jpeg = engine.next_jpeg(0, timeout=5)
+            assert bytes(jpeg[:2]) == b'\xff\xd8'
+            stats = engine.get_stats()
+            assert stats['decoded'] == 0 and stats['encoded'] == 0
+
+            # Pixels are decoded only on request, once per frame
+            seq, frame = engine.latest()
+            assert frame.shape == (120, 160, 3)
+            assert engine.latest()[1] is frame
+            assert engine.get_stats()['decoded'] == 1
+        finally:
+            engine.close()
+
+    def test_open_missing_source(self, tmp_path):
+        engine = CaptureEngine()
+        with pytest.raises(RuntimeError):
+            engine.open(str(tmp_path / 'missing.avi'))
+
+    def test_close_leaves_camera_to_a_stuck_grab_thread(self):
+        class StuckCapture:
+            def __init__(self):
+                self.unblock = threading.Event()
+                self.released = False
+
+            def read(self):
+                self.unblock.wait(5)
+                return False, None
+
+            def release(self):
+                self.released = True
+
+        engine = CaptureEngine()
+        engine.CLOSE_TIMEOUT = 0.05
+        capture = engine._capture = StuckCapture()
+        engine._thread = threading.Thread(target=engine._grab_loop, daemon=True)
+        engine._thread.start()
+        engine.close()
+        assert engine.running and not capture.released
+        with pytest.raises(RuntimeError):
+            engine.open(0)
+
+        capture.unblock.set()
+        engine._thread.join(5)
+        assert capture.released and engine._capture is None
+        engine.close()
+        assert not engine.running
+
+
+class TestMicrophoneCapture:
+    def test_callback_blocks_become_packets(self):
+        mic = MicrophoneCapture(MicrophoneSettings(sample_rate=16000, frame_size=4))
+        packets = []
+        mic.subscribe(packets.append)
+        block = np.arange(6, dtype=np.float32).reshape(-1, 1)
+        mic._callback(block, 6, None, None)
+        mic._drain()
+        # One full block published, the remainder waits for more audio
+        assert len(packets) == 1
+        parsed = MediaPacket.parse(packets[0].to_bytes())
+        assert parsed.sample_rate == 16000
+        np.testing.assert_array_equal(parsed.samples(), [0, 1, 2, 3])
+        assert mic.ring.available() == 2
+
+    def test_backlog_is_bounded(self):
+        mic = MicrophoneCapture(MicrophoneSettings(sample_rate=100, frame_size=10, ring_seconds=0.2))
+        block = np.zeros((10, 1), dtype=np.float32)
+        for _ in range(5):
+            mic._callback(block, 10, None, None)
+        stats = mic.get_stats()
+        assert stats['buffered'] == 20
+        assert stats['overrun_frames'] == 30
+        assert stats['callbacks'] == 5
+
+
+class TestSpeakerOutput:
+    def test_tone_is_phase_continuous(self):
+        speaker = SpeakerOutput(SpeakerSettings(sample_rate=8000, frame_size=300))
+        out = np.zeros((300, 2), dtype=np.float32)
+        blocks = []
+        for _ in range(30):  # Crosses the table wrap point
+            speaker._callback(out, 300, None, None)
+            blocks.append(out[:, 0].copy())
+        played = np.concatenate(blocks)
+        n = np.arange(len(played))
+        expected = 0.5 * np.sin(2 * np.pi * 440 * n / 8000)
+        np.testing.assert_allclose(played, expected, atol=1e-5)
+        np.testing.assert_array_equal(out[:, 0], out[:, 1])
+
+    def test_plays_relayed_audio_after_prefill(self):
+        settings = SpeakerSettings(sample_rate=1000, frame_size=50, target_latency=0.1, test_tone=False)
+        speaker = SpeakerOutput(settings)
+        out = np.ones((50, 1), dtype=np.float32)
+        speaker._callback(out, 50, None, None)
+        assert not out.any()
+
+        # 2 kHz stereo in, 1 kHz mono out
+        stereo = np.full((400, 2), 0.25, dtype=np.float32)
+        speaker.play_packet(audio_packet(stereo.reshape(-1), 2000, channels=2))
+        assert speaker.ring.available() == 200
+        speaker._callback(out, 50, None, None)
+        np.testing.assert_allclose(out, 0.25)
+        assert speaker.get_stats()['resampled'] == 1
+
+    def test_tone_stops_once_stream_audio_arrives(self):
+        settings = SpeakerSettings(sample_rate=1000, frame_size=50, target_latency=0.05)
+        speaker = SpeakerOutput(settings)
+        out = np.zeros((50, 1), dtype=np.float32)
+        speaker._callback(out, 50, None, None)
+        assert out.any()
+
+        speaker.play_packet(audio_packet(np.full(50, 0.25, dtype=np.float32), 1000))
+        speaker._callback(out, 50, None, None)
+        np.testing.assert_allclose(out, 0.25)
+        # Ran dry: silence while re-priming, no tone
+        speaker._callback(out, 50, None, None)
+        assert not out.any()
+
+
+class _FakeStream:
+    def __init__(self, backend, device=None, channels=1, **kwargs):
+        if device in backend.broken:
+            raise OSError(f"device {device} unavailable")
+        self.backend = backend
+        self.device = device
+        self.channels = channels
+        self.active = False
+        self.closed = False
+        backend.opened.append(self)
+
+    def start(self):
+        if self.device in self.backend.unstartable:
+            raise OSError(f"device {self.device} failed to start")
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.closed = True
+
+
+class _FakeBackend:
+    """Minimal stand-in for the sounddevice module"""
+
+    def __init__(self, broken=(), unstartable=()):
+        self.broken = set(broken)
+        self.unstartable = set(unstartable)
+        self.opened = []
+        self.queries = 0
+        self.devices = [
+            {'name': 'Mic', 'max_input_channels': 1, 'max_output_channels': 0},
+            {'name': 'Speakers', 'max_input_channels': 0, 'max_output_channels': 2},
+            {'name': 'CABLE Input', 'max_input_channels': 0, 'max_output_channels': 8},
+        ]
+        self.InputStream = lambda **kw: _FakeStream(self, **kw)
+        self.OutputStream = lambda **kw: _FakeStream(self, **kw)
+
+    def query_devices(self):
+        self.queries += 1
+        return self.devices
+
+
+class TestAudioDeviceManager:
+    def test_device_list_is_cached(self):
+        backend = _FakeBackend()
+        manager = AudioDeviceManager(backend)
+        manager.query_devices()
+        assert manager.find_device('cable') == 2
+        assert manager.find_device('mic', kind='input') == 0
+        assert backend.queries == 1
+        manager.query_devices(refresh=True)
+        assert backend.queries == 2
+
+    def test_streams_close_independently(self):
+        manager = AudioDeviceManager(_FakeBackend())
+        mic = manager.open_stream('mic', 'input', device=0)
+        speaker = manager.open_stream('speaker', 'output', device=1)
+        with pytest.raises(ValueError):
+            manager.open_stream('mic', 'input')
+        manager.close_stream('mic')
+        assert not mic.active and speaker.active
+        assert list(manager.get_status()) == ['speaker']
+
+    def test_fallback_to_usable_output(self):
+        manager = AudioDeviceManager(_FakeBackend(broken={None}))
+        stream = manager.open_stream('out', 'output', channels=4, fallback=True)
+        assert (stream.device, stream.channels) == (1, 2)
+        with pytest.raises(RuntimeError):
+            AudioDeviceManager(_FakeBackend(broken={None})).open_stream('out', 'output')
+
+    def test_stream_that_fails_to_start_is_closed(self):
+        backend = _FakeBackend(unstartable={None})
+        stream = AudioDeviceManager(backend).open_stream('out', 'output', fallback=True)
+        assert stream.device == 1 and not stream.closed
+        assert [s.closed for s in backend.opened] == [True, False]
+
+
+class _SlowHardware:
+    """Blocking stand-in for HardwareService"""
+
+    def __init__(self, delay=0.0, fail=()):
+        self.delay = delay
+        self.fail = set(fail)
+        self.devices = {}
+        self.calls = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def start_device(self, device):
+        self.calls.append(('start', device, threading.current_thread().name))
+        self.release.wait(5)
+        time.sleep(self.delay)
+        if device in self.fail:
+            raise RuntimeError(f'{device} unavailable')
+        self.devices[device] = {}
+
+    def stop_device(self, device):
+        self.calls.append(('stop', device, threading.current_thread().name))
+        self.devices.pop(device, None)
+
+
+class TestAsyncHardwareService:
+    def test_start_stop_emits_events_off_default_executor(self):
+        hardware = _SlowHardware(delay=0.05)
+        service = AsyncHardwareService(hardware)
+        events = []
+        service.add_listener(events.append)
+
+        async def run():
+            await service.start_device('webcam')
+            await service.stop_device('webcam')
+
+        try:
+            asyncio.run(run())
+        finally:
+            service.close()
+        assert [e['event'] for e in events] == ['starting', 'started', 'stopping', 'stopped']
+        assert all(e['type'] == 'device_event' and e['device'] == 'webcam' for e in events)
+        assert all(name.startswith('hardware') for _, _, name in hardware.calls)
+
+    def test_timeout_keeps_device_locked_until_done(self):
+        hardware = _SlowHardware()
+        hardware.release.clear()
+        service = AsyncHardwareService(hardware, timeout=0.1)
+        events = []
+        service.add_listener(events.append)
+
+        async def run():
+            with pytest.raises(asyncio.TimeoutError):
+                await service.start_device('microphone')
+            assert service.is_busy('microphone')
+            # A second toggle can't overlap the one still running
+            with pytest.raises(asyncio.TimeoutError):
+                await service.stop_device('microphone')
+            hardware.release.set()
+            await service.stop_device('microphone', timeout=5)
+
+        try:
+            asyncio.run(run())
+        finally:
+            service.close()
+        assert [e['event'] for e in events] == ['starting', 'timeout', 'started', 'stopping', 'stopped']
+        assert [c[0] for c in hardware.calls] == ['start', 'stop']
+
+    def test_errors_and_unknown_devices(self):
+        service = AsyncHardwareService(_SlowHardware(fail={'speaker'}))
+        events = []
+
+        async def listener(event):
+            events.append(event)
+
+        service.add_listener(listener)
+
+        async def run():
+            with pytest.raises(RuntimeError):
+                await service.start_device('speaker')
+            with pytest.raises(ValueError):
+                await service.start_device('printer')
+            await asyncio.sleep(0)
+
+        try:
+            asyncio.run(run())
+        finally:
+            service.close()
+        assert events[-1]['event'] == 'error'
+        assert events[-1]['message'] == 'speaker unavailable'
+
+
+class TestDeviceStateStore:
+    def test_notifies_only_on_change(self):
+        store = DeviceStateStore()
+        snapshots = []
+        store.add_listener(snapshots.append)
+
+        assert store.apply_event({'device': 'speaker', 'event': 'starting'})
+        assert store.apply_event({'device': 'speaker', 'event': 'started'})
+        assert not store.apply_event({'device': 'speaker', 'event': 'started'})
+        assert not store.apply_event({'device': 'speaker', 'event': 'timeout'})
+        assert not store.apply_event({'device': 'printer', 'event': 'started'})
+
+        assert [s['devices']['speaker']['status'] for s in snapshots] == ['starting', 'active']
+        assert snapshots[-1]['type'] == 'device_state'
+        assert snapshots[-1]['version'] == 2
+        assert snapshots[-1]['devices']['webcam']['status'] == 'inactive'
+
+    def test_error_message_and_initial_state(self):
+        hardware = _SlowHardware()
+        hardware.devices['microphone'] = {}
+        store = DeviceStateStore(hardware)
+        assert store.snapshot()['devices']['microphone']['status'] == 'active'
+        store.apply_event({'device': 'webcam', 'event': 'error', 'message': 'no camera'})
+        assert store.snapshot()['devices']['webcam'] == {
+            'type': 'webcam', 'status': 'error', 'error_message': 'no camera'
+        }
+
+    def test_hardware_status_accepts_names_and_enums(self):
+        hardware = HardwareService()
+        assert hardware.get_device_status('webcam') == 'stopped'
+        assert hardware.get_device_status(DeviceType.SPEAKER) == 'stopped'
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
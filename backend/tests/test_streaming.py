@@ -0,0 +1,992 @@
+import pytest
+import sys
+import os
+import json
+import asyncio
+import socket
+import stat
+import threading
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from streaming.media_protocol import (
+    HEADER_SIZE, MediaPacket, ProtocolError, audio_packet, video_packet
+)
+from streaming.listeners import Listener, ListenerPolicy, is_loopback, unix_listener
+from streaming.receiver_core import ReceiverCore, ReceiverPipeline
+from streaming.reconnect import Backoff
+from streaming.send_queue import AudioCoalescer, MediaSendQueue
+from streaming.server_new import StreamingServer
+from streaming.sessions import SessionStore
+from streaming.shm_bus import SharedFrameBus, SharedFrameReader
+from streaming.sinks import (
+    CallbackSink, DecodedFrame, RecorderSink, StatsSink, ThroughputSink, VirtualCameraSink,
+    read_recording
+)
+from streaming.stream_cache import StreamCache
+from streaming.ws_compression import CompressionPolicy, CompressionSettings
+from streaming.audio_stream import AudioStreamProcessor, AudioConfig
+from streaming.video_stream import VideoStreamProcessor, VideoConfig
+from utils.buffer_pool import BufferPool
+from utils.media_ring import MediaRing
+from utils.sample_ring import SampleRing
+
+
+class TestStreamCache:
+    def test_snapshot_replays_latest_keyframe(self):
+        cache = StreamCache()
+        cache.update_video('phone', 'frame-1')
+        cache.update_video('phone', 'frame-2')
+        assert cache.snapshot() == ['frame-2']
+
+    def test_delta_frames_follow_keyframe(self):
+        cache = StreamCache()
+        cache.update_video('phone', 'delta-0', keyframe=False)
+        cache.update_video('phone', 'key', keyframe=True)
+        cache.update_video('phone', 'delta-1', keyframe=False)
+        cache.update_video('phone', 'delta-2', keyframe=False)
+        assert cache.snapshot() == ['key', 'delta-1', 'delta-2']
+
+    def test_stale_gop_is_dropped(self):
+        cache = StreamCache(max_dependents=2)
+        cache.update_video('phone', 'key')
+        for i in range(3):
+            cache.update_video('phone', f'delta-{i}', keyframe=False)
+        assert cache.snapshot() == []
+
+    def test_audio_format_comes_first(self):
+        cache = StreamCache()
+        cache.update_video('phone', 'key')
+        assert cache.update_audio_format('phone', 48000, 1)
+        assert not cache.update_audio_format('phone', 48000, 1)
+        messages = cache.snapshot()
+        audio_format = json.loads(messages[0])
+        assert audio_format['type'] == 'audio_format'
+        assert audio_format['sampleRate'] == 48000
+        assert messages[1] == 'key'
+
+    def test_exclude_and_drop(self):
+        cache = StreamCache()
+        cache.update_video('phone', 'a')
+        cache.update_video('tablet', 'b')
+        assert cache.snapshot(exclude='phone') == ['b']
+        cache.drop('tablet')
+        assert cache.snapshot(exclude='phone') == []
+
+
+class TestMediaProtocol:
+    def test_video_round_trip(self):
+        packet = video_packet(b'\xff\xd8jpeg', timestamp=1234.5)
+        wire = packet.to_bytes()
+        assert len(wire) == HEADER_SIZE + 6
+        parsed = MediaPacket.parse(wire)
+        assert parsed.is_video and parsed.keyframe
+        assert parsed.timestamp == 1234.5
+        assert bytes(parsed.payload) == b'\xff\xd8jpeg'
+        # Relaying the original message must not re-encode it
+        assert parsed.to_bytes() is wire
+
+    def test_audio_round_trip(self):
+        samples = np.linspace(-1, 1, 64, dtype=np.float32)
+        parsed = MediaPacket.parse(audio_packet(samples, 48000).to_bytes())
+        assert parsed.is_audio
+        assert (parsed.sample_rate, parsed.channels) == (48000, 1)
+        np.testing.assert_array_equal(parsed.samples(), samples)
+
+    def test_legacy_json_converts_both_ways(self):
+        samples = [0.0, 0.5, -0.5]
+        data = {'type': 'audio', 'data': samples, 'sampleRate': 16000, 'timestamp': 10}
+        text = json.dumps(data)
+        packet = MediaPacket.from_json(data, text=text)
+        assert packet.to_json_text() is text
+        parsed = MediaPacket.parse(packet.to_bytes())
+        np.testing.assert_array_equal(parsed.samples(), np.float32(samples))
+
+        video = MediaPacket.parse(video_packet(b'abc').to_bytes())
+        assert json.loads(video.to_json_text())['data'] == 'YWJj'
+
+    def test_malformed_messages(self):
+        with pytest.raises(ProtocolError):
+            MediaPacket.parse(b'short')
+        wire = bytearray(video_packet(b'x').to_bytes())
+        wire[0] = 99
+        with pytest.raises(ProtocolError):
+            MediaPacket.parse(bytes(wire))
+        with pytest.raises(ProtocolError):
+            MediaPacket.from_json({'type': 'hello'})
+
+
+@pytest.fixture
+def frame_bus():
+    bus = SharedFrameBus(f'nodeflow-test-{os.getpid()}', slot_count=4, slot_size=256)
+    yield bus
+    bus.close()
+
+
+class TestSharedFrameBus:
+    def test_reader_gets_new_packets_in_order(self, frame_bus):
+        frame_bus.publish(video_packet(b'old'))
+        reader = SharedFrameReader(frame_bus.name)
+        try:
+            assert not reader.wait(timeout=0)
+            frame_bus.publish(video_packet(b'\xff\xd8jpeg'))
+            frame_bus.publish(audio_packet(np.ones(4, np.float32), 16000))
+            assert reader.wait(timeout=1)
+            first, second = reader.read()
+            assert bytes(first.payload) == b'\xff\xd8jpeg'
+            assert second.sample_rate == 16000
+            np.testing.assert_array_equal(second.samples(), np.ones(4))
+            assert reader.read() == []
+            assert frame_bus.get_stats()['subscribers'] == 1
+        finally:
+            reader.close()
+
+    def test_slow_reader_drops_overwritten_packets(self, frame_bus):
+        reader = SharedFrameReader(frame_bus.name, notify=False)
+        try:
+            for i in range(10):
+                frame_bus.publish(video_packet(bytes([i])))
+            payloads = reader.read(lambda packet: bytes(packet.payload))
+            assert payloads == [bytes([7]), bytes([8]), bytes([9])]
+            assert reader.dropped == 7
+            assert not frame_bus.publish(video_packet(bytes(300)))
+        finally:
+            reader.close()
+
+    def test_torn_read_is_discarded(self, frame_bus):
+        reader = SharedFrameReader(frame_bus.name, notify=False)
+        try:
+            frame_bus.publish(video_packet(b'a'))
+
+            def consume(packet):
+                # The writer laps the ring while this slot is in use
+                for _ in range(frame_bus.slot_count):
+                    frame_bus.publish(video_packet(b'b'))
+                return bytes(packet.payload)
+
+            assert reader.read(consume) == []
+            assert reader.dropped == 1
+        finally:
+            reader.close()
+
+
+class _AllowAll:
+    """Security manager that grants everything without touching ~/.nodeflow"""
+
+    def check_permission(self, device_type):
+        return True
+
+    def validate_command(self, command, device_type):
+        return True
+
+
+class TestInProcessSubscribers:
+    def test_callbacks_share_relayed_packets(self):
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        keyframe = video_packet(b'key')
+
+        async def run():
+            await server._relay_packet(keyframe, 'phone')
+            received = []
+            token = server.subscribe(received.append)
+            # Cached keyframe first, then live packets as the same objects
+            assert received == [keyframe]
+            audio = audio_packet(np.zeros(4, np.float32), 16000)
+            await server._relay_packet(audio, 'phone')
+            assert received[-1] is audio
+            server.unsubscribe(token)
+            await server._relay_packet(audio, 'phone')
+            assert len(received) == 2
+
+        asyncio.run(run())
+        server.devices.close()
+
+    def test_subscribe_off_loop_replays_on_the_loop(self):
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        server.loop = asyncio.new_event_loop()
+        loop_thread = threading.Thread(target=server.loop.run_forever, daemon=True)
+        loop_thread.start()
+
+        def relay(payload):
+            packet = video_packet(payload)
+            asyncio.run_coroutine_threadsafe(server._relay_packet(packet, 'phone'), server.loop).result(5)
+
+        try:
+            relay(b'key')
+            received = []
+            token = server.subscribe(
+                lambda packet: received.append((bytes(packet.payload), threading.current_thread() is loop_thread))
+            )
+            relay(b'live')
+            assert received == [(b'key', True), (b'live', True)]
+
+            # Unsubscribed before the loop got to attach it: never called
+            blocked, release = threading.Event(), threading.Event()
+            server.loop.call_soon_threadsafe(lambda: (blocked.set(), release.wait(5)))
+            assert blocked.wait(5)
+            late = []
+            server.unsubscribe(server.subscribe(late.append))
+            release.set()
+            server.unsubscribe(token)
+            relay(b'after')
+            assert late == []
+            assert len(received) == 2
+            assert server._subscribers == ()
+        finally:
+            server.loop.call_soon_threadsafe(server.loop.stop)
+            loop_thread.join(5)
+            server.loop.close()
+            server.devices.close()
+
+    def test_frames_iterator(self):
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+
+        async def run():
+            frames = server.frames(max_video=1)
+            for i in range(3):
+                await server._relay_packet(video_packet(bytes([i])), 'phone')
+            await server._relay_packet(audio_packet(np.zeros(2, np.float32), 8000), 'phone')
+            frames.close()
+            kinds = [packet.type_name async for packet in frames]
+            assert kinds == ['audio', 'video']
+            assert frames.dropped_video == 2
+            assert server._subscribers == ()
+
+        asyncio.run(run())
+        server.devices.close()
+
+
+    def test_malformed_legacy_frame_dropped_at_sender(self):
+        pytest.importorskip('aiohttp')
+        import aiohttp
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        port = _free_port()
+
+        async def run():
+            task = asyncio.ensure_future(
+                server.run(listeners=[Listener('lan', host='127.0.0.1', port=port)])
+            )
+            try:
+                while not server.listeners:
+                    await asyncio.sleep(0.01)
+                url = f'ws://127.0.0.1:{port}/ws'
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url) as receiver, session.ws_connect(url) as sender:
+                        await receiver.send_json({'type': 'hello', 'client': 'test', 'binary': True})
+                        while True:
+                            if (await receiver.receive_json()).get('type') == 'connection':
+                                break
+                        await sender.send_json({'type': 'video', 'data': 'not base64!'})
+                        await sender.send_json({'type': 'video', 'data': 'anBlZw==', 'timestamp': 'x'})
+                        await sender.send_json({'type': 'video', 'data': 'anBlZw==', 'timestamp': 1.0})
+                        while True:
+                            msg = await asyncio.wait_for(receiver.receive(), 5)
+                            if msg.type == aiohttp.WSMsgType.BINARY:
+                                break
+                        assert bytes(MediaPacket.parse(msg.data).payload) == b'jpeg'
+                        assert len(server.connected_clients) == 2 and not sender.closed
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(run())
+        server.devices.close()
+
+
+    def test_sender_stats_keep_known_numeric_fields(self):
+        stats = StreamingServer._sender_stats({
+            'type': 'sender_stats', 'maxBufferedAmount': 'lots', 'bufferedAmount': 12.7,
+            'framesSent': '30', 'avgCaptureLatencyMs': None, 'reconnects': float('inf'),
+            'skippedVideoFrames': True, 'extra': {'a': 1},
+        })
+        assert stats == {'bufferedAmount': 12, 'framesSent': 30}
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class TestListeners:
+    def test_is_loopback(self):
+        assert is_loopback('127.0.0.1')
+        assert is_loopback('::1')
+        assert is_loopback('::ffff:127.0.0.1')
+        assert not is_loopback('192.168.1.20')
+
+    def test_policies_apply_per_listener(self, tmp_path):
+        aiohttp = pytest.importorskip('aiohttp')
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        open_port, viewer_port = _free_port(), _free_port()
+        listeners = [
+            Listener('lan', host='127.0.0.1', port=open_port),
+            Listener('viewer', host='127.0.0.1', port=viewer_port,
+                     policy=ListenerPolicy(device_control=False, loopback_only=True)),
+        ]
+        if hasattr(socket, 'AF_UNIX'):
+            listeners.append(unix_listener(str(tmp_path / 'nf.sock')))
+
+        async def run():
+            task = asyncio.ensure_future(server.run(listeners=listeners))
+            try:
+                for _ in range(100):
+                    if len(server.listeners) == len(listeners):
+                        break
+                    await asyncio.sleep(0.01)
+                async with aiohttp.ClientSession() as session:
+                    url = f'http://127.0.0.1:{viewer_port}/api/device/printer'
+                    async with session.post(url, json={'command': 'start'}) as resp:
+                        assert resp.status == 403
+                        assert 'not allowed' in (await resp.json())['message']
+                    url = f'http://127.0.0.1:{open_port}/api/device/webcam'
+                    async with session.post(url, json={}) as resp:
+                        assert resp.status == 400
+                if len(listeners) == 3:
+                    path = listeners[2].path
+                    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+                    connector = aiohttp.UnixConnector(path=path)
+                    async with aiohttp.ClientSession(connector=connector) as session:
+                        async with session.post('http://localhost/api/device/webcam', json={}) as resp:
+                            assert resp.status == 400
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(run())
+        server.devices.close()
+        assert not os.path.exists(tmp_path / 'nf.sock')
+
+    def test_background_tasks_cancelled_on_shutdown(self):
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        listeners = [Listener('lan', host='127.0.0.1', port=_free_port())]
+
+        async def run():
+            task = asyncio.ensure_future(server.run(listeners=listeners))
+            for _ in range(100):
+                if server.listeners:
+                    break
+                await asyncio.sleep(0.01)
+            done = server._spawn(asyncio.sleep(0))
+            pending = server._spawn(asyncio.sleep(60))
+            await done
+            await asyncio.sleep(0)
+            assert server._tasks == {pending}
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert pending.cancelled() and not server._tasks
+
+        asyncio.run(run())
+        server.devices.close()
+
+
+class TestCompressionPolicy:
+    def test_control_deflated_media_not(self):
+        aiohttp = pytest.importorskip('aiohttp')
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        port = _free_port()
+        listeners = [Listener('lan', host='127.0.0.1', port=port)]
+        # Random bytes stand in for a JPEG: deflate can't shrink them
+        payload = np.random.default_rng(0).integers(0, 256, 20000, dtype=np.uint8).tobytes()
+
+        async def run():
+            task = asyncio.ensure_future(server.run(listeners=listeners))
+            try:
+                for _ in range(100):
+                    if server.listeners:
+                        break
+                    await asyncio.sleep(0.01)
+                url = f'http://127.0.0.1:{port}/ws'
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, compress=15) as receiver, \
+                            session.ws_connect(url + '?compress=0', compress=15) as sender:
+                        assert receiver.compress and not sender.compress
+                        await receiver.receive_json()
+                        await receiver.send_json({'type': 'hello', 'binary': True})
+                        assert (await receiver.receive_json())['status'] == 'ready'
+                        assert (await receiver.receive_json())['type'] == 'device_state'
+
+                        await sender.send_bytes(video_packet(payload).to_bytes())
+                        msg = await receiver.receive(timeout=5)
+                        assert MediaPacket.parse(msg.data).payload == payload
+
+                    async with session.get(f'http://127.0.0.1:{port}/api/stats') as resp:
+                        stats = (await resp.json())['compression']
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+            return stats
+
+        stats = asyncio.run(run())
+        server.devices.close()
+        assert stats['control']['compressed_messages'] >= 1
+        assert stats['control']['deflate_ratio'] < 0.9
+        assert stats['media']['messages'] == 1
+        assert stats['media']['compressed_messages'] == 0
+        assert stats['media']['deflate_ratio'] > 0.99
+
+
+    def test_sample_every_message(self):
+        class Socket:
+            compress = 15
+
+            async def send_str(self, data, compress=None):
+                pass
+
+        policy = CompressionPolicy(CompressionSettings(sample_every=1))
+
+        async def run():
+            for _ in range(3):
+                await policy.send_control(Socket(), {'type': 'status', 'detail': 'x' * 200})
+
+        asyncio.run(run())
+        stats = policy._stats['control']
+        assert stats.messages == 3 and stats.compressed_messages == 3
+        assert stats.sampled_bytes == stats.bytes
+        assert policy.get_stats()['control']['deflate_cpu_ms'] >= 0.0
+
+
+class TestReconnect:
+    def test_backoff_grows_caps_and_jitters(self):
+        import random
+        backoff = Backoff(initial=0.5, maximum=4.0, rng=random.Random(1))
+        ceilings = []
+        for _ in range(6):
+            ceilings.append(backoff.ceiling())
+            assert 0 <= backoff.next_delay() <= ceilings[-1]
+        assert ceilings == [0.5, 1.0, 2.0, 4.0, 4.0, 4.0]
+        backoff.reset()
+        assert backoff.ceiling() == 0.5
+        # Clients retrying after the same outage spread out
+        delays = {round(Backoff(rng=random.Random(seed)).next_delay(), 6) for seed in range(20)}
+        assert len(delays) == 20
+
+    def test_sessions_resume_and_expire(self):
+        store = SessionStore(ttl=60)
+        token, options, resumed = store.open({'type': 'hello', 'binary': True, 'client': 'desktop'})
+        assert not resumed and options == {'binary': True, 'client': 'desktop'}
+        store.release(token)
+        again, options, resumed = store.open({'type': 'hello', 'session': token})
+        assert resumed and again == token and options['binary']
+        _, _, resumed = store.open({'type': 'hello', 'session': 'unknown'})
+        assert not resumed
+
+        store.ttl = 0
+        store.release(token)
+        store.open({'type': 'hello'})
+        assert store.get_stats()['expired'] == 1
+        assert not store.open({'type': 'hello', 'session': token})[2]
+
+    def test_client_reconnects_and_resumes_session(self):
+        pytest.importorskip('aiohttp')
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        port = _free_port()
+
+        async def wait_until(condition):
+            for _ in range(500):
+                if condition():
+                    return
+                await asyncio.sleep(0.01)
+            raise AssertionError('condition not reached')
+
+        async def run():
+            task = asyncio.ensure_future(
+                server.run(listeners=[Listener('lan', host='127.0.0.1', port=port)])
+            )
+            client = ReceiverCore(
+                f'ws://127.0.0.1:{port}/ws', ReceiverPipeline(), client='test',
+                backoff=Backoff(initial=0.05, maximum=0.2)
+            )
+            receiving = None
+            try:
+                await wait_until(lambda: server.listeners)
+                receiving = asyncio.ensure_future(client.run())
+                await wait_until(lambda: client.session and server.binary_clients)
+                session = client.session
+
+                # Drop the connection from the server side
+                for ws in list(server.connected_clients):
+                    await ws.close()
+                await wait_until(lambda: client.resumed == 1 and server.binary_clients)
+                assert client.session == session
+            finally:
+                client.stop()
+                if receiving is not None:
+                    await asyncio.wait_for(receiving, 5)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+            return client.get_stats()
+
+        stats = asyncio.run(run())
+        server.devices.close()
+        assert stats['connects'] == 2 and stats['reconnects'] == 1
+        assert stats['resumed'] == 1 and not stats['connected']
+        assert server.sessions.get_stats()['resumed'] == 1
+
+
+class TestReceiverPipeline:
+    def _jpeg(self, width=32, height=24):
+        ok, data = cv2.imencode('.jpg', np.full((height, width, 3), 128, np.uint8))
+        return data.tobytes()
+
+    def test_frame_decoded_once_for_all_sinks(self):
+        images = []
+        sinks = [CallbackSink(video=lambda f: images.append(f.image())) for _ in range(2)]
+        pipeline = ReceiverPipeline(sinks + [StatsSink()])
+        pipeline.dispatch(video_packet(self._jpeg()))
+        assert images[0] is images[1] and images[0].shape == (24, 32, 3)
+        stats = pipeline.get_stats()
+        assert stats['decoded'] == 1 and stats['stats']['video_frames'] == 1
+
+    def test_frame_decoded_in_place_from_shared_memory(self):
+        bus = SharedFrameBus(f'nodeflow-decode-{os.getpid()}', slot_count=4, slot_size=4096)
+        reader = SharedFrameReader(bus.name, notify=False)
+        try:
+            jpeg = self._jpeg()
+            bus.publish(video_packet(jpeg, timestamp=5))
+            frame, = reader.read(DecodedFrame.decode_now)
+        finally:
+            reader.close()
+            bus.close()
+        # Nothing left pointing into the closed block
+        assert bytes(frame.jpeg) == b'' and frame.packet.timestamp == 5
+        stats = StatsSink()
+        pipeline = ReceiverPipeline([stats], inline=True)
+        pipeline.submit(frame)
+        assert frame.image().shape == (24, 32, 3)
+        assert stats.video_frames == 1 and stats.bytes_received == len(jpeg)
+
+    def test_drops_oldest_video_and_sends_audio_first(self):
+        received = []
+        done = threading.Event()
+
+        def on_video(frame):
+            received.append(frame.packet.timestamp)
+            if len(received) == 3:
+                done.set()
+
+        pipeline = ReceiverPipeline(
+            [CallbackSink(video=on_video, audio=lambda p: received.append('audio'))], max_video=2
+        )
+        for i in range(4):
+            pipeline.submit(video_packet(b'x', timestamp=i))
+        pipeline.submit(audio_packet(np.zeros(4, np.float32), 16000))
+        pipeline.start()
+        assert done.wait(5)
+        pipeline.stop()
+        assert received == ['audio', 2, 3]
+        assert pipeline.get_stats()['dropped_video'] == 2
+
+    def test_virtual_camera_resizes(self):
+        sent = []
+        pipeline = ReceiverPipeline([VirtualCameraSink(lambda f: sent.append(f.copy()), 16, 12)])
+        pipeline.dispatch(video_packet(self._jpeg()))
+        assert sent[0].shape == (12, 16, 3)
+
+    def test_recording_round_trip(self, tmp_path):
+        path = str(tmp_path / 'session.nfr')
+        recorder = RecorderSink(path)
+        pipeline = ReceiverPipeline([recorder])
+        pipeline.dispatch(video_packet(b'jpeg', timestamp=1.5))
+        pipeline.dispatch(audio_packet(np.arange(4, dtype=np.float32), 48000))
+        pipeline.stop()
+        packets = list(read_recording(path))
+        assert bytes(packets[0].payload) == b'jpeg' and packets[0].timestamp == 1.5
+        assert packets[1].sample_rate == 48000
+        assert packets[1].samples().tolist() == [0, 1, 2, 3]
+        # Recording added no decode
+        assert pipeline.get_stats()['decoded'] == 0
+
+    def test_throughput_counts_gaps_without_decoding(self):
+        throughput = ThroughputSink()
+        pipeline = ReceiverPipeline([throughput], inline=True)
+        now = time.time() * 1000
+        for ts in (0, 33, 66, 99, 231):
+            pipeline.submit(video_packet(b'not a jpeg', timestamp=now - 500 + ts))
+        stats = throughput.get_stats()
+        assert stats['video_frames'] == 5 and stats['video_gaps'] == 1
+        assert stats['decode_errors'] == 0 and pipeline.get_stats()['decoded'] == 0
+        assert 250 < stats['latency_p50_ms'] < 1000
+
+    def test_throughput_decodes_off_the_caller(self):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(1) as decoder:
+            throughput = ThroughputSink(decoder=decoder, max_decodes=1)
+            release = threading.Event()
+            decoder.submit(release.wait)  # Keep the decoder busy
+            pipeline = ReceiverPipeline([throughput], inline=True)
+            pipeline.submit(video_packet(TestReceiverPipeline._jpeg(None)))
+            pipeline.submit(video_packet(b'not a jpeg'))
+            release.set()
+        stats = throughput.get_stats()
+        assert stats['decoded'] == 1 and stats['decode_skipped'] == 1
+
+
+class TestReceiverCore:
+    def test_bad_control_messages_do_not_end_the_receiver(self):
+        def on_control(data):
+            raise RuntimeError('frontend bug')
+
+        core = ReceiverCore('ws://127.0.0.1:1/ws', ReceiverPipeline(), on_control=on_control)
+        core._on_text('[1, 2]')
+        core._on_text('"text"')
+        core._on_text(json.dumps({'type': 'connection', 'session': 'abc', 'resumed': True}))
+        assert core.session == 'abc' and core.resumed == 1
+
+
+class TestLoadTest:
+    def test_receivers_report_per_connection(self, tmp_path):
+        pytest.importorskip('aiohttp')
+        from receiver_loadtest import LoadTest, write_report
+
+        server = StreamingServer(security_manager=_AllowAll(), shared_frames=False)
+        port = _free_port()
+        test = LoadTest(f'ws://127.0.0.1:{port}/ws', connections=3, duration=30,
+                        decode=False, record_dir=str(tmp_path / 'recordings'))
+
+        async def run():
+            task = asyncio.ensure_future(
+                server.run(listeners=[Listener('lan', host='127.0.0.1', port=port)])
+            )
+            try:
+                for _ in range(500):
+                    if server.listeners:
+                        break
+                    await asyncio.sleep(0.01)
+                loadtest = asyncio.ensure_future(test.run())
+                for _ in range(500):
+                    if len(server.binary_clients) == 3:
+                        break
+                    await asyncio.sleep(0.01)
+                for i in range(5):
+                    await server._relay_packet(video_packet(b'jpeg'), 'phone')
+                await asyncio.sleep(0.2)
+                test.stop()
+                return await asyncio.wait_for(loadtest, 10)
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+        report = asyncio.run(run())
+        server.devices.close()
+        assert [row['video_frames'] for row in report['receivers']] == [5, 5, 5]
+        assert report['totals']['bytes_received'] == 15 * 4
+        assert report['server']['sessions']['created'] == 3
+        assert len(list(read_recording(str(tmp_path / 'recordings' / 'connection-0.nfr')))) == 5
+
+        path = str(tmp_path / 'report.csv')
+        write_report(report, path)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        assert lines[0].startswith('connection,video_frames') and len(lines) == 4
+
+
+class TestMediaSendQueue:
+    def test_audio_first_and_video_drops_oldest(self):
+        async def run():
+            queue = MediaSendQueue(max_video=2)
+            for i in range(4):
+                queue.put(video_packet(bytes([i]), timestamp=i))
+            queue.put(audio_packet(np.zeros(4, np.float32), 16000))
+            sent = []
+
+            async def send(data):
+                sent.append(MediaPacket.parse(data))
+                if len(sent) == 3:
+                    queue.close()
+
+            await asyncio.wait_for(queue.run(send), timeout=5)
+            assert sent[0].is_audio
+            assert [bytes(p.payload) for p in sent[1:]] == [b'\x02', b'\x03']
+            assert queue.get_stats()['dropped_video'] == 2
+        asyncio.run(run())
+
+    def test_put_threadsafe_wakes_sender(self):
+        async def run():
+            queue = MediaSendQueue()
+            assert not queue.put_threadsafe(video_packet(b'early'))
+            sent = []
+
+            async def send(data):
+                sent.append(data)
+                queue.close()
+
+            task = asyncio.ensure_future(queue.run(send))
+            await asyncio.sleep(0)
+            thread = threading.Thread(target=queue.put_threadsafe, args=(video_packet(b'x'),))
+            thread.start()
+            thread.join()
+            await asyncio.wait_for(task, timeout=5)
+            assert len(sent) == 1
+        asyncio.run(run())
+
+
+class TestAudioCoalescer:
+    def test_batches_and_converts(self):
+        coalescer = AudioCoalescer(min_frames=4)
+        block = np.array([0, 16384], dtype=np.int16).tobytes()
+        assert coalescer.push(block) is None
+        samples = coalescer.push(block)
+        assert samples.dtype == np.float32
+        np.testing.assert_allclose(samples, [0, 0.5, 0, 0.5])
+        assert coalescer.flush() is None
+
+
+class TestBufferPool:
+    def test_released_array_is_reused(self):
+        pool = BufferPool()
+        first = pool.acquire((4, 4, 3))
+        pool.release(first)
+        second = pool.acquire((4, 4, 3))
+        assert second is first
+        assert pool.get_stats()['hits'] == 1
+
+    def test_shape_and_dtype_are_keys(self):
+        pool = BufferPool()
+        array = pool.acquire((4, 4, 3))
+        pool.release(array)
+        assert pool.acquire((4, 4, 3), np.float32) is not array
+        assert pool.acquire((2, 4, 3)) is not array
+
+    def test_views_are_not_pooled(self):
+        pool = BufferPool()
+        base = np.zeros((4, 4, 3), dtype=np.uint8)
+        pool.release(base[:2])
+        assert pool.get_stats()['pooled'] == 0
+
+    def test_pool_is_bounded(self):
+        pool = BufferPool(max_per_key=2)
+        for _ in range(5):
+            pool.release_bytes(bytearray(16))
+        assert pool.get_stats()['pooled'] == 2
+        assert len(pool.acquire_bytes(16)) == 16
+
+
+class TestMediaRing:
+    def test_overwrites_oldest_without_blocking(self):
+        dropped = []
+        ring = MediaRing(2, on_drop=dropped.append)
+        assert ring.put(1)
+        assert ring.put(2)
+        assert not ring.put(3)
+        assert dropped == [1]
+        assert ring.get_nowait() == 2
+        assert ring.get_stats()['dropped'] == 1
+
+    def test_get_waits_for_producer(self):
+        ring = MediaRing(4)
+        threading.Timer(0.05, ring.put, args=('frame',)).start()
+        assert ring.get(timeout=2) == 'frame'
+        assert ring.get(timeout=0.01) is None
+
+    def test_get_latest_discards_older(self):
+        ring = MediaRing(4)
+        for i in range(3):
+            ring.put(i)
+        assert ring.get_latest() == 2
+        assert ring.empty()
+        assert ring.dropped == 2
+
+    def test_wait_for_new(self):
+        ring = MediaRing(4)
+        ring.put('a')
+        seq, item = ring.wait_for_new(0, timeout=0.1)
+        assert (seq, item) == (1, 'a')
+        assert ring.wait_for_new(seq, timeout=0.01) == (seq, None)
+        threading.Timer(0.05, ring.put, args=('b',)).start()
+        assert ring.wait_for_new(seq, timeout=2) == (2, 'b')
+
+    def test_close_wakes_waiters(self):
+        ring = MediaRing(1)
+        threading.Timer(0.05, ring.close).start()
+        assert ring.get(timeout=2) is None
+
+
+class TestSampleRing:
+    def test_read_wraps_around(self):
+        ring = SampleRing(8)
+        out = np.empty((5, 1), dtype=np.float32)
+        ring.write(np.arange(6, dtype=np.float32))
+        assert ring.read_into(out) == 5
+        ring.write(np.arange(6, 12, dtype=np.float32))
+        assert ring.read_into(out) == 5
+        assert out[:, 0].tolist() == [5, 6, 7, 8, 9]
+
+    def test_underrun_zero_fills_and_counts_once(self):
+        ring = SampleRing(8)
+        out = np.ones((4, 1), dtype=np.float32)
+        ring.write(np.ones(2, dtype=np.float32))
+        assert ring.read_into(out) == 2
+        assert out[2:, 0].tolist() == [0, 0]
+        ring.read_into(out)
+        assert ring.underruns == 1
+
+    def test_overrun_keeps_newest(self):
+        ring = SampleRing(4)
+        ring.write(np.arange(6, dtype=np.float32))
+        out = np.empty((4, 1), dtype=np.float32)
+        ring.read_into(out)
+        assert out[:, 0].tolist() == [2, 3, 4, 5]
+        assert ring.get_stats()['overrun_frames'] == 2
+
+    def test_interleaved_channels(self):
+        ring = SampleRing(4, channels=2)
+        ring.write(np.array([1, 2, 3, 4], dtype=np.float32))
+        out = np.empty((2, 2), dtype=np.float32)
+        assert ring.read_into(out) == 2
+        assert out.tolist() == [[1, 2], [3, 4]]
+
+
+class TestAudioStreamProcessor:
+    def test_callback_waits_for_prefill(self):
+        config = AudioConfig(sample_rate=1000, chunk_size=10, target_latency=0.02)
+        processor = AudioStreamProcessor(config)
+        outdata = np.ones((10, 1), dtype=np.float32)
+
+        asyncio.run(processor.process_audio(np.full(10, 0.5, np.float32).tobytes()))
+        processor._callback(outdata, 10, None, None)
+        assert not outdata.any()
+
+        asyncio.run(processor.process_audio(np.full(20, 0.5, np.float32).tobytes()))
+        processor._callback(outdata, 10, None, None)
+        assert np.allclose(outdata, 0.5)
+        assert processor.get_stats()['buffered'] == 20
+
+    def test_callback_fits_ring_to_fallback_device(self):
+        config = AudioConfig(channels=2, sample_rate=1000, chunk_size=10, target_latency=0)
+        processor = AudioStreamProcessor(config)
+        stereo = np.tile(np.array([0.25, 0.75], np.float32), 10)
+        asyncio.run(processor.process_audio(stereo.tobytes()))
+        # Mono device opened as a fallback; the callback may run before
+        # start_playback() returns
+        outdata = np.ones((10, 1), dtype=np.float32)
+        processor._callback(outdata, 10, None, None)
+        assert np.allclose(outdata, 0.25)
+
+
+def _jpeg(width=320, height=240):
+    frame = np.full((height, width, 3), 128, dtype=np.uint8)
+    return cv2.imencode('.jpg', frame)[1].tobytes()
+
+
+class TestVideoStreamProcessor:
+    def test_process_frame_resizes_off_loop(self):
+        async def run():
+            processor = VideoStreamProcessor(VideoConfig(width=160, height=120))
+            try:
+                ok, error = await processor.process_frame(_jpeg())
+                assert ok and error is None
+                assert processor.get_latest_frame().shape == (120, 160, 3)
+            finally:
+                processor.close()
+        asyncio.run(run())
+
+    def test_invalid_frame(self):
+        async def run():
+            processor = VideoStreamProcessor()
+            try:
+                ok, error = await processor.process_frame(b'not a jpeg')
+                assert not ok
+            finally:
+                processor.close()
+        asyncio.run(run())
+
+    def test_submit_drops_oldest_pending(self):
+        async def run():
+            config = VideoConfig(width=160, height=120, max_in_flight=1, max_pending=1)
+            processor = VideoStreamProcessor(config)
+            try:
+                accepted = [processor.submit(_jpeg()) for _ in range(4)]
+                assert accepted[0] and not all(accepted)
+                frames = processor.frames()
+                frame = await asyncio.wait_for(frames.__anext__(), timeout=5)
+                assert frame.shape == (120, 160, 3)
+                assert processor.get_stats()['dropped'] >= 1
+            finally:
+                processor.close()
+        asyncio.run(run())
+
+    def test_publishes_in_order_and_returns_newest(self):
+        async def run():
+            processor = VideoStreamProcessor(VideoConfig(width=4, height=4))
+            try:
+                frames = [np.full((4, 4, 3), i, np.uint8) for i in range(3)]
+                assert processor._publish(frames[0], 1)
+                assert processor._publish(frames[2], 3)
+                # Decoded after a newer frame: dropped, never published
+                assert not processor._publish(frames[1], 2)
+                assert processor.get_latest_frame() is frames[2]
+                assert processor.get_latest_frame() is frames[2]
+                assert processor.get_stats()['dropped'] == 2
+            finally:
+                processor.close()
+        asyncio.run(run())
+
+    def test_legacy_server_decodes_only_for_a_consumer(self):
+        from streaming.server import StreamingServer as LegacyServer
+        assert LegacyServer().video_processor is None
+
+        async def run():
+            received = []
+            server = LegacyServer(VideoConfig(width=160, height=120), on_video_frame=received.append)
+            await server._on_startup(server.app)
+            viewer, sender = object(), object()
+            server.publishers['video'].add(sender)
+            server.video_processor.submit(_jpeg())
+            for _ in range(500):
+                if received:
+                    break
+                await asyncio.sleep(0.01)
+            assert received[0].shape == (120, 160, 3)
+            server.video_processor.submit(_jpeg())
+            # A viewer leaving leaves the sender's frames alone
+            server.release_client(viewer)
+            assert server.video_processor._pending or server.video_processor._in_flight
+            await server._on_cleanup(server.app)
+            assert server.video_processor.stopped.is_set()
+        asyncio.run(run())
+
+
+    def test_legacy_server_survives_malformed_frames(self):
+        pytest.importorskip('aiohttp')
+        import aiohttp
+        from streaming.server import StreamingServer as LegacyServer
+        server = LegacyServer(on_video_frame=lambda frame: None)
+        port = _free_port()
+
+        async def run():
+            task = asyncio.ensure_future(server.run(host='127.0.0.1', port=port))
+            try:
+                async with aiohttp.ClientSession() as session:
+                    for _ in range(500):
+                        try:
+                            ws = await session.ws_connect(f'ws://127.0.0.1:{port}/ws')
+                            break
+                        except aiohttp.ClientError:
+                            await asyncio.sleep(0.01)
+                    assert (await ws.receive_json())['type'] == 'connection'
+                    await ws.send_json({'type': 'video', 'data': 'not base64!'})
+                    await ws.send_json({'type': 'audio', 'data': 'not base64!'})
+                    await ws.send_json({'type': 'audio', 'data': ['x', 'y']})
+                    await ws.send_json({'type': 'test'})
+                    reply = await asyncio.wait_for(ws.receive_json(), 5)
+                    assert reply['type'] == 'test_response'
+                    await ws.close()
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+        asyncio.run(run())
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -7,7 +7,6 @@ This script is intended to be the PyInstaller entrypoint for the single `NodeFlo
 import threading
 import asyncio
 import logging
-import ssl
 import sys
 import time
 from pathlib import Path
@@ -25,6 +24,14 @@ except Exception:
     except Exception:
         StreamingServer = None
 
+try:
+    from backend.src.utils import tls
+except Exception:
+    try:
+        from utils import tls
+    except Exception:
+        tls = None
+
 try:
     from backend.src.receiver_gui import main as gui_main
 except Exception:
@@ -34,14 +41,8 @@ except Exception:
         gui_main = None
 
 
-def start_server(loop, host='0.0.0.0', port=5000, ssl_context=None):
+def start_server(loop, server, host='0.0.0.0', port=5000, ssl_context=None):
     """Run the asyncio server in the provided event loop."""
-    if StreamingServer is None:
-        logging.error('StreamingServer not available; server will not start')
-        return
-
-    server = StreamingServer()
-
     async def runner():
         try:
             await server.run(host=host, port=port, ssl_context=ssl_context)
@@ -53,42 +54,40 @@ def start_server(loop, host='0.0.0.0', port=5000, ssl_context=None):
 
 
 def create_ssl_context():
-    cert_file = Path(__file__).parent / 'backend' / 'src' / 'server.crt'
-    key_file = Path(__file__).parent / 'backend' / 'src' / 'server.key'
-    if cert_file.exists() and key_file.exists():
-        try:
-            ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-            ctx.load_cert_chain(str(cert_file), str(key_file))
-            ctx.check_hostname = False
-            ctx.verify_mode = ssl.CERT_NONE
-            logging.info('SSL context prepared')
-            return ctx
-        except Exception as e:
-            logging.warning(f'Unable to create SSL context: {e}')
-    return None
+    """Shared server context; the certificate is generated if missing"""
+    if tls is None:
+        return None
+    return tls.get_server_context()
 
 
 def run():
     logging.basicConfig(level=logging.INFO)
     logging.info('NodeFlow bundle starting')
 
-    ssl_ctx = create_ssl_context()
+    # Certificate work overlaps building the server below
+    if tls is not None:
+        tls.prepare()
+
+    # The GUI subscribes to this server object directly, so the bundled
+    # receiver needs neither a socket nor the shared-memory bus
+    server = None
+    if StreamingServer is None:
+        logging.error('StreamingServer not available; server will not start')
+    else:
+        server = StreamingServer(shared_frames=False)
+        ssl_ctx = create_ssl_context()
 
-    # Create a new event loop for the server thread
-    server_loop = asyncio.new_event_loop()
-    server_thread = threading.Thread(target=start_server, args=(server_loop, '0.0.0.0', 5000, ssl_ctx), daemon=True)
-    server_thread.start()
+        # Create a new event loop for the server thread
+        server_loop = asyncio.new_event_loop()
+        server_thread = threading.Thread(target=start_server, args=(server_loop, server, '0.0.0.0', 5000, ssl_ctx), daemon=True)
+        server_thread.start()
 
     # Give server a moment to start
     time.sleep(0.5)
 
     # Start GUI in main thread
     if gui_main:
-        try:
-            sys.exit(gui_main())
-        except TypeError:
-            # gui_main may not return an exit code
-            gui_main()
+        sys.exit(gui_main(server))
     else:
         logging.error('GUI main not available. Exiting.')
 
@@ -18,7 +18,6 @@ def test_dependencies():
         'PyQt6',
         'cv2',  # opencv-python
         'cryptography',
-        'OpenSSL',
         'pytest'
     ]
     